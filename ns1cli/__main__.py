@@ -0,0 +1,5 @@
+from ns1cli.cli import cli
+
+
+if __name__ == '__main__':
+    cli(prog_name='ns1')
@@ -1,12 +1,17 @@
+import copy
 import logging
 import os
+import socket
 import sys
 
 import click
 from nsone import NSONE
 from nsone.config import Config, ConfigException
 
+from ns1cli import hedging, metrics, profiling
+from ns1cli.journal import Journal, JournalError
 from ns1cli.repl import NS1Repl, BANNER
+from ns1cli.util import pmap, compile_where, DEFAULT_WORKERS
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -37,18 +42,29 @@ class NS1Cli(click.MultiCommand):
             return
         return mod.cli
 
+    def invoke(self, ctx):
+        # The console profiles each of its commands separately.
+        if not ctx.protected_args:
+            return click.MultiCommand.invoke(self, ctx)
+        with profiling.profiled(ctx.ensure_object(State),
+                                ctx.protected_args[0]):
+            return click.MultiCommand.invoke(self, ctx)
+
 
 class State(object):
 
     APP_NAME = 'ns1'
 
+    ALL_KEYS = '*'
+
     DEFAULT_CONFIG_FILE = 'config'
 
     DEFAULT_CONFIG = {'debug': False,
                       'output_format': 'text',
                       'verbosity': 0,
                       'write_lock': False,
-                      'force': False}
+                      'force': False,
+                      'workers': DEFAULT_WORKERS}
 
     def __init__(self):
         self.home_dir = click.get_app_dir(self.APP_NAME, force_posix=True)
@@ -58,8 +74,18 @@ class State(object):
         # Config vars are saved/accessed through rest client.
         # self.rest.config['cli']
         self.rest = None
-        self.cfg = self.DEFAULT_CONFIG
+        self.cfg = dict(self.DEFAULT_CONFIG)
         self.rest_cfg_opts = {}
+        self.profile_opts = {}
+        self.metrics_opts = {}
+        # --keys and --all-keys, see fan_out
+        self.key_opts = {}
+        # --timeout and --hedge, see ns1cli.hedging
+        self.request_opts = {}
+        # --fields and --where, passed to each Formatter
+        self.output_filters = {}
+        # Open console transaction, see ns1cli.transaction
+        self.transaction = None
 
     def log(self, msg, *args):
         """Logs a message to stderr."""
@@ -98,6 +124,80 @@ class State(object):
         if self.cfg['write_lock']:
             raise click.BadOptionUsage('CLI is currently write locked.')
 
+    def pmap(self, func, items, rate=None):
+        """Runs func over items concurrently, using the configured number of
+        workers, or one in a console transaction, whose records api is not
+        thread safe. See ns1cli.util.pmap."""
+        workers = 1 if self.transaction is not None else self.cfg['workers']
+        return pmap(func, items, workers=workers, rate=rate)
+
+    def check_no_transaction(self, command):
+        """Raises ClickException in a console transaction: a job's journal
+        would record writes the transaction only buffers as done."""
+        if self.transaction is not None:
+            raise click.ClickException('%s jobs cannot run in a transaction, '
+                                       'commit or rollback first' % command)
+
+    def start_job(self, command, ops):
+        """Journals ops as a new bulk write job. See ns1cli.journal."""
+        self.check_no_transaction(command)
+        job = Journal.create(self.home_dir, command, ops)
+        self.vlog('job %s: %d operations', job.job_id, len(ops))
+        return job
+
+    def resume_job(self, command, job_id):
+        """Loads the journal of an unfinished job of command."""
+        self.check_no_transaction(command)
+        try:
+            job = Journal.load(self.home_dir, job_id)
+        except JournalError as e:
+            raise click.ClickException(str(e))
+        if job.command != command:
+            raise click.ClickException('job %s is a %s job' %
+                                       (job_id, job.command))
+        self.log('resuming job %s: %d of %d operations left', job_id,
+                 len(job.pending()), len(job.ops))
+        return job
+
+    def pmap_job(self, job, func, done_if=None, stage=None):
+        """Runs func over the pending operations of a journaled job like
+        pmap, journaling each one that succeeds. If stage is given, the
+        operations are run in groups of equal stage(op), lowest first, each
+        group once the previous one is finished.
+
+        An interrupted run may have done operations without journaling
+        them. When resuming, operations failing with an error done_if
+        accepts, e.g. util.not_found for deletes, count as done."""
+        def run(item):
+            index, op = item
+            try:
+                result = func(op)
+            except Exception as e:
+                if not (job.resumed and done_if is not None and done_if(e)):
+                    raise
+                self.vlog('job %s: operation %d was already done',
+                          job.job_id, index)
+                result = None
+            job.mark_done(index)
+            return result
+
+        groups = [job.pending()]
+        if stage is not None:
+            stages = sorted(frozenset(stage(op) for _, op in groups[0]))
+            groups = [[(i, op) for i, op in groups[0] if stage(op) == s]
+                      for s in stages]
+
+        results = []
+        try:
+            for group in groups:
+                results.extend(self.pmap(run, group))
+        finally:
+            left = job.close()
+            if left:
+                self.log('job %s: %d operations unfinished, rerun with '
+                         '--resume %s', job.job_id, left, job.job_id)
+        return [(op, result, error) for (_, op), result, error in results]
+
     def load_rest_client(self):
         """Loads ns1 rest client config"""
         opts = self.rest_cfg_opts
@@ -132,12 +232,102 @@ class State(object):
             from requests.packages.urllib3.exceptions import InsecureRequestWarning
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+        if self.metrics_opts.get('file') or self.metrics_opts.get('statsd'):
+            cfg['transport'] = self.enable_metrics(cfg['transport'])
+
+        request_opts = self.request_opts
+        if request_opts.get('timeout') or request_opts.get('hedge'):
+            hedging.enable(request_opts.get('timeout'),
+                           request_opts.get('hedge'),
+                           request_opts.get('hedge_budget'))
+            cfg['transport'] = hedging.instrument(
+                cfg['transport'] or 'requests')
+
         # Store the cli cfg dict as an attr of the rest config instance.
         for k, v in self.cfg.items():
             cfg['cli'][k] = v
 
         self.rest = NSONE(config=cfg)
 
+    def enable_metrics(self, transport):
+        """Starts recording request metrics, and returns the name of the
+        instrumented transport to use in place of transport. See
+        ns1cli.metrics."""
+        opts = self.metrics_opts
+        try:
+            sinks = []
+            if opts.get('file'):
+                sinks.append(metrics.TextfileSink(opts['file']))
+            if opts.get('statsd'):
+                sinks.append(metrics.StatsdSink(opts['statsd']))
+        except (IOError, OSError, socket.error) as e:
+            raise click.ClickException('metrics: %s' % e)
+        metrics.enable(sinks, opts.get('interval'), self.log)
+        return metrics.instrument(transport or 'requests')
+
+    def key_clients(self, key_ids):
+        """Returns a (key id, rest client) pair for each of key_ids, or for
+        every configured key if key_ids is ALL_KEYS."""
+        base = self.rest.config
+        if key_ids == self.ALL_KEYS:
+            key_ids = sorted(base['keys'].keys())
+
+        clients = []
+        for key_id in key_ids:
+            cfg = copy.deepcopy(base)
+            try:
+                cfg.useKeyID(key_id)
+            except ConfigException as e:
+                raise click.ClickException(e.message)
+            clients.append((key_id, NSONE(config=cfg)))
+        return clients
+
+    def selected_keys(self):
+        """Returns the api key ids given with --keys, ALL_KEYS for
+        --all-keys, or None if neither was given."""
+        if self.key_opts.get('all'):
+            return self.ALL_KEYS
+        keys = [k.strip() for k in (self.key_opts.get('keys') or '').split(',')
+                if k.strip()]
+        return keys or None
+
+    def fan_out(self, func):
+        """Calls func with a rest client and returns its result, and the key
+        ids it failed for. If keys were selected with --keys or --all-keys,
+        func is instead called concurrently with one client per api key, and
+        the results are merged into a single list with each item labelled by
+        its key id. See check_keys."""
+        key_ids = self.selected_keys()
+        if not key_ids:
+            return func(self.rest), []
+
+        results = []
+        failed = []
+        clients = self.key_clients(key_ids)
+        for (key_id, _), data, error in self.pmap(lambda c: func(c[1]),
+                                                  clients):
+            if error is not None:
+                self.log('%s: %s', key_id, getattr(error, 'message', error))
+                failed.append(key_id)
+                continue
+            if not isinstance(data, list):
+                data = [data]
+            for item in data:
+                item = dict(item)
+                item['key'] = key_id
+                results.append(item)
+
+        if len(failed) == len(clients):
+            raise click.ClickException('REST API: request failed for all keys')
+        return results, failed
+
+    def check_keys(self, failed):
+        """Raises ClickException for the key ids fan_out failed for, once the
+        results of the others are output."""
+        if failed:
+            raise click.ClickException('REST API: request failed for keys: '
+                                       '%s' % ', '.join(failed))
+
 
 pass_state = click.make_pass_decorator(State, ensure=True)
 
@@ -171,17 +361,88 @@ def output_format_option(f):
         state.cfg['output_format'] = value
         return value
     return click.option('--output',
-                        type=click.Choice(['text', 'json']),
+                        type=click.Choice(['text', 'json', 'ndjson']),
                         expose_value=False,
                         help='Display format',
                         default='text',
                         callback=callback)(f)
 
 
+def output_filter_options(f):
+    def fields_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.output_filters['fields'] = value
+        return value
+
+    def where_callback(ctx, param, value):
+        try:
+            compile_where(value)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        state = ctx.ensure_object(State)
+        state.output_filters['where'] = value
+        return value
+
+    f = click.option('--where',
+                     expose_value=False,
+                     multiple=True,
+                     metavar='FIELD=VALUE',
+                     help='Only output items whose FIELD is (or with != is '
+                          'not) VALUE, or with ~= matches a regex',
+                     callback=where_callback)(f)
+    f = click.option('--fields',
+                     expose_value=False,
+                     metavar='FIELD,...',
+                     help='Only output the given comma separated fields, '
+                          'e.g. zone,meta.up',
+                     callback=fields_callback)(f)
+    return f
+
+
+def profile_options(f):
+    def cpu_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.profile_opts['cpu'] = value
+        return value
+
+    def mem_callback(ctx, param, value):
+        if value and profiling.tracemalloc is None:
+            raise click.BadParameter('memory profiling requires python 3.4+')
+        state = ctx.ensure_object(State)
+        state.profile_opts['mem'] = value
+        return value
+
+    def top_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.profile_opts['top'] = value
+        return value
+
+    f = click.option('--profile-top',
+                     expose_value=False,
+                     type=click.IntRange(1),
+                     default=20,
+                     help='Number of entries shown in profile reports',
+                     callback=top_callback)(f)
+    f = click.option('--profile-mem',
+                     expose_value=False,
+                     is_flag=True,
+                     help='Report peak memory and top allocation sites',
+                     callback=mem_callback)(f)
+    f = click.option('--profile',
+                     expose_value=False,
+                     is_flag=True,
+                     help='Profile commands and save the stats under the '
+                          'ns1 directory',
+                     callback=cpu_callback)(f)
+    return f
+
+
 def common_options(f):
+    f = output_filter_options(f)
     f = output_format_option(f)
     f = debug_option(f)
     f = verbosity_option(f)
+    f = profile_options(f)
     return f
 
 
@@ -202,6 +463,48 @@ def write_options(f):
     return f
 
 
+def workers_option(f):
+    def callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        if value is not None:
+            state.cfg['workers'] = value
+        return value
+    return click.option('--workers',
+                        expose_value=False,
+                        type=click.IntRange(1, 100),
+                        help='Number of concurrent API requests',
+                        callback=callback)(f)
+
+
+def resume_option(f):
+    return click.option('--resume', metavar='JOB_ID',
+                        help='Resume an interrupted job, retrying only its '
+                             'unfinished operations')(f)
+
+
+def keys_options(f):
+    def keys_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.key_opts['keys'] = value
+        return value
+
+    def all_keys_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.key_opts['all'] = value
+        return value
+
+    f = click.option('--all-keys',
+                     expose_value=False,
+                     is_flag=True,
+                     help='Run against every configured api key',
+                     callback=all_keys_callback)(f)
+    f = click.option('--keys',
+                     expose_value=False,
+                     help='Run against the given comma separated api key ids',
+                     callback=keys_callback)(f)
+    return f
+
+
 def config_path_option(f):
     def callback(ctx, param, value):
         state = ctx.ensure_object(State)
@@ -274,6 +577,97 @@ def ignore_ssl_option(f):
                         callback=callback)(f)
 
 
+def metrics_options(f):
+    def file_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.metrics_opts['file'] = value
+        return value
+
+    def statsd_callback(ctx, param, value):
+        if value:
+            host, _, port = value.rpartition(':')
+            if not port.isdigit():
+                raise click.BadParameter('expected HOST:PORT')
+        state = ctx.ensure_object(State)
+        state.metrics_opts['statsd'] = value
+        return value
+
+    def interval_callback(ctx, param, value):
+        if value is not None and value <= 0:
+            raise click.BadParameter('must be positive')
+        state = ctx.ensure_object(State)
+        state.metrics_opts['interval'] = value
+        return value
+
+    f = click.option('--metrics-interval',
+                     expose_value=False,
+                     type=float,
+                     metavar='SECONDS',
+                     envvar='NS1_METRICS_INTERVAL',
+                     help='Also flush metrics every SECONDS, not only at exit',
+                     callback=interval_callback)(f)
+    f = click.option('--metrics-statsd',
+                     expose_value=False,
+                     metavar='HOST:PORT',
+                     envvar='NS1_METRICS_STATSD',
+                     help='Send API request metrics to a StatsD server',
+                     callback=statsd_callback)(f)
+    f = click.option('--metrics-file',
+                     expose_value=False,
+                     type=click.Path(dir_okay=False),
+                     envvar='NS1_METRICS_FILE',
+                     help='Write API request metrics to a Prometheus '
+                          'textfile collector file',
+                     callback=file_callback)(f)
+    return f
+
+
+def request_options(f):
+    def timeout_callback(ctx, param, value):
+        if value is not None and value <= 0:
+            raise click.BadParameter('must be positive')
+        state = ctx.ensure_object(State)
+        state.request_opts['timeout'] = value
+        return value
+
+    def hedge_callback(ctx, param, value):
+        if value is not None and not 0 < value < 100:
+            raise click.BadParameter('must be a percentile between 0 and 100')
+        state = ctx.ensure_object(State)
+        state.request_opts['hedge'] = value
+        return value
+
+    def budget_callback(ctx, param, value):
+        if not 0 < value <= 1:
+            raise click.BadParameter('must be a fraction between 0 and 1')
+        state = ctx.ensure_object(State)
+        state.request_opts['hedge_budget'] = value
+        return value
+
+    f = click.option('--hedge-budget',
+                     expose_value=False,
+                     type=float,
+                     default=0.05,
+                     metavar='FRACTION',
+                     help='Most reads that may be hedged (defaults to 0.05)',
+                     callback=budget_callback)(f)
+    f = click.option('--hedge',
+                     expose_value=False,
+                     type=float,
+                     metavar='PERCENTILE',
+                     help='Send reads again when slower than PERCENTILE of '
+                          'recent reads, using the first answer',
+                     callback=hedge_callback)(f)
+    f = click.option('--timeout',
+                     expose_value=False,
+                     type=float,
+                     metavar='SECONDS',
+                     help='Fail reads of any command not answered within '
+                          'SECONDS',
+                     callback=timeout_callback)(f)
+    return f
+
+
 def ns1_client_options(f):
     f = transport_option(f)
     f = config_path_option(f)
@@ -288,6 +682,8 @@ def ns1_client_options(f):
              context_settings=CONTEXT_SETTINGS)
 @common_options
 @ns1_client_options
+@request_options
+@metrics_options
 @pass_state
 @click.pass_context
 def cli(ctx, state):
@@ -301,6 +697,12 @@ def cli(ctx, state):
         except ConfigException as e:
             raise click.ClickException(e.message)
 
+    filters = state.output_filters
+    if state.cfg['output_format'] == 'text' and \
+            filters.get('where') and not filters.get('fields'):
+        raise click.BadOptionUsage('--where requires --fields or '
+                                   '--output json or ndjson')
+
     ctx.obj = state
 
     if not ctx.invoked_subcommand:
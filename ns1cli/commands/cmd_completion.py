@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+
+import click
+from nsone.rest.resource import ResourceException
+
+from ns1cli import complete
+from ns1cli.cli import cli, workers_option
+
+
+SCRIPTS = {
+    'bash': '''\
+_ns1_completion() {
+    local IFS=$'\\n'
+    COMPREPLY=( $( "%(python)s" -m ns1cli.complete --home "%(home)s" "$COMP_CWORD" "${COMP_WORDS[@]}" 2>/dev/null ) )
+}
+complete -o default -F _ns1_completion ns1
+''',
+    'zsh': '''\
+#compdef ns1
+_ns1_completion() {
+    local -a candidates
+    candidates=( ${(f)"$( "%(python)s" -m ns1cli.complete --home "%(home)s" $((CURRENT - 1)) "${words[@]}" 2>/dev/null )"} )
+    compadd -- $candidates
+}
+compdef _ns1_completion ns1
+''',
+    'fish': '''\
+function __ns1_completion
+    set -l tokens (commandline -opc) (commandline -ct)
+    "%(python)s" -m ns1cli.complete --home "%(home)s" (math (count $tokens) - 1) $tokens 2>/dev/null
+end
+complete -c ns1 -f -a '(__ns1_completion)'
+''',
+}
+
+
+def command_tree(ctx, command):
+    """Describes the options, arguments and subcommands of a click command
+    for the completion backend."""
+    node = {'options': ['--help'], 'value_options': {}, 'args': []}
+    for param in command.params:
+        if isinstance(param, click.Option):
+            choices = []
+            if isinstance(param.type, click.Choice):
+                choices = [c for c in param.type.choices]
+            for opt in param.opts + param.secondary_opts:
+                if param.is_flag or param.count:
+                    node['options'].append(opt)
+                else:
+                    node['value_options'][opt] = choices
+        else:
+            name = param.name.upper()
+            if param.nargs == -1:
+                name += '...'
+            node['args'].append(name)
+
+    if isinstance(command, click.MultiCommand):
+        node['commands'] = {}
+        for name in command.list_commands(ctx):
+            sub = command.get_command(ctx, name)
+            if sub is not None:
+                node['commands'][name] = command_tree(ctx, sub)
+    return node
+
+
+def _write_index(ctx, index):
+    root = ctx.find_root()
+    index['commands'] = command_tree(root, root.command)
+    complete.write_json(os.path.join(complete.index_dir(ctx.obj.home_dir),
+                                     complete.INDEX_FILE), index)
+
+
+@click.group('completion', short_help='Shell completion scripts')
+@click.pass_context
+def cli(ctx):
+    """Generate shell completion scripts and manage the completion index."""
+    pass
+
+
+@cli.command('script', short_help='Print a shell completion script')
+@click.argument('SHELL', type=click.Choice(sorted(SCRIPTS)))
+@click.pass_context
+def script(ctx, shell):
+    """Prints the completion script for SHELL. Commands and options are
+    completed, along with zones, domains, record types, monitoring job ids and
+    data source ids from an index kept in the ns1 directory. The index is
+    refreshed in the background when it is more than an hour old.
+
+    \b
+    EXAMPLES:
+        eval "$(ns1 completion script bash)"
+        ns1 completion script zsh > ~/.zfunc/_ns1
+        ns1 completion script fish > ~/.config/fish/completions/ns1.fish
+    """
+    # Keep the dynamic parts of any existing index, and refresh the
+    # command tree so commands complete before the first refresh runs.
+    _write_index(ctx, complete.load_index(ctx.obj.home_dir))
+    click.echo(SCRIPTS[shell] % {'python': sys.executable,
+                                 'home': ctx.obj.home_dir}, nl=False)
+
+
+@cli.command('refresh', short_help='Refresh the completion index')
+@workers_option
+@click.pass_context
+def refresh(ctx):
+    """Fetches zones, domains, monitoring jobs and data sources for the
+    completion index. Zones are retrieved concurrently.
+
+    \b
+    EXAMPLES:
+        ns1 completion refresh
+    """
+    home_dir = ctx.obj.home_dir
+    try:
+        zone_api = ctx.obj.rest.zones()
+        zones = sorted(z['zone'] for z in zone_api.list())
+        monitors = [m['id'] for m in ctx.obj.rest.monitors().list()]
+        sources = [s['id'] for s in ctx.obj.rest.datasource().list()]
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+
+    for zone, zdata, error in ctx.obj.pmap(zone_api.retrieve, zones):
+        if error is not None:
+            ctx.obj.log('%s: %s', zone, getattr(error, 'message', error))
+            continue
+        complete.write_lines(complete.domains_path(home_dir, zone),
+                             sorted(set(r['domain']
+                                        for r in zdata['records'])))
+
+    _write_index(ctx, {'updated': time.time(),
+                       'zones': zones,
+                       'monitors': monitors,
+                       'sources': sources})
+
+    # a failed refresh keeps the marker, so the completion backend waits
+    # for complete.REFRESH_TIMEOUT before it tries again
+    marker = os.path.join(complete.index_dir(home_dir),
+                          complete.REFRESH_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+
+    ctx.obj.vlog('completion index refreshed: %d zones', len(zones))
@@ -24,7 +24,8 @@ class ConfigFormatter(Formatter):
 @click.pass_context
 def cli(ctx):
     """View and manipulate configuration settings"""
-    ctx.obj.formatter = ConfigFormatter(ctx.obj.get_config('output_format'))
+    ctx.obj.formatter = ConfigFormatter(ctx.obj.get_config('output_format'),
+                                        **ctx.obj.output_filters)
 
 
 @cli.command('show', short_help='Show the existing config')
@@ -36,7 +37,7 @@ def show(ctx):
     EXAMPLES:
         ns1 config show
     """
-    if ctx.obj.formatter.output_format == 'json':
+    if ctx.obj.formatter.output_format != 'text':
         ctx.obj.formatter.out_json(ctx.obj.rest.config._data)
         return
 
@@ -57,7 +58,7 @@ def set(ctx, value, key):
     """
     ctx.obj.set_config(key, value)
 
-    if ctx.obj.formatter.output_format == 'json':
+    if ctx.obj.formatter.output_format != 'text':
         ctx.obj.formatter.out_json(ctx.obj.rest.config._data)
         return
 
@@ -77,7 +78,7 @@ def key(ctx, keyid):
     try:
         ctx.obj.rest.config.useKeyID(keyid)
 
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(ctx.obj.rest.config._data)
             return
 
@@ -105,7 +106,7 @@ def key(ctx, path):
     try:
         ctx.obj.rest.config.write(path)
 
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(ctx.obj.rest.config._data)
             return
 
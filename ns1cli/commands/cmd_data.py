@@ -1,9 +1,16 @@
+import json
+import os
+import time
+
 import click
-from ns1cli.cli import cli, write_options
+from ns1cli.cli import cli, write_options, keys_options, workers_option
 from ns1cli.util import Formatter
 from nsone.rest.resource import ResourceException
 
 
+FEED_INDEX_FILE = 'feeds.json'
+
+
 class DataFormatter(Formatter):
 
     def print_source(self, sdata):
@@ -22,13 +29,69 @@ class DataFormatter(Formatter):
             for d in dest:
                 self.pretty_print(d, 4)
 
+    def print_destinations(self, rows):
+        columns = [('SOURCE', 'source_name'), ('FEED', 'feed_name'),
+                   ('DESTTYPE', 'desttype'), ('DESTID', 'destid'),
+                   ('RECORD', 'record')]
+        widths = [max([len(h)] + [len(r[k] or '-') for r in rows])
+                  for h, k in columns]
+        click.secho('  '.join(h.ljust(w) for (h, _), w in
+                              zip(columns, widths)).rstrip(), bold=True)
+        for r in rows:
+            self.out('  '.join((r[k] or '-').ljust(w) for (_, k), w in
+                               zip(columns, widths)).rstrip())
+
+
+def feed_index_path(home_dir):
+    return os.path.join(home_dir, FEED_INDEX_FILE)
+
+
+def load_feed_index(home_dir):
+    """Returns the feed destination index saved by data feed list --all
+    --cache, as {'updated': timestamp, 'destinations': [row, ...]}, or None
+    if there is none."""
+    try:
+        with open(feed_index_path(home_dir)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _feed_destinations(ctx):
+    """Lists every data source, then the feeds of all of them concurrently,
+    and returns a row per feed destination (or per feed without one)."""
+    try:
+        sources = ctx.obj.rest.datasource().list()
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+
+    datafeed_api = ctx.obj.rest.datafeed()
+    rows = []
+    for s, flist, error in ctx.obj.pmap(lambda s: datafeed_api.list(s['id']),
+                                        sources):
+        if error is not None:
+            raise click.ClickException('REST API: %s: %s' %
+                                       (s['id'], getattr(error, 'message',
+                                                         error)))
+        for f in flist:
+            feed = {'source': s['id'], 'source_name': s.get('name'),
+                    'feed': f['id'], 'feed_name': f.get('name')}
+            for d in f.get('destinations') or [{}]:
+                row = dict(feed)
+                row['desttype'] = d.get('desttype')
+                row['destid'] = d.get('destid')
+                row['record'] = d.get('record')
+                rows.append(row)
+    return rows
+
 
 @click.group('data',
              short_help='View and modify data sources/feeds')
 @click.pass_context
 def cli(ctx):
     """Create, retrieve, update, and delete data sources/feeds."""
-    ctx.obj.formatter = DataFormatter(ctx.obj.get_config('output_format'))
+    ctx.obj.formatter = DataFormatter(ctx.obj.get_config('output_format'),
+                                      **ctx.obj.output_filters)
 
 
 @cli.group('source', short_help='View and modify data sources')
@@ -42,34 +105,43 @@ def source(ctx):
 @click.option('--include', multiple=True,
               help='Display additional data',
               type=click.Choice(['id', 'sourcetype']))
+@keys_options
+@workers_option
 @click.pass_context
 def list(ctx, include):
     """List of all connected data sources, and for each data source, all
     connected feeds including connected metadata table destinations.
 
+    \b
+    With --keys or --all-keys, data sources are listed for several api keys
+    concurrently and labelled with the key id they belong to.
+
     \b
     EXAMPLES:
         ns1 source list
         ns1 source list --include id
         ns1 source list --include id --include sourcetype
+        ns1 source list --keys prod,staging
     """
     try:
-        slist = ctx.obj.datasource_api.list()
+        slist, failed = ctx.obj.fan_out(lambda rest: rest.datasource().list())
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
 
-    if ctx.obj.formatter.output_format == 'json':
+    if ctx.obj.formatter.output_format != 'text':
         ctx.obj.formatter.out_json(slist)
-        return
-
-    click.secho('DATASOURCES:', bold=True)
-    for s in slist:
-        ctx.obj.formatter.out('  name: ' + s['name'])
-        if 'id' in include:
-            ctx.obj.formatter.out('  id: ' + s['id'])
-        if 'sourcetype' in include:
-            ctx.obj.formatter.out('  sourcetype: ' + s['sourcetype'])
-        ctx.obj.formatter.out('')
+    else:
+        click.secho('DATASOURCES:', bold=True)
+        for s in slist:
+            if 'key' in s:
+                ctx.obj.formatter.out('  key: ' + s['key'])
+            ctx.obj.formatter.out('  name: ' + s['name'])
+            if 'id' in include:
+                ctx.obj.formatter.out('  id: ' + s['id'])
+            if 'sourcetype' in include:
+                ctx.obj.formatter.out('  sourcetype: ' + s['sourcetype'])
+            ctx.obj.formatter.out('')
+    ctx.obj.check_keys(failed)
 
 
 @source.command('info', short_help='Get data source details')
@@ -89,7 +161,7 @@ def info(ctx, sourceid):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(sdata)
             return
 
@@ -135,7 +207,7 @@ def create(ctx, name, sourcetype, config):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(sdata)
             return
 
@@ -178,27 +250,87 @@ def feed(ctx):
 @click.option('--include', multiple=True,
               help='Display additional data',
               type=click.Choice(['id', 'destinations']))
-@click.argument('SOURCEID')
+@click.option('--all', 'all_sources', is_flag=True,
+              help='List the destinations of every feed of every source')
+@click.option('--cache', is_flag=True,
+              help='With --all, save the destinations under the ns1 '
+                   'directory')
+@click.option('--cached', is_flag=True,
+              help='With --all, show the destinations saved by --cache '
+                   'instead of listing every source')
+@workers_option
+@click.argument('SOURCEID', required=False)
 @click.pass_context
-def list(ctx, sourceid, include):
+def list(ctx, sourceid, cached, cache, all_sources, include):
     """Lists all data feeds connected to a source with SOURCEID.
     Includes config details for each feed which match the
     feed_config specification from /data/sourcetypes, and optionally
     includes a list of metadata tables that are destinations
     for each feed.
 
+    \b
+    ALL SOURCES:
+        With --all, every data source is listed, then the feeds of all of
+        them concurrently, and a row is shown per feed destination (record,
+        answer or region), or per feed without one. With --output ndjson,
+        each row is a JSON object on its own line. --cache also saves the
+        rows to feeds.json in the ns1 directory, and --cached shows them
+        again, resolving feed destinations without listing every source.
+
     \b
     EXAMPLES:
         ns1 feed list SOURCEID
         ns1 feed list --include id SOURCEID
         ns1 feed list --include id --include destinations SOURCEID
+        ns1 data feed list --all --workers 20
+        ns1 --output ndjson data feed list --all --cache
+        ns1 --output json --fields feed,record data feed list --all --cached
     """
+    if all_sources:
+        if sourceid:
+            raise click.BadArgumentUsage(
+                'SOURCEID cannot be given with --all')
+        if cache and cached:
+            raise click.BadOptionUsage('--cache and --cached cannot be '
+                                       'given together')
+        if cached:
+            index = load_feed_index(ctx.obj.home_dir)
+            if index is None:
+                raise click.ClickException(
+                    'no cached feed destinations, run data feed list --all '
+                    '--cache first')
+            ctx.obj.vlog('feed destinations cached %s',
+                         time.strftime('%Y-%m-%d %H:%M',
+                                       time.localtime(index['updated'])))
+            rows = index['destinations']
+        else:
+            rows = _feed_destinations(ctx)
+        if cache:
+            path = feed_index_path(ctx.obj.home_dir)
+            try:
+                with open(path, 'w') as f:
+                    json.dump({'updated': time.time(),
+                               'destinations': rows}, f)
+            except (IOError, OSError) as e:
+                raise click.ClickException('%s: %s' % (path, e))
+        if ctx.obj.formatter.output_format != 'text':
+            ctx.obj.formatter.out_json(rows)
+        else:
+            ctx.obj.formatter.print_destinations(rows)
+        return
+
+    if not sourceid:
+        raise click.BadArgumentUsage('SOURCEID is required without --all')
+    if cache or cached:
+        raise click.BadOptionUsage('--cache and --cached are only allowed '
+                                   'with --all')
+
     try:
         flist = ctx.obj.datafeed_api.list(sourceid)
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(flist)
             return
 
@@ -235,7 +367,7 @@ def info(ctx, sourceid, feedid):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(fdata)
             return
 
@@ -269,7 +401,7 @@ def create(ctx, sourceid, name, config):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(fdata)
             return
 
@@ -1,6 +1,10 @@
+import copy
+import json
+
 import click
-from ns1cli.cli import cli
-from ns1cli.util import Formatter
+from ns1cli.cli import (cli, keys_options, workers_option, write_options,
+                        resume_option)
+from ns1cli.util import Formatter, read_lines
 from nsone.rest.resource import ResourceException
 
 
@@ -23,13 +27,117 @@ class MonitorFormatter(Formatter):
         for r in rules:
             self.pretty_print(r, 4)
 
+    def print_created(self, results):
+        longest = self._longest([r['name'] for r in results])
+        for r in results:
+            self.out(' %s  %s  %s' % (r.get('id', '-').ljust(24),
+                                      r['name'].ljust(longest),
+                                      r.get('error', 'created')))
+
+
+# Fields of a retrieved job that are set by NS1 rather than by its creator
+READ_ONLY_FIELDS = ('id', 'status', 'created_at', 'updated_at')
+
+
+def _template(mdata):
+    return dict((k, v) for k, v in mdata.items()
+                if k not in READ_ONLY_FIELDS)
+
+
+def _read_hosts(f):
+    """Returns the hosts of a --hosts file, or None if none was given."""
+    if f is None:
+        return None
+    hosts = [h for h in read_lines(f)]
+    if not hosts:
+        raise click.BadParameter('%s: no hosts given' %
+                                 getattr(f, 'name', '-'),
+                                 param_hint='--hosts')
+    return hosts
+
+
+def _jobs(template, hosts, name):
+    """Returns a {host, body} job per host from template. {host} in the
+    template's config is replaced by the host, and otherwise config.host is
+    set to it. {host} and {name} in name are replaced by the host and the
+    template name. If hosts is None, the template is the only job."""
+    def job_name(host):
+        return name.replace('{host}', host).replace(
+            '{name}', template.get('name', '')).strip()
+
+    if hosts is None:
+        return [{'host': None,
+                 'body': dict(template, name=job_name(''))}]
+
+    config = json.dumps(template.get('config', {}))
+    jobs = []
+    for host in hosts:
+        body = copy.deepcopy(template)
+        if '{host}' in config:
+            body['config'] = json.loads(config.replace(
+                '{host}', json.dumps(host)[1:-1]))
+        else:
+            body.setdefault('config', {})['host'] = host
+        body['name'] = job_name(host)
+        jobs.append({'host': host, 'body': body})
+    return jobs
+
+
+def _create_jobs(ctx, command, jobs, resume):
+    ctx.obj.check_write_lock()
+
+    if resume:
+        job = ctx.obj.resume_job(command, resume)
+    else:
+        job = ctx.obj.start_job(command, jobs)
+
+    def create(j):
+        return ctx.obj.monitor_api.create(copy.deepcopy(j['body']))
+
+    results = []
+    failed = 0
+    for j, mdata, error in ctx.obj.pmap_job(job, create):
+        result = {'name': j['body'].get('name', '')}
+        if j['host'] is not None:
+            result['host'] = j['host']
+        if error is not None:
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        else:
+            result['id'] = mdata['id']
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_created(results)
+
+    if failed:
+        raise click.ClickException('%d of %d monitors failed to create' %
+                                   (failed, len(results)))
+
+
+def template_options(f):
+    f = resume_option(f)
+    f = workers_option(f)
+    f = write_options(f)
+    f = click.option('--name', default='{name} {host}',
+                     help='Name of the new jobs, where {name} is the '
+                          'template name and {host} the host (defaults to '
+                          '"{name} {host}")')(f)
+    f = click.option('--hosts', type=click.File('r'),
+                     help='Create a job for each host in a file, one per '
+                          'line, or - for stdin')(f)
+    return f
+
 
 @click.group('monitor',
-             short_help='View monitoring jobs')
+             short_help='View and create monitoring jobs')
 @click.pass_context
 def cli(ctx):
-    """View monitoring jobs."""
-    ctx.obj.formatter = MonitorFormatter(ctx.obj.get_config('output_format'))
+    """View and create monitoring jobs."""
+    ctx.obj.formatter = MonitorFormatter(ctx.obj.get_config('output_format'),
+                                         **ctx.obj.output_filters)
     ctx.obj.monitor_api = ctx.obj.rest.monitors()
 
 
@@ -37,6 +145,8 @@ def cli(ctx):
 @click.option('--include', multiple=True,
               help='Display additional data',
               type=click.Choice(['id', 'job_type']))
+@keys_options
+@workers_option
 @click.pass_context
 def list(ctx, include):
     """List of all monitoring jobs for the account, including configuration and
@@ -45,29 +155,36 @@ def list(ctx, include):
     the status policy from the regional statuses. Status values both globally and
     per region include up, down, and pending.
 
+    \b
+    With --keys or --all-keys, monitors are listed for several api keys
+    concurrently and labelled with the key id they belong to.
+
     \b
     EXAMPLES:
         monitor list
         monitor list --include id
         monitor list --include id --include job_type
+        monitor list --all-keys
     """
     try:
-        mlist = ctx.obj.monitor_api.list()
+        mlist, failed = ctx.obj.fan_out(lambda rest: rest.monitors().list())
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
-    else:
-        if ctx.obj.formatter.output_format == 'json':
-            ctx.obj.formatter.out_json(mlist)
-            return
 
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(mlist)
+    else:
         click.secho('MONITORS:', bold=True)
         for m in mlist:
+            if 'key' in m:
+                ctx.obj.formatter.out('  key: ' + m['key'])
             ctx.obj.formatter.out('  name: ' + m['name'])
             if 'id' in include:
                 ctx.obj.formatter.out('  id: ' + m['id'])
             if 'job_type' in include:
                 ctx.obj.formatter.out('  job_type: ' + m['job_type'])
             ctx.obj.formatter.out('')
+    ctx.obj.check_keys(failed)
 
 
 @cli.command('info', short_help='Get monitor details')
@@ -89,8 +206,83 @@ def info(ctx, jobid):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(mdata)
             return
 
         ctx.obj.formatter.print_monitor(mdata)
+
+
+@cli.command('create', short_help='Create monitors from a template')
+@click.option('--template', type=click.File('r'),
+              help='JSON monitoring job to create, as from --output json '
+                   'monitor info')
+@template_options
+@click.pass_context
+def create(ctx, resume, hosts, name, template):
+    """Creates monitoring jobs from a JSON --template. With --hosts, a job
+    is created for each host, with the host substituted for {host} in the
+    template's config, or set as its config host if there is no {host}.
+    The jobs are created concurrently, and journaled as a job that can be
+    continued with --resume JOB_ID if interrupted.
+
+    \b
+    The new job ids are reported with their names and hosts; with
+    --output ndjson, one JSON object per line, ready to attach to answers
+    through data feeds.
+
+    \b
+    EXAMPLES:
+        monitor create --template tcp.json
+        monitor create --template tcp.json --hosts backends.txt
+        cat backends.txt | ns1 --output ndjson monitor create --template http.json --hosts -
+    """
+    if resume:
+        if template or hosts:
+            raise click.BadArgumentUsage(
+                '--template and --hosts cannot be given with --resume')
+        return _create_jobs(ctx, 'monitor create', None, resume)
+
+    if not template:
+        raise click.BadParameter('--template is required')
+    try:
+        mdata = json.load(template)
+    except ValueError as e:
+        raise click.BadParameter('%s: %s' % (template.name, e))
+    if not isinstance(mdata, dict):
+        raise click.BadParameter('%s: expected a JSON object' % template.name)
+
+    jobs = _jobs(_template(mdata), _read_hosts(hosts), name)
+    _create_jobs(ctx, 'monitor create', jobs, None)
+
+
+@cli.command('clone', short_help='Copy a monitor to other hosts')
+@click.argument('JOBID', required=False)
+@template_options
+@click.pass_context
+def clone(ctx, resume, hosts, name, jobid):
+    """Creates copies of the monitoring job JOBID. With --hosts, a copy is
+    created for each host, as for monitor create with JOBID as the
+    template. The copies are created concurrently.
+
+    \b
+    EXAMPLES:
+        monitor clone 531a047f830f7803d5f0d2ca --name '{name} copy'
+        monitor clone 531a047f830f7803d5f0d2ca --hosts backends.txt
+        monitor clone --resume 20161019120000-1a2b3c
+    """
+    if resume:
+        if jobid or hosts:
+            raise click.BadArgumentUsage(
+                'JOBID and --hosts cannot be given with --resume')
+        return _create_jobs(ctx, 'monitor clone', None, resume)
+
+    if not jobid:
+        raise click.BadArgumentUsage('JOBID is required')
+    try:
+        mdata = ctx.obj.monitor_api.retrieve(jobid)
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+
+    jobs = _jobs(_template(mdata), _read_hosts(hosts), name)
+    _create_jobs(ctx, 'monitor clone', jobs, None)
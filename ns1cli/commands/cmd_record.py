@@ -1,13 +1,37 @@
-import six
+import collections
+import hashlib
+import json
+import re
 
 import click
-from ns1cli.cli import State, write_options
-from ns1cli.util import Formatter
+from ns1cli import jsonpatch, simulate, validate
+from ns1cli.cli import State, write_options, workers_option, resume_option
+from ns1cli.util import Formatter, compile_matcher, not_found, read_lines
 from nsone.rest.resource import ResourceException
 
 
 class RecordFormatter(Formatter):
 
+    def print_results(self, results):
+        longestRec = self._longest([r['domain'] for r in results])
+        for r in results:
+            self.out(' %s  %s  %s' % (r['domain'].ljust(longestRec),
+                                      r['type'].ljust(5),
+                                      r.get('error', r['status'])))
+
+    def print_simulation(self, total, first, returned):
+        self.out('QUERIES: %d' % total)
+        answers = sorted(set(first) | set(returned),
+                         key=lambda a: (-first[a], a is None, a))
+        longest = self._longest([a for a in answers if a] + ['(no answer)'])
+        click.secho(' %s  %14s  %14s' % ('ANSWER'.ljust(longest),
+                                         'FIRST', 'RETURNED'), bold=True)
+        for a in answers:
+            self.out(' %s  %7d %5.1f%%  %7d %5.1f%%' % (
+                (a or '(no answer)').ljust(longest),
+                first[a], 100.0 * first[a] / total,
+                returned[a], 100.0 * returned[a] / total))
+
     def print_record(self, rdata):
         ans = rdata.pop('answers')
         fil = rdata.pop('filters')
@@ -33,31 +57,34 @@ class RecordFormatter(Formatter):
             self.pretty_print(meta, 4)
 
 
-def zone_argument(f):
+def zone_argument(f, required=True):
     def callback(ctx, param, value):
         state = ctx.ensure_object(State)
         state.ZONE = value
         return value
-    return click.argument('ZONE', expose_value=False, callback=callback)(f)
+    return click.argument('ZONE', required=required, expose_value=False,
+                          callback=callback)(f)
 
 
-def domain_argument(f):
+def domain_argument(f, required=True):
     def callback(ctx, param, value):
         state = ctx.ensure_object(State)
         # if no dot in the domain name, assume we should add zone
-        if value.find('.') == -1:
+        if value and value.find('.') == -1:
             value = '%s.%s' % (value, state.ZONE)
         state.DOMAIN = value
         return value
-    return click.argument('DOMAIN', expose_value=False, callback=callback)(f)
+    return click.argument('DOMAIN', required=required, expose_value=False,
+                          callback=callback)(f)
 
 
-def type_argument(f):
+def type_argument(f, required=True):
     def callback(ctx, param, value):
         state = ctx.ensure_object(State)
         state.TYPE = value
         return value
-    return click.argument('TYPE', expose_value=False, callback=callback)(f)
+    return click.argument('TYPE', required=required, expose_value=False,
+                          callback=callback)(f)
 
 
 def record_arguments(f):
@@ -68,6 +95,76 @@ def record_arguments(f):
     return f
 
 
+def optional_record_arguments(f):
+    # Order matters
+    f = type_argument(f, required=False)
+    f = domain_argument(f, required=False)
+    f = zone_argument(f, required=False)
+    return f
+
+
+SELECTOR_FIELDS = ('zone', 'domain', 'type', 'answer')
+
+
+def match_option(f):
+    def callback(ctx, param, value):
+        selectors = {}
+        for m in value:
+            field, sep, pattern = m.partition('=')
+            if not sep or field not in SELECTOR_FIELDS:
+                raise click.BadParameter(
+                    'expected FIELD=PATTERN, with FIELD one of %s' %
+                    ', '.join(SELECTOR_FIELDS))
+            selectors[field] = pattern
+        return selectors
+    f = click.option('--regex', is_flag=True,
+                     help='Treat --match patterns as regular expressions')(f)
+    return click.option('--match', 'selectors', multiple=True,
+                        metavar='FIELD=PATTERN', callback=callback,
+                        help='Select records by zone, domain, type or answer '
+                             'glob pattern')(f)
+
+
+def select_records(ctx, selectors, regex):
+    """Returns the records of the account matching all of selectors, as
+    listed in zone details (zone, domain, type, short_answers). Zones are
+    retrieved concurrently."""
+    try:
+        match = dict((field, compile_matcher(pattern, regex))
+                     for field, pattern in selectors.items())
+    except re.error as e:
+        raise click.BadParameter('invalid regex: %s' % e,
+                                 param_hint='--match')
+
+    try:
+        zones = [z['zone'] for z in ctx.obj.rest.zones().list()]
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+    if 'zone' in match:
+        zones = [z for z in zones if match['zone'](z)]
+
+    zone_api = ctx.obj.rest.zones()
+    records = []
+    for zone, zdata, error in ctx.obj.pmap(zone_api.retrieve, zones):
+        if error is not None:
+            raise click.ClickException('REST API: %s: %s' %
+                                       (zone, getattr(error, 'message',
+                                                      error)))
+        for r in zdata['records']:
+            if 'domain' in match and not match['domain'](r['domain']):
+                continue
+            if 'type' in match and not match['type'](r['type']):
+                continue
+            if 'answer' in match and \
+                    not any(match['answer'](a) for a in r['short_answers']):
+                continue
+            records.append({'zone': zone,
+                            'domain': r['domain'],
+                            'type': r['type'],
+                            'short_answers': r['short_answers']})
+    return records
+
+
 def _has_meta(resource):
     return resource.get('meta', False)
 
@@ -77,8 +174,12 @@ def _has_meta(resource):
 @click.pass_context
 def cli(ctx):
     """Create, retrieve, update, and delete records in a zone."""
-    ctx.obj.formatter = RecordFormatter(ctx.obj.get_config('output_format'))
+    ctx.obj.formatter = RecordFormatter(ctx.obj.get_config('output_format'),
+                                        **ctx.obj.output_filters)
     ctx.obj.record_api = ctx.obj.rest.records()
+    # inside a console transaction, edits are buffered until commit
+    if ctx.obj.transaction is not None:
+        ctx.obj.record_api = ctx.obj.transaction
 
 
 @cli.command('info', short_help='Get record details')
@@ -109,7 +210,7 @@ def info(ctx):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -192,10 +293,16 @@ def create(ctx, answers, mx_priority, use_client_subnet, ttl, target):
         if len(mx_priority) != len(answers):
             raise click.BadArgumentUsage('every answer must have a priority')
 
-        answers = six.itertools.izip(mx_priority, answers)
+        answers = [[p, a] for p, a in zip(mx_priority, answers)]
     elif mx_priority:
         raise click.BadOptionUsage('MX_priority is only allwed for MX records')
 
+    answers = [a for a in answers]
+    try:
+        validate.check_answers(ctx.obj.TYPE, answers)
+    except validate.ValidationError as e:
+        raise click.BadArgumentUsage(str(e))
+
     options['answers'] = answers
 
     try:
@@ -205,7 +312,7 @@ def create(ctx, answers, mx_priority, use_client_subnet, ttl, target):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -214,22 +321,69 @@ def create(ctx, answers, mx_priority, use_client_subnet, ttl, target):
 
 @cli.command('delete', short_help='Delete a record')
 @write_options
-@record_arguments
+@optional_record_arguments
+@match_option
+@click.option('--dry-run', is_flag=True,
+              help='Only show the records that --match selects')
+@click.option('-y', '--yes', is_flag=True,
+              help='Do not ask for confirmation with --match')
+@click.option('--include-apex-ns', is_flag=True,
+              help='Also delete the apex NS records of zones --match '
+                   'selects')
+@workers_option
+@resume_option
 @click.pass_context
-def delete(ctx):
+def delete(ctx, resume, include_apex_ns, yes, dry_run, selectors, regex):
     """Removes an existing record and all associated answers and configuration
     details. NS1 will no longer respond for this record once it is deleted, and
     it cannot be recovered, so use caution.
 
+    \b
+    BULK DELETE:
+        Instead of ZONE DOMAIN TYPE, records may be selected with one or more
+        --match FIELD=PATTERN options, where FIELD is zone, domain, type or
+        answer and PATTERN is a glob (or a regular expression with --regex).
+        A record is selected if it matches every option; an answer pattern
+        matches if any of the record's answers match. The zones are read
+        concurrently, and after confirmation the selected records are deleted
+        concurrently. The result of every deletion is reported, as JSON with
+        --output json or ndjson. The deletions are journaled as a job, and
+        an interrupted bulk delete is continued with --resume JOB_ID.
+
+        The NS records at the apex of a zone delegate it, so they are left
+        out of the selection unless --include-apex-ns is given.
+
     \b
     Examples:
         ns1 record delete test.com test A
         ns1 record delete -f test.com test A
+        ns1 record delete --match 'domain=*.legacy.test.com'
+        ns1 record delete --match zone=test.com --match answer=10.0.0.1
+        ns1 record delete --regex --match 'domain=^web[0-9]+\\.' --dry-run
+        ns1 record delete --resume 20161019120000-1a2b3c
 
     \b
     NOTES:
         This operation deletes all answers associated with the domain and record type.
     """
+    if resume:
+        if ctx.obj.ZONE or selectors:
+            raise click.BadArgumentUsage(
+                'ZONE DOMAIN TYPE and --match cannot be given with --resume')
+        ctx.obj.check_write_lock()
+        return _delete_records(ctx, ctx.obj.resume_job('record delete',
+                                                       resume))
+
+    if selectors:
+        if ctx.obj.ZONE:
+            raise click.BadArgumentUsage(
+                'ZONE DOMAIN TYPE cannot be given with --match')
+        return _delete_matching(ctx, selectors, regex, dry_run, yes,
+                                include_apex_ns)
+
+    if not (ctx.obj.ZONE and ctx.obj.DOMAIN and ctx.obj.TYPE):
+        raise click.BadArgumentUsage('ZONE, DOMAIN and TYPE are required')
+
     ctx.obj.check_write_lock()
 
     try:
@@ -240,6 +394,424 @@ def delete(ctx):
         click.echo('{} deleted'.format(ctx.obj.DOMAIN))
 
 
+def _log_selected(ctx, records, sample=10):
+    ctx.obj.log('%d records match:', len(records))
+    for r in records[:sample]:
+        ctx.obj.log('    %s %s %s', r['zone'], r['domain'], r['type'])
+    if len(records) > sample:
+        ctx.obj.log('    ...')
+
+
+def _is_apex_ns(record):
+    return record['type'] == 'NS' and \
+        record['domain'].rstrip('.').lower() == \
+        record['zone'].rstrip('.').lower()
+
+
+def _delete_matching(ctx, selectors, regex, dry_run, yes, include_apex_ns):
+    if not dry_run:
+        ctx.obj.check_write_lock()
+
+    records = select_records(ctx, selectors, regex)
+    apex_ns = [r for r in records if _is_apex_ns(r)]
+    if apex_ns and not include_apex_ns:
+        ctx.obj.log('Skipping the apex NS records of %d zones, give '
+                    '--include-apex-ns to delete them', len(apex_ns))
+        records = [r for r in records if not _is_apex_ns(r)]
+    if not records:
+        ctx.obj.log('No records match')
+        return
+
+    _log_selected(ctx, records)
+
+    if dry_run:
+        if ctx.obj.formatter.output_format != 'text':
+            ctx.obj.formatter.out_json(records)
+        return
+
+    ctx.obj.check_no_transaction('record delete')
+    if not yes:
+        click.confirm('Delete %d records?' % len(records), abort=True,
+                      err=True)
+
+    _delete_records(ctx, ctx.obj.start_job('record delete', records))
+
+
+def _delete_records(ctx, job):
+    def delete(r):
+        return ctx.obj.record_api.delete(r['zone'], r['domain'], r['type'])
+
+    records = job.pending()
+    results = []
+    failed = 0
+    for r, _, error in ctx.obj.pmap_job(job, delete, not_found):
+        result = {'zone': r['zone'],
+                  'domain': r['domain'],
+                  'type': r['type'],
+                  'status': 'deleted'}
+        if error is not None:
+            result['status'] = 'failed'
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_results(results)
+
+    if failed:
+        raise click.ClickException('%d of %d records failed to delete' %
+                                   (failed, len(records)))
+
+
+def _read_queries(f):
+    """Yields (ip, country, region) from lines of comma or space separated
+    CLIENT_IP [COUNTRY [REGION]]."""
+    for line in read_lines(f):
+        fields = line.replace(',', ' ').split()
+        fields += [''] * (3 - len(fields))
+        yield fields[0], fields[1], fields[2]
+
+
+@cli.command('simulate', short_help='Simulate the filter chain of a record')
+@optional_record_arguments
+@click.option('--record-file', type=click.File('r'),
+              help='Read the record as JSON (as from --output json record '
+                   'info) instead of retrieving it')
+@click.option('--queries', type=click.File('r'), required=True,
+              help='File of CLIENT_IP [COUNTRY [REGION]] lines, or - for '
+                   'stdin')
+@click.option('--seed', type=int,
+              help='Seed for the random filters, for repeatable results')
+@click.pass_context
+def simulate_record(ctx, seed, queries, record_file):
+    """Replays queries against a record's filter chain locally, and reports
+    how often each answer is returned first, and returned at all. Nothing is
+    changed on NS1, so a modified record can be checked with --record-file
+    before it is applied.
+
+    \b
+    QUERIES:
+        Each line holds a client ip address and optionally its country code
+        and georegion (US-EAST, US-CENTRAL, US-WEST, EUROPE, ASIAPAC,
+        SOUTH-AMERICA, AFRICA), separated by commas or spaces.
+
+    \b
+    FILTERS:
+        up, geotarget_country, geotarget_regional, netfence_prefix, priority,
+        select_first_n, shuffle and weighted_shuffle are simulated. Answers
+        whose up meta is a data feed are assumed to be up.
+
+    \b
+    EXAMPLES:
+        ns1 record simulate --queries queries.csv test.com geo A
+        ns1 record simulate --queries - --seed 1 test.com geo A < queries.txt
+        ns1 record simulate --record-file geo.json --queries queries.csv
+    """
+    if record_file:
+        if ctx.obj.ZONE:
+            raise click.BadArgumentUsage(
+                'ZONE DOMAIN TYPE cannot be given with --record-file')
+        try:
+            rdata = json.load(record_file)
+        except ValueError as e:
+            raise click.BadParameter('%s: %s' % (record_file.name, e))
+    else:
+        if not (ctx.obj.ZONE and ctx.obj.DOMAIN and ctx.obj.TYPE):
+            raise click.BadArgumentUsage('ZONE, DOMAIN and TYPE are required')
+        try:
+            rdata = ctx.obj.record_api.retrieve(ctx.obj.ZONE,
+                                                ctx.obj.DOMAIN,
+                                                ctx.obj.TYPE)
+        except ResourceException as e:
+            raise click.ClickException('REST API: %s' % e.message)
+
+    try:
+        simulator = simulate.Simulator(rdata, seed=seed)
+        total, first, returned = simulator.run(_read_queries(queries))
+    except simulate.SimulationError as e:
+        raise click.ClickException(str(e))
+
+    if not total:
+        raise click.BadParameter('no queries given')
+
+    if ctx.obj.formatter.output_format != 'text':
+        answers = set(first) | set(returned)
+        ctx.obj.formatter.out_json([{'answer': a,
+                                     'first': first[a],
+                                     'returned': returned[a]}
+                                    for a in sorted(answers,
+                                                    key=lambda a: -first[a])])
+        return
+
+    ctx.obj.formatter.print_simulation(total, first, returned)
+
+
+# Record fields the records api can update
+PATCH_FIELDS = ('answers', 'filters', 'link', 'meta', 'networks',
+                'override_ttl', 'regions', 'ttl', 'use_client_subnet')
+
+# What the fields of PATCH_FIELDS a patch removes are updated to; the others
+# cannot be removed
+EMPTY_FIELDS = {'answers': list, 'filters': list, 'meta': dict,
+                'networks': list, 'regions': dict}
+
+
+def _load_patch(value, name):
+    try:
+        return jsonpatch.compile_patch(value)
+    except jsonpatch.PatchError as e:
+        raise click.BadParameter('%s: %s' % (name, e))
+
+
+def _read_patch(ctx, param, value):
+    """Reads a patch given as JSON, or as a file of JSON with @FILE."""
+    if value is None:
+        return None
+    name = 'patch'
+    if value.startswith('@'):
+        name = value[1:]
+        try:
+            with click.open_file(name) as f:
+                value = f.read()
+        except (IOError, OSError) as e:
+            raise click.BadParameter('%s: %s' % (name, e))
+    try:
+        patch = json.loads(value)
+    except ValueError as e:
+        raise click.BadParameter('%s: %s' % (name, e))
+    _load_patch(patch, name)
+    return patch
+
+
+def _read_record_patches(f):
+    """Reads JSON lines of {"zone", "domain", "type", "patch"}."""
+    name = getattr(f, 'name', '-')
+    ops = []
+    for lineno, line in enumerate(read_lines(f), 1):
+        try:
+            op = json.loads(line)
+            zone, domain, type = op['zone'], op['domain'], op['type']
+        except (ValueError, KeyError, TypeError):
+            raise click.BadParameter('%s line %d: expected {"zone", '
+                                     '"domain", "type", "patch"}' %
+                                     (name, lineno))
+        _load_patch(op.get('patch'), '%s line %d' % (name, lineno))
+        if domain.find('.') == -1:
+            domain = '%s.%s' % (domain, zone)
+        ops.append({'zone': zone, 'domain': domain, 'type': type.upper(),
+                    'patch': op['patch']})
+    return ops
+
+
+def _fields_digest(record, fields):
+    values = json.dumps([record.get(f) for f in fields], sort_keys=True)
+    return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+
+def patch_record(record_api, zone, domain, type, patch, dry_run=False,
+                 before_update=None, applied=None):
+    """Retrieves a record, applies a compiled JSON patch to it, and updates
+    the fields that changed. Returns the patched record and whether it
+    changed; unchanged records are not written, and with dry_run nothing
+    is.
+
+    Patches need not be idempotent (e.g. adding to /answers/-), so for a
+    journaled job, before_update is called with the fields about to be
+    updated and their digest, and if applied is such a note of an earlier
+    run whose fields the record already has, it is not patched again."""
+    current = record_api.retrieve(zone, domain, type)
+    if applied is not None and \
+            _fields_digest(current, applied['fields']) == applied['digest']:
+        return current, True
+    patched = jsonpatch.apply_patch(patch, current)
+    for f in EMPTY_FIELDS:
+        if f in current and patched.get(f) is None:
+            patched[f] = EMPTY_FIELDS[f]()
+    fields = frozenset(current).union(patched)
+    changed = dict((f, patched.get(f)) for f in fields
+                   if current.get(f) != patched.get(f))
+    if not changed:
+        return current, False
+
+    fixed = sorted(f for f in changed if f not in PATCH_FIELDS)
+    if fixed:
+        raise jsonpatch.PatchError('%s cannot be changed' % ', '.join(fixed))
+    removed = sorted(f for f in changed if changed[f] is None)
+    if removed:
+        raise jsonpatch.PatchError('%s cannot be removed' % ', '.join(removed))
+    if 'answers' in changed:
+        validate.check_answers(type, changed['answers'] or [])
+    if dry_run:
+        return patched, True
+    if before_update is not None:
+        fields = sorted(changed)
+        before_update({'fields': fields,
+                       'digest': _fields_digest(patched, fields)})
+    return record_api.update(zone, domain, type, **changed), True
+
+
+def _patch_records(ctx, job, dry_run=False):
+    patches = {}
+
+    # pmap_job passes the job's own ops, so they map back to their index
+    indexes = {} if dry_run else \
+        dict((id(op), i) for i, op in enumerate(job.ops))
+
+    def patch(r):
+        key = json.dumps(r['patch'], sort_keys=True)
+        if key not in patches:
+            patches[key] = jsonpatch.compile_patch(r['patch'])
+        if dry_run:
+            return patch_record(ctx.obj.record_api, r['zone'], r['domain'],
+                                r['type'], patches[key], dry_run=True)[1]
+        index = indexes[id(r)]
+        return patch_record(ctx.obj.record_api, r['zone'], r['domain'],
+                            r['type'], patches[key],
+                            before_update=lambda n: job.note(index, n),
+                            applied=job.notes.get(index))[1]
+
+    if dry_run:
+        records = job
+        outcomes = ctx.obj.pmap(patch, records)
+    else:
+        records = job.pending()
+        outcomes = ctx.obj.pmap_job(job, patch)
+
+    results = []
+    failed = 0
+    for r, changed, error in outcomes:
+        result = {'zone': r['zone'],
+                  'domain': r['domain'],
+                  'type': r['type'],
+                  'status': 'updated' if changed else 'unchanged'}
+        if dry_run and changed:
+            result['status'] = 'would update'
+        if error is not None:
+            result['status'] = 'failed'
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_results(results)
+
+    if failed:
+        raise click.ClickException('%d of %d records failed to patch' %
+                                   (failed, len(records)))
+
+
+@cli.command('patch', short_help='Apply a JSON Patch to records')
+@write_options
+@optional_record_arguments
+@match_option
+@click.option('-p', '--patch', metavar='JSON|@FILE', callback=_read_patch,
+              help='RFC 6902 JSON Patch document, or @FILE to read it from '
+                   'a file (@- for stdin)')
+@click.option('--from-file', type=click.File('r'),
+              help='Read a JSON line of {"zone", "domain", "type", "patch"} '
+                   'per record from a file, or - for stdin')
+@click.option('--dry-run', is_flag=True,
+              help='Apply the patches locally and report what would change, '
+                   'without writing')
+@click.option('-y', '--yes', is_flag=True,
+              help='Do not ask for confirmation with --match')
+@workers_option
+@resume_option
+@click.pass_context
+def patch(ctx, resume, yes, dry_run, from_file, patch, selectors, regex):
+    """Applies a JSON Patch (RFC 6902) document to records: each record is
+    retrieved, patched locally, and updated only if the patch changed it,
+    which covers edits that have no command of their own, like reordering
+    filters or editing regions. Only answers, filters, link, meta, networks,
+    override_ttl, regions, ttl and use_client_subnet can be changed, and
+    patched answers are validated before anything is written. Removing
+    answers, filters, meta, networks or regions empties them; the other
+    fields cannot be removed.
+
+    
+    BULK PATCH:
+        Records may be selected with --match as for record delete, and are
+        patched concurrently with the same --patch. With --from-file, each
+        line names a record and its own patch. The result of every record
+        is reported, as JSON with --output json or ndjson. The updates are
+        journaled as a job, continued with --resume JOB_ID if interrupted.
+
+    
+    EXAMPLES:
+        ns1 record patch test.com www A -p '[{"op": "replace", "path": "/ttl", "value": 300}]'
+        ns1 record patch test.com geo A -p '[{"op": "move", "from": "/filters/2", "path": "/filters/0"}]'
+        ns1 record patch --match zone=test.com --match type=A -p @patch.json
+        ns1 record patch --from-file patches.jsonl --dry-run
+        ns1 record patch --resume 20161019120000-1a2b3c
+    """
+    if resume:
+        if ctx.obj.ZONE or selectors or patch or from_file:
+            raise click.BadArgumentUsage(
+                'records and patches cannot be given with --resume')
+        ctx.obj.check_write_lock()
+        return _patch_records(ctx, ctx.obj.resume_job('record patch', resume))
+
+    if not dry_run:
+        ctx.obj.check_write_lock()
+
+    if from_file:
+        if ctx.obj.ZONE or selectors or patch:
+            raise click.BadArgumentUsage(
+                'ZONE DOMAIN TYPE, --match and --patch cannot be given with '
+                '--from-file')
+        records = _read_record_patches(from_file)
+    else:
+        if patch is None:
+            raise click.BadArgumentUsage('--patch or --from-file is required')
+        if selectors:
+            if ctx.obj.ZONE:
+                raise click.BadArgumentUsage(
+                    'ZONE DOMAIN TYPE cannot be given with --match')
+            records = select_records(ctx, selectors, regex)
+            if not records:
+                ctx.obj.log('No records match')
+                return
+            _log_selected(ctx, records)
+        elif not (ctx.obj.ZONE and ctx.obj.DOMAIN and ctx.obj.TYPE):
+            raise click.BadArgumentUsage('ZONE, DOMAIN and TYPE are required')
+        else:
+            return _patch_one(ctx, _load_patch(patch, 'patch'), dry_run)
+        records = [{'zone': r['zone'], 'domain': r['domain'],
+                    'type': r['type'], 'patch': patch} for r in records]
+
+    if dry_run:
+        return _patch_records(ctx, records, dry_run=True)
+
+    ctx.obj.check_no_transaction('record patch')
+    if selectors and not yes:
+        click.confirm('Patch %d records?' % len(records), abort=True,
+                      err=True)
+    _patch_records(ctx, ctx.obj.start_job('record patch', records))
+
+
+def _patch_one(ctx, patch, dry_run):
+    try:
+        rdata, changed = patch_record(ctx.obj.record_api, ctx.obj.ZONE,
+                                      ctx.obj.DOMAIN, ctx.obj.TYPE, patch,
+                                      dry_run)
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+    except (jsonpatch.PatchError, validate.ValidationError) as e:
+        raise click.ClickException(str(e))
+
+    if not changed:
+        ctx.obj.log('%s %s unchanged', ctx.obj.DOMAIN, ctx.obj.TYPE)
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(rdata)
+        return
+
+    ctx.obj.formatter.print_record(rdata)
+
+
 # META
 
 @cli.group('meta', short_help='View and modify record meta')
@@ -280,7 +852,7 @@ def meta_set(ctx, val, key):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -323,7 +895,7 @@ def meta_remove(ctx, key):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -341,66 +913,235 @@ def answer(ctx):
     pass
 
 
-@answer.command('add', short_help='Add an answer to a record')
-@write_options
-@record_arguments
-@click.option('--mx_priority', type=int, required=False, multiple=True,
-              help='MX priority (ignored if type is not MX)')
-@click.argument('ANSWER')
-@click.pass_context
-def add(ctx, mx_priority, answer):
-    """Add an ANSWER to a record.
+def _answer_fields(type, line):
+    """Splits an answer given as text into its rdata fields. TXT and SPF
+    answers are a single field, spaces and all."""
+    if type.upper() in validate.TEXT_TYPES:
+        return [line]
+    return [int(f) if f.isdigit() else f for f in line.split()]
 
-    \b
-    EXAMPLES:
-         ns1 record answer add geo.test geocname.geo.test CNAME 1.1.1.1
-    """
-    ctx.obj.check_write_lock()
 
-    answer = [answer]
+def _answer_key(fields):
+    return ' '.join(str(f) for f in fields).lower()
 
-    if ctx.obj.TYPE == 'MX':
-        if not mx_priority:
-            raise click.BadArgumentUsage('MX answer must have a priority')
-        answer.append(mx_priority)
+
+def _answers_from_args(type, answers, mx_priority):
+    if type == 'MX' and mx_priority:
+        if len(mx_priority) != len(answers):
+            raise click.BadArgumentUsage('every answer must have a priority')
+        return [[p, a] for p, a in zip(mx_priority, answers)]
+    elif mx_priority:
+        raise click.BadOptionUsage('MX_priority is only allwed for MX records')
+    return [_answer_fields(type, a) for a in answers]
+
+
+def _read_record_answers(f):
+    """Reads 'ZONE DOMAIN TYPE RDATA...' lines, one answer per line, and
+    groups the answers by record."""
+    records = collections.OrderedDict()
+    for line in read_lines(f):
+        parts = line.split(None, 3)
+        if len(parts) != 4:
+            raise click.BadParameter('expected ZONE DOMAIN TYPE ANSWER, '
+                                     'got: %s' % line)
+        zone, domain, type, answer = parts
+        if domain.find('.') == -1:
+            domain = '%s.%s' % (domain, zone)
+        records.setdefault((zone, domain, type.upper()), []).append(
+            _answer_fields(type, answer))
+    return records
+
+
+def edit_answers(record_api, zone, domain, type, add=(), remove=(),
+                 missing_ok=False):
+    """Adds and removes answers of a record with a single retrieve and a
+    single update. Answers are lists of rdata fields. Answers to add that
+    the record already has are skipped; answers to remove must exist,
+    unless missing_ok. Returns the updated record."""
+    current = record_api.retrieve(zone, domain, type)
+    answers = current['answers']
+    existing = set(_answer_key(a['answer']) for a in answers)
+
+    if remove:
+        remove = set(_answer_key(a) for a in remove)
+        missing = remove - existing
+        if missing and not missing_ok:
+            raise click.BadParameter('%s not a current answer for %s %s' %
+                                     (', '.join(sorted(missing)), domain,
+                                      type))
+        answers = [a for a in answers
+                   if _answer_key(a['answer']) not in remove]
+
+    changed = len(answers) != len(current['answers'])
+    for a in add:
+        if _answer_key(a) not in existing:
+            existing.add(_answer_key(a))
+            answers.append({'answer': a})
+            changed = True
+
+    if not changed:
+        return current
+    return record_api.update(zone, domain, type, answers=answers)
+
+
+def _edit_answers_command(ctx, answers, mx_priority, file, from_file, mode,
+                          resume):
+    ctx.obj.check_write_lock()
+
+    if from_file or resume:
+        if ctx.obj.ZONE or answers or file or (from_file and resume):
+            raise click.BadArgumentUsage(
+                'ZONE DOMAIN TYPE and answers cannot be given with '
+                '--from-file or --resume')
+        command = 'record answer %s' % mode
+        if resume:
+            job = ctx.obj.resume_job(command, resume)
+        else:
+            ops = [{'zone': zone, 'domain': domain, 'type': type,
+                    'answers': edits}
+                   for (zone, domain, type), edits in
+                   _read_record_answers(from_file).items()]
+            if mode == 'add':
+                errors = [e for e in validate.record_errors(ops)]
+                if errors:
+                    raise click.ClickException(validate.summary(errors))
+            job = ctx.obj.start_job(command, ops)
+
+        def edit(r):
+            # a resumed job may have removed answers it did not journal
+            return edit_answers(ctx.obj.record_api, r['zone'], r['domain'],
+                                r['type'], missing_ok=job.resumed,
+                                **{mode: r['answers']})
+
+        records = job.pending()
+        results = []
+        failed = 0
+        for r, _, error in ctx.obj.pmap_job(job, edit):
+            zone, domain, type = r['zone'], r['domain'], r['type']
+            result = {'zone': zone,
+                      'domain': domain,
+                      'type': type,
+                      'status': 'updated'}
+            if error is not None:
+                result['status'] = 'failed'
+                result['error'] = getattr(error, 'message', str(error))
+                failed += 1
+            results.append(result)
+
+        if ctx.obj.formatter.output_format != 'text':
+            ctx.obj.formatter.out_json(results)
+        else:
+            ctx.obj.formatter.print_results(results)
+
+        if failed:
+            raise click.ClickException('%d of %d records failed to update' %
+                                       (failed, len(records)))
+        return
+
+    if not (ctx.obj.ZONE and ctx.obj.DOMAIN and ctx.obj.TYPE):
+        raise click.BadArgumentUsage('ZONE, DOMAIN and TYPE are required')
+
+    answers = _answers_from_args(ctx.obj.TYPE, answers, mx_priority)
+    if file:
+        answers.extend(_answer_fields(ctx.obj.TYPE, line)
+                       for line in read_lines(file))
+    if not answers:
+        raise click.BadArgumentUsage('at least one answer is required')
+    if mode == 'add':
+        try:
+            validate.check_answers(ctx.obj.TYPE, answers)
+        except validate.ValidationError as e:
+            raise click.BadArgumentUsage(str(e))
 
     try:
-        record = ctx.obj.rest.loadRecord(ctx.obj.DOMAIN,
-                                         ctx.obj.TYPE,
-                                         zone=ctx.obj.ZONE)
-        record = record.addAnswers(answer)
+        rdata = edit_answers(ctx.obj.record_api, ctx.obj.ZONE,
+                             ctx.obj.DOMAIN, ctx.obj.TYPE,
+                             **{mode: answers})
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
-            ctx.obj.formatter.out_json(record.data)
+        if ctx.obj.formatter.output_format != 'text':
+            ctx.obj.formatter.out_json(rdata)
             return
 
-        ctx.obj.formatter.print_record(record.data)
+        ctx.obj.formatter.print_record(rdata)
 
 
-# @answer.command('remove', short_help='remove an answer from a record')
-# @write_options
-# @record_arguments
-# @click.argument('ANSWER')
-# @click.pass_context
-# def remove(ctx, answer):
-#     """remove an answer from a record
-#
-#     Examples:
-#
-#          record answer remove geo.test geocname.geo.test CNAME 1.1.1.1
-#     """
-#     if not ctx.obj.force:
-#         ctx.obj.check_write_lock()
-#
-#     answer = [answer]
-#     record = ctx.obj.rest.loadRecord(ctx.obj.DOMAIN,
-#                                       ctx.obj.TYPE,
-#                                       zone=ctx.obj.ZONE)
-#     #@TODO: NOT WORKING
-#     record = record.removeAnswers(answer)
-#     ctx.obj.formatter.print_record(record.data)
+def answers_input_options(f):
+    f = resume_option(f)
+    f = workers_option(f)
+    f = click.option('--from-file', type=click.File('r'),
+                     help='Read ZONE DOMAIN TYPE ANSWER lines for many '
+                          'records from a file, or - for stdin')(f)
+    f = click.option('--file', type=click.File('r'),
+                     help='Read answers, one per line, from a file, '
+                          'or - for stdin')(f)
+    f = click.option('--mx_priority', type=int, required=False,
+                     multiple=True,
+                     help='MX priority (ignored if type is not MX)')(f)
+    return f
+
+
+@answer.command('add', short_help='Add answers to a record')
+@write_options
+@optional_record_arguments
+@answers_input_options
+@click.argument('ANSWERS', required=False, nargs=-1)
+@click.pass_context
+def add(ctx, answers, mx_priority, file, from_file, resume):
+    """Add one or more ANSWERS to a record. The record is retrieved and
+    updated once, however many answers are added. Answers the record already
+    has are skipped.
+
+    \b
+    ANSWERS:
+        Answers may be given as arguments, and/or read from --file with one
+        answer per line. Answers with several rdata fields are given as one
+        space separated string, e.g. '10 mail.test.com' for MX. As with
+        record create, MX answers given as arguments may instead be paired
+        with --mx_priority options.
+
+    \b
+    MANY RECORDS:
+        With --from-file, each line holds ZONE DOMAIN TYPE ANSWER, and the
+        answers are added to each record with one update, with the records
+        updated concurrently. The updates are journaled as a job, and an
+        interrupted run is continued with --resume JOB_ID.
+
+    \b
+    EXAMPLES:
+         ns1 record answer add geo.test geocname.geo.test CNAME 1.1.1.1
+         ns1 record answer add test.com pool A 10.0.0.1 10.0.0.2 10.0.0.3
+         ns1 record answer add test.com mail MX --mx_priority 10 1.1.1.1
+         ns1 record answer add test.com mail MX '20 mail2.test.com'
+         ns1 record answer add --file backends.txt test.com pool A
+         cat answers.txt | ns1 record answer add --from-file -
+    """
+    _edit_answers_command(ctx, answers, mx_priority, file, from_file, 'add',
+                          resume)
+
+
+@answer.command('remove', short_help='Remove answers from a record')
+@write_options
+@optional_record_arguments
+@answers_input_options
+@click.argument('ANSWERS', required=False, nargs=-1)
+@click.pass_context
+def answer_remove(ctx, answers, mx_priority, file, from_file, resume):
+    """Remove one or more ANSWERS from a record. The record is retrieved
+    and updated once, however many answers are removed. Answers are given
+    as for record answer add, and must all be current answers of the
+    record.
+
+    \b
+    EXAMPLES:
+         ns1 record answer remove test.com pool A 10.0.0.1 10.0.0.2
+         ns1 record answer remove test.com mail MX '10 1.1.1.1'
+         ns1 record answer remove --file retired.txt test.com pool A
+         ns1 record answer remove --from-file retired.txt
+    """
+    _edit_answers_command(ctx, answers, mx_priority, file, from_file,
+                          'remove', resume)
 
 
 # @TODO: Have to wait for Click v7.0 for nested command chaining
@@ -466,7 +1207,7 @@ def answer_meta_set(ctx, val, key, answer):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -516,7 +1257,7 @@ def answer_meta_remove(ctx, key, answer):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -585,7 +1326,7 @@ def add(ctx, region):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -631,7 +1372,7 @@ def remove(ctx, region):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -682,7 +1423,7 @@ def region_meta_set(ctx, val, key, region):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -732,7 +1473,7 @@ def region_meta_remove(ctx, key, region):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(rdata)
             return
 
@@ -0,0 +1,172 @@
+import csv
+import sys
+
+import click
+from nsone.rest.resource import ResourceException
+
+from ns1cli.cli import workers_option
+from ns1cli.table import Table
+from ns1cli.util import Formatter
+
+
+# SOA timers NS1 gives a zone when none are specified
+DEFAULT_SOA = {'refresh': 43200,
+               'retry': 7200,
+               'expiry': 1209600,
+               'nx_ttl': 3600}
+
+SECTIONS = ('ttl', 'types', 'no-filters', 'many-answers', 'default-soa')
+
+
+class ReportFormatter(Formatter):
+
+    def print_section(self, name, columns, rows):
+        click.secho('%s:' % name.upper(), bold=True)
+        if not rows:
+            self.out('  NONE')
+            return
+        widths = [max(len(str(v)) for v in col)
+                  for col in zip(columns, *rows)]
+        for row in [columns] + rows:
+            self.out('  ' + '  '.join(str(v).ljust(w)
+                                      for v, w in zip(row, widths)).rstrip())
+
+    def print_csv(self, name, columns, rows):
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['section'] + columns)
+        for row in rows:
+            writer.writerow([name] + list(row))
+
+
+def _fetch(ctx, records):
+    """Returns the zone table and record table of the account."""
+    zone_api = ctx.obj.rest.zones()
+    try:
+        zlist = zone_api.list()
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+
+    zones = Table(['zone'] + sorted(DEFAULT_SOA))
+    for z in zlist:
+        zones.append(z)
+
+    rtable = Table(['zone', 'domain', 'type', 'ttl', 'answers', 'tier',
+                    'filters'])
+    summaries = []
+    for zone, zdata, error in ctx.obj.pmap(zone_api.retrieve,
+                                           zones.columns['zone']):
+        if error is not None:
+            raise click.ClickException('REST API: %s: %s' %
+                                       (zone, getattr(error, 'message',
+                                                      error)))
+        for r in zdata['records']:
+            summaries.append({'zone': zone,
+                              'domain': r['domain'],
+                              'type': r['type'],
+                              'ttl': r.get('ttl'),
+                              'answers': len(r.get('short_answers', [])),
+                              'tier': r.get('tier')})
+
+    if records:
+        record_api = ctx.obj.rest.records()
+
+        def retrieve(s):
+            return record_api.retrieve(s['zone'], s['domain'], s['type'])
+
+        for s, rdata, error in ctx.obj.pmap(retrieve, summaries):
+            if error is not None:
+                raise click.ClickException(
+                    'REST API: %s %s: %s' % (s['domain'], s['type'],
+                                             getattr(error, 'message',
+                                                     error)))
+            s['ttl'] = rdata.get('ttl', s['ttl'])
+            s['answers'] = len(rdata.get('answers', []))
+            s['filters'] = len(rdata.get('filters', []))
+
+    for s in summaries:
+        rtable.append(s)
+    return zones, rtable
+
+
+def _sections(zones, records, max_answers):
+    """Computes the report sections as (name, columns, rows) tuples."""
+    yield ('ttl', ['ttl', 'records'], records.count_by('ttl'))
+
+    yield ('types', ['zone', 'type', 'records'],
+           records.count_by('zone', 'type'))
+
+    if any(f is not None for f in records.columns['filters']):
+        unfiltered = records.where('filters', lambda f: f == 0)
+    else:
+        # without full records, tier 1 means no filter chain
+        unfiltered = records.where('tier', lambda t: t == 1)
+    yield ('no-filters', ['zone', 'domain', 'type'],
+           unfiltered.rows('zone', 'domain', 'type'))
+
+    many = records.where('answers', lambda n: n > max_answers)
+    yield ('many-answers', ['zone', 'domain', 'type', 'answers'],
+           many.rows('zone', 'domain', 'type', 'answers'))
+
+    default = zones
+    for timer, value in sorted(DEFAULT_SOA.items()):
+        default = default.where(timer, lambda v, d=value: v == d)
+    yield ('default-soa', ['zone'], default.rows('zone'))
+
+
+@click.command('report', short_help='Account-wide record analytics')
+@click.option('--records', is_flag=True,
+              help='Retrieve every record for exact answer and filter counts')
+@click.option('--max-answers', type=int, default=100,
+              help='Answer count above which records are reported '
+                   '(defaults to 100)')
+@click.option('--section', 'sections', multiple=True,
+              type=click.Choice(SECTIONS),
+              help='Only compute the given sections')
+@click.option('--csv', 'as_csv', is_flag=True,
+              help='Write the sections as CSV, each with its own header row')
+@workers_option
+@click.pass_context
+def cli(ctx, as_csv, sections, max_answers, records):
+    """Reports on every zone and record in the account:
+
+    \b
+        ttl           number of records per TTL
+        types         number of records per zone and record type
+        no-filters    records without a filter chain
+        many-answers  records with more than --max-answers answers
+        default-soa   zones with the default SOA timers
+
+    \b
+    Zones are retrieved concurrently, and the records they list are loaded
+    into a column oriented table for the aggregates. By default, filters are
+    judged from each record's tier and answers from its short answers; with
+    --records, every record is also retrieved (concurrently) to count them
+    exactly.
+
+    \b
+    EXAMPLES:
+        ns1 report
+        ns1 report --records --workers 20
+        ns1 report --section ttl --csv > ttl.csv
+        ns1 --output json report --section many-answers --max-answers 50
+    """
+    ctx.obj.formatter = ReportFormatter(ctx.obj.get_config('output_format'),
+                                        **ctx.obj.output_filters)
+
+    zones, rtable = _fetch(ctx, records)
+    ctx.obj.vlog('%d zones, %d records', len(zones), len(rtable))
+
+    results = [s for s in _sections(zones, rtable, max_answers)
+               if not sections or s[0] in sections]
+
+    if as_csv:
+        for name, columns, rows in results:
+            ctx.obj.formatter.print_csv(name, columns, rows)
+    elif ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json([{'section': name,
+                                     'rows': [dict(zip(columns, row))
+                                              for row in rows]}
+                                    for name, columns, rows in results])
+    else:
+        for name, columns, rows in results:
+            ctx.obj.formatter.print_section(name, columns, rows)
@@ -1,18 +1,52 @@
+import heapq
+import os
+import time
+
 import click
 from nsone.rest.resource import ResourceException
 
-from ns1cli.cli import cli, State
+from ns1cli import tsdb
+from ns1cli.cli import cli, State, workers_option, keys_options
 from ns1cli.util import Formatter
 
 
 class StatsFormatter(Formatter):
 
     def print_qps(self, zone_data, qdata):
-        click.secho('%s %s %s' % (zone_data.get('zone', 'Account-Wide'),
-                                  zone_data.get('domain', ''),
-                                  zone_data.get('type', '')), bold=True)
+        qdata = dict(qdata)
+        key = qdata.pop('key', None)
+        click.secho('%s%s %s %s' % ('[%s] ' % key if key else '',
+                                    zone_data.get('zone', 'Account-Wide'),
+                                    zone_data.get('domain', ''),
+                                    zone_data.get('type', '')), bold=True)
         self.pretty_print(qdata)
 
+    def print_top(self, ranked):
+        widths = [max([len(h)] + [len(str(r[k])) for r in ranked])
+                  for h, k in (('ZONE', 'zone'), ('DOMAIN', 'domain'),
+                               ('TYPE', 'type'))]
+        click.secho('%4s  %10s  %6s  %s  %s  %s' % (
+            '#', 'QPS', 'SHARE', 'ZONE'.ljust(widths[0]),
+            'DOMAIN'.ljust(widths[1]), 'TYPE'), bold=True)
+        for i, r in enumerate(ranked, 1):
+            self.out('%4d  %10.2f  %5.1f%%  %s  %s  %s' % (
+                i, r['qps'], 100 * r['share'], r['zone'].ljust(widths[0]),
+                r['domain'].ljust(widths[1]), r['type']))
+
+    TIME_FORMATS = {'hour': '%Y-%m-%d %H:00',
+                    'day': '%Y-%m-%d',
+                    'month': '%Y-%m'}
+
+    def print_usage(self, scope, buckets, resolution):
+        click.secho('%s %s %s' % (scope.get('zone', 'Account-Wide'),
+                                  scope.get('domain', ''),
+                                  scope.get('type', '')), bold=True)
+        fmt = self.TIME_FORMATS[resolution]
+        for ts, count in buckets:
+            self.out('    %s  %d' % (time.strftime(fmt, time.gmtime(ts)),
+                                     count))
+        self.out('    total  %d' % sum(c for _, c in buckets))
+
 
 def zone_argument(f):
     def callback(ctx, param, value):
@@ -53,7 +87,8 @@ def record_arguments(f):
 @click.pass_context
 def cli(ctx):
     """Get usage/qps on zones and records"""
-    ctx.obj.formatter = StatsFormatter(ctx.obj.get_config('output_format'))
+    ctx.obj.formatter = StatsFormatter(ctx.obj.get_config('output_format'),
+                                       **ctx.obj.output_filters)
     ctx.obj.stats_api = ctx.obj.rest.stats()
 
 
@@ -61,6 +96,8 @@ def cli(ctx):
 @click.argument('ZONE', required=False, metavar='[ZONE]')
 @click.argument('DOMAIN', required=False, metavar='[[DOMAIN')
 @click.argument('TYPE', required=False, metavar='TYPE]]')
+@keys_options
+@workers_option
 @click.pass_context
 def qps(ctx, type, domain, zone):
     """Retrieve real time queries per second for a zone or a record.
@@ -73,10 +110,14 @@ def qps(ctx, type, domain, zone):
     If DOMAIN and TYPE are both given, then the statistics are limited
     to the given FQDN.
 
+    With --keys or --all-keys, statistics are retrieved for several api keys
+    concurrently and labelled with the key id they belong to.
+
     \b
     EXAMPLES:
        ns1 qps test.com
        ns1 qps test.com test A
+       ns1 qps --all-keys
     """
     kwargs = {}
     if zone:
@@ -94,22 +135,219 @@ def qps(ctx, type, domain, zone):
         kwargs['type'] = type
 
     try:
-        qps = ctx.obj.stats_api.qps(**kwargs)
+        qps, failed = ctx.obj.fan_out(lambda rest: rest.stats().qps(**kwargs))
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(qps)
+    else:
+        if isinstance(qps, dict):
+            qps = [qps]
+        for q in qps:
+            ctx.obj.formatter.print_qps(kwargs, q)
+    ctx.obj.check_keys(failed)
+
+
+def _positive(ctx, param, value):
+    if value <= 0:
+        raise click.BadParameter('must be greater than 0')
+    return value
+
+
+@cli.command('top', short_help='Rank the records with the most queries')
+@click.option('-n', 'count', type=click.IntRange(1), default=20,
+              help='Number of records to show (defaults to 20)')
+@click.option('--all-zones', is_flag=True,
+              help='Rank the records of every zone in the account')
+@click.option('--rate', type=float, default=20, callback=_positive,
+              help='Maximum qps requests per second (defaults to 20)')
+@workers_option
+@click.argument('ZONE', required=False)
+@click.pass_context
+def top(ctx, zone, rate, all_zones, count):
+    """Ranks the records of ZONE by their real time queries per second, and
+    shows each record's share of its zone's queries.
+
+    \b
+    The qps of every record is retrieved concurrently, with at most --rate
+    requests started per second to stay clear of the api rate limits.
+
+    \b
+    EXAMPLES:
+       ns1 stats top test.com
+       ns1 stats top -n 5 test.com
+       ns1 stats top --all-zones --workers 20 --rate 50
+    """
+    if all_zones == bool(zone):
+        raise click.BadArgumentUsage('Either ZONE or --all-zones is required')
+
+    zone_api = ctx.obj.rest.zones()
+    if all_zones:
+        try:
+            zones = [z['zone'] for z in zone_api.list()]
+        except ResourceException as e:
+            raise click.ClickException('REST API: %s' % e.message)
+    else:
+        zones = [zone]
+
+    records = []
+    for z, zdata, error in ctx.obj.pmap(zone_api.retrieve, zones):
+        if error is not None:
+            raise click.ClickException('REST API: %s: %s' %
+                                       (z, getattr(error, 'message', error)))
+        records.extend((z, r['domain'], r['type'])
+                       for r in zdata['records'])
+
+    def fetch(record):
+        zone, domain, type = record
+        return ctx.obj.stats_api.qps(zone=zone, domain=domain, type=type)
+
+    totals = {}
+    measured = []
+    failed = 0
+    for (z, domain, type), qdata, error in ctx.obj.pmap(fetch, records,
+                                                        rate=rate):
+        if error is not None:
+            ctx.obj.log('%s %s: %s', domain, type,
+                        getattr(error, 'message', error))
+            failed += 1
+            continue
+        qps = float(qdata.get('qps', 0))
+        totals[z] = totals.get(z, 0.0) + qps
+        measured.append((qps, z, domain, type))
+
+    ranked = []
+    for qps, z, domain, type in heapq.nlargest(count, measured):
+        ranked.append({'zone': z,
+                       'domain': domain,
+                       'type': type,
+                       'qps': qps,
+                       'share': qps / totals[z] if totals[z] else 0.0})
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(ranked)
     else:
-        if ctx.obj.formatter.output_format == 'json':
-            ctx.obj.formatter.out_json(qps)
-            return
+        ctx.obj.formatter.print_top(ranked)
+
+    if failed:
+        raise click.ClickException('REST API: failed to retrieve qps for '
+                                   '%d of %d records' % (failed, len(records)))
+
+
+def _series_name(scope):
+    if not scope:
+        return 'account'
+    return '/'.join(scope[k] for k in ('zone', 'domain', 'type') if k in scope)
 
-        ctx.obj.formatter.print_qps(kwargs, qps)
 
+def _usage_points(data):
+    """Sums the usage graphs of an api response by timestamp."""
+    if isinstance(data, dict):
+        data = [data]
+    totals = {}
+    for item in data:
+        for ts, count in item.get('graph', []):
+            totals[ts] = totals.get(ts, 0) + count
+    return sorted(totals.items())
+
+
+@cli.command('usage', short_help='Retrieve historical query volume')
+@click.option('--all-zones', is_flag=True,
+              help='Report usage for every zone in the account')
+@click.option('--by', 'resolution', type=click.Choice(tsdb.RESOLUTIONS),
+              default='day', help='Aggregate usage by hour, day or month')
+@click.option('--days', type=int, default=30,
+              help='Days of history to report (defaults to 30)')
+@click.option('--no-cache', is_flag=True,
+              help='Ignore and do not update the local usage cache')
+@workers_option
+@click.argument('ZONE', required=False, metavar='[ZONE]')
+@click.argument('DOMAIN', required=False, metavar='[[DOMAIN')
+@click.argument('TYPE', required=False, metavar='TYPE]]')
+@click.pass_context
+def usage(ctx, type, domain, zone, no_cache, days, resolution, all_zones):
+    """Retrieve the query volume of the account, a zone or a record over time.
+
+    \b
+    If no arguments are given, then statistics are account-wide.
+
+    If ZONE is given, statistics are limited to this zone.
+
+    If DOMAIN and TYPE are both given, then the statistics are limited
+    to the given FQDN.
+
+    \b
+    CACHE:
+        Fetched usage is kept in a local cache under the ns1 directory, so
+        repeat reports only request the periods that are not cached yet,
+        and history older than the api's 30 day window is retained.
+
+    \b
+    EXAMPLES:
+       ns1 stats usage
+       ns1 stats usage --by month test.com
+       ns1 stats usage --by hour --days 2 test.com test A
+       ns1 stats usage --all-zones --workers 20
+    """
+    if all_zones:
+        if zone:
+            raise click.BadArgumentUsage(
+                'A zone cannot be given with --all-zones')
+        try:
+            scopes = [{'zone': z['zone']}
+                      for z in ctx.obj.rest.zones().list()]
+        except ResourceException as e:
+            raise click.ClickException('REST API: %s' % e.message)
+    else:
+        scope = {}
+        if zone:
+            scope['zone'] = zone
+        if domain and type:
+            if domain.find('.') == -1:
+                domain = '%s.%s' % (domain, zone)
+            scope['domain'] = domain
+            scope['type'] = type
+        scopes = [scope]
+
+    key_id = ctx.obj.rest.config.getCurrentKeyID() or 'default'
+    root = os.path.join(ctx.obj.home_dir, 'usage', key_id)
+    now = int(time.time())
+
+    def fetch(scope):
+        series = tsdb.Series(root, _series_name(scope))
+        last = None if no_cache else series.last_timestamp()
+        data = ctx.obj.stats_api.usage(period=tsdb.fetch_period(last, now),
+                                       aggregate=True, **scope)
+        points = _usage_points(data)
+        if no_cache:
+            return [p[0] for p in points], [p[1] for p in points]
+        series.update(points)
+        return series.load()
+
+    since = now - days * tsdb.DAY
+    results = []
+    failed = 0
+    for scope, series, error in ctx.obj.pmap(fetch, scopes):
+        if error is not None:
+            ctx.obj.log('%s: %s', _series_name(scope),
+                        getattr(error, 'message', error))
+            failed += 1
+            continue
+        buckets = tsdb.downsample(series[0], series[1], resolution, since)
+        results.append((scope, buckets))
+
+    if ctx.obj.formatter.output_format != 'text':
+        out = []
+        for scope, buckets in results:
+            scope = dict(scope)
+            scope['usage'] = buckets
+            out.append(scope)
+        ctx.obj.formatter.out_json(out)
+    else:
+        for scope, buckets in results:
+            ctx.obj.formatter.print_usage(scope, buckets, resolution)
 
-# @cli.command('usage', short_help='usage ..',
-#              options_metavar='[options]')
-# @click.argument('ZONE', required=False, metavar='[ZONE]')
-# @click.argument('DOMAIN', required=False, metavar='[[DOMAIN]')
-# @click.argument('TYPE', required=False, metavar='[TYPE]]')
-# @click.pass_context
-# def usage(ctx, type, domain, zone):
-#   pass
+    if failed:
+        raise click.ClickException('REST API: failed to retrieve usage for '
+                                   '%d of %d scopes' % (failed, len(scopes)))
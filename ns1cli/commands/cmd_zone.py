@@ -1,6 +1,14 @@
+import copy
+import hashlib
+import json
+import re
+import time
+
 import click
-from ns1cli.cli import cli, write_options
-from ns1cli.util import Formatter
+from ns1cli import merkle, validate, zonefile
+from ns1cli.cli import (cli, write_options, workers_option, keys_options,
+                        resume_option)
+from ns1cli.util import Formatter, already_exists, not_found, retrying
 from nsone.rest.resource import ResourceException
 
 
@@ -22,38 +30,79 @@ class ZoneFormatter(Formatter):
                                       r['type'].ljust(5),
                                       ', '.join(r['short_answers'])))
 
+    def print_event(self, event):
+        self.out('%s  %-7s  %s  %s  %s' % (
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['time'])),
+            event['event'], event['zone'], event['domain'], event['type']))
+
+    def print_drift(self, rows):
+        longest = self._longest([r['domain'] or r['zone'] for r in rows])
+        for r in rows:
+            self.out((' %s  %s  %s  %s' % (
+                (r['domain'] or r['zone']).ljust(longest),
+                (r['type'] or '-').ljust(5), r['status'].ljust(10),
+                ', '.join(r.get('fields', [])))).rstrip())
+
+    def print_results(self, results):
+        longest = self._longest([r['zone'] for r in results])
+        for r in results:
+            self.out(' %s  %s' % (r['zone'].ljust(longest),
+                                  r.get('error', r['status'])))
+
+    def print_import(self, results):
+        longestRec = self._longest([r['domain'] for r in results])
+        for r in results:
+            self.out(' %s  %s  %s' % (r['domain'].ljust(longestRec),
+                                      r['type'].ljust(5),
+                                      r.get('error', 'created')))
+
 
 @click.group('zone',
              short_help='View and modify zone soa data')
 @click.pass_context
 def cli(ctx):
     """Create, retrieve, update, and delete zone SOA data"""
-    ctx.obj.formatter = ZoneFormatter(ctx.obj.get_config('output_format'))
+    ctx.obj.formatter = ZoneFormatter(ctx.obj.get_config('output_format'),
+                                      **ctx.obj.output_filters)
     ctx.obj.zone_api = ctx.obj.rest.zones()
 
 
 @cli.command('list', short_help='List all active zones')
+@keys_options
+@workers_option
 @click.pass_context
 def list(ctx):
     """Returns all active zones and basic zone configuration details
     for each.
 
+    \b
+    With --keys or --all-keys, zones are listed for several api keys
+    concurrently and labelled with the key id they belong to.
+
     \b
     EXAMPLES:
         zone list
+        zone list --all-keys
+        zone list --keys prod,staging
     """
     try:
-        zlist = ctx.obj.zone_api.list()
+        zlist, failed = ctx.obj.fan_out(lambda rest: rest.zones().list())
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
-    else:
-        if ctx.obj.formatter.output_format == 'json':
-            ctx.obj.formatter.out_json(zlist)
-            return
 
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(zlist)
+    else:
         click.secho('ZONES:', bold=True)
+        longestKey = ctx.obj.formatter._longest([z.get('key', '')
+                                                 for z in zlist])
         for z in zlist:
-            ctx.obj.formatter.out('  ' + z['zone'])
+            if 'key' in z:
+                ctx.obj.formatter.out('  %s  %s' % (z['key'].ljust(longestKey),
+                                                    z['zone']))
+            else:
+                ctx.obj.formatter.out('  ' + z['zone'])
+    ctx.obj.check_keys(failed)
 
 
 @cli.command('info', short_help='Get zone details')
@@ -73,7 +122,7 @@ def info(ctx, zone):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(zdata)
             return
 
@@ -146,7 +195,7 @@ def create(ctx, nx_ttl, expiry, retry, refresh, link, zone):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(zdata)
             return
 
@@ -192,7 +241,7 @@ def set(ctx, nx_ttl, expiry, retry, refresh, zone):
     except ResourceException as e:
         raise click.ClickException('REST API: %s' % e.message)
     else:
-        if ctx.obj.formatter.output_format == 'json':
+        if ctx.obj.formatter.output_format != 'text':
             ctx.obj.formatter.out_json(zdata)
             return
 
@@ -223,3 +272,766 @@ def delete(ctx, zone):
     else:
         click.echo('{} deleted'.format(zone))
 
+
+@cli.command('import', short_help='Import records from a BIND zone file')
+@click.argument('FILE', type=click.File('r'), required=False)
+@click.argument('ZONE', required=False)
+@write_options
+@workers_option
+@resume_option
+@click.pass_context
+def import_(ctx, resume, zone, file):
+    """Creates records in an existing ZONE from an RFC 1035 master FILE,
+    such as one exported from BIND. Use - to read from stdin.
+
+    \b
+    Resource records are grouped into one NS1 record per domain and type,
+    holding all of the answers for that pair. The whole file is parsed before
+    any record is created, and the records are then created concurrently.
+
+    \b
+    NOTES:
+        $ORIGIN and $TTL directives, relative names and multi-line records
+        are supported. $INCLUDE and $GENERATE are not.
+
+        SOA records and NS records at the zone apex are skipped, since NS1
+        creates its own for every zone.
+
+    \b
+    RESUMING:
+        The import is journaled as a job under the ns1 directory. If it is
+        interrupted or some records fail, rerun it with --resume JOB_ID
+        (and no FILE or ZONE) to create only the remaining records.
+
+    \b
+    EXAMPLES:
+        zone import db.test.com test.com
+        zone import --workers 20 db.test.com test.com
+        zone import --resume 20161019120000-1a2b3c
+    """
+    ctx.obj.check_write_lock()
+
+    if resume:
+        if file or zone:
+            raise click.BadArgumentUsage(
+                'FILE and ZONE cannot be given with --resume')
+        job = ctx.obj.resume_job('zone import', resume)
+        records = [r for _, r in job.pending()]
+    else:
+        if not (file and zone):
+            raise click.BadArgumentUsage('FILE and ZONE are required')
+        try:
+            records = zonefile.group(zonefile.parse(file, zone), zone)
+        except zonefile.ZoneFileError as e:
+            raise click.ClickException('%s: %s' % (file.name, e))
+
+        if not records:
+            raise click.ClickException('%s: no records to import' %
+                                       file.name)
+
+        errors = [e for e in validate.record_errors(records)]
+        if errors:
+            raise click.ClickException('%s: %s' % (file.name,
+                                                   validate.summary(errors)))
+
+        ctx.obj.vlog('importing %d records into %s', len(records), zone)
+        job = ctx.obj.start_job('zone import', records)
+
+    record_api = ctx.obj.rest.records()
+
+    def create(r):
+        options = {'answers': r['answers']}
+        if 'ttl' in r:
+            options['ttl'] = r['ttl']
+        return record_api.create(r['zone'], r['domain'], r['type'],
+                                 **options)
+
+    results = []
+    failed = 0
+    for r, _, error in ctx.obj.pmap_job(job, create, already_exists):
+        result = {'domain': r['domain'], 'type': r['type']}
+        if error is not None:
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_import(results)
+
+    if failed:
+        raise click.ClickException('%d of %d records failed to import' %
+                                   (failed, len(records)))
+
+
+def _record_digests(zdata):
+    """Returns {(domain, type): digest} of the records listed in a zone,
+    over the fields the zone listing includes."""
+    digests = {}
+    for r in zdata['records']:
+        content = json.dumps([sorted(r.get('short_answers', [])),
+                              r.get('ttl')])
+        digests[(r['domain'], r['type'])] = hashlib.sha1(
+            content.encode('utf-8')).hexdigest()
+    return digests
+
+
+@cli.command('watch', short_help='Report record changes in zones')
+@click.argument('ZONES', nargs=-1, required=True)
+@click.option('--interval', type=click.IntRange(1), default=60,
+              help='Seconds between polls (defaults to 60)')
+@click.option('--count', type=click.IntRange(1),
+              help='Stop after this many polls')
+@workers_option
+@click.pass_context
+def watch(ctx, count, interval, zones):
+    """Polls ZONES and reports every record added, removed or changed since
+    the previous poll, one event per line; with --output json or ndjson,
+    one JSON object per line.
+
+    \b
+    Each poll retrieves the zones concurrently and compares a digest of
+    each listed record's answers and ttl with the previous poll's. Only
+    added and changed records are then retrieved in full, for the event's
+    record field, so a poll without changes costs one request per zone.
+
+    \b
+    EXAMPLES:
+        zone watch test.com
+        zone watch --interval 30 test.com example.com
+        ns1 --output ndjson zone watch test.com | alert-on-change
+    """
+    record_api = ctx.obj.rest.records()
+    last = {}
+    polls = 0
+    try:
+        while True:
+            started = time.time()
+            changed = []
+            for zone, zdata, error in ctx.obj.pmap(ctx.obj.zone_api.retrieve,
+                                                   zones):
+                if error is not None:
+                    ctx.obj.log('%s: %s', zone,
+                                getattr(error, 'message', error))
+                    continue
+                digests = _record_digests(zdata)
+                previous = last.get(zone)
+                last[zone] = digests
+                if previous is None:
+                    ctx.obj.vlog('%s: watching %d records', zone,
+                                 len(digests))
+                    continue
+                # set and list are commands here
+                for key in sorted(frozenset(previous).union(digests)):
+                    if key not in digests:
+                        changed.append(('removed', zone) + key)
+                    elif key not in previous:
+                        changed.append(('added', zone) + key)
+                    elif digests[key] != previous[key]:
+                        changed.append(('changed', zone) + key)
+
+            def retrieve(change):
+                if change[0] == 'removed':
+                    return None
+                return record_api.retrieve(*change[1:])
+
+            for change, rdata, error in ctx.obj.pmap(retrieve, changed):
+                event = {'time': int(started),
+                         'event': change[0],
+                         'zone': change[1],
+                         'domain': change[2],
+                         'type': change[3]}
+                if rdata is not None:
+                    event['record'] = rdata
+                elif error is not None:
+                    event['error'] = getattr(error, 'message', str(error))
+                if ctx.obj.formatter.output_format != 'text':
+                    ctx.obj.formatter.out_json(event)
+                else:
+                    ctx.obj.formatter.print_event(event)
+
+            polls += 1
+            if count and polls >= count:
+                return
+            time.sleep(max(0, interval - (time.time() - started)))
+    except KeyboardInterrupt:
+        pass
+
+
+# Record fields not compared between sides
+IGNORED_FIELDS = ('id', 'zone', 'domain', 'type')
+
+
+def _load_side(ctx, spec, zones):
+    """Returns ({zone: zone data}, rest client or None) for one side of
+    zone compare: live data for the current key (live) or another key
+    (key:ID), or a file written by zone snapshot or zone info --output
+    json."""
+    if spec == 'live' or spec.startswith('key:'):
+        if spec == 'live':
+            rest = ctx.obj.rest
+        else:
+            rest = ctx.obj.key_clients([spec[4:]])[0][1]
+        zone_api = rest.zones()
+        if not zones:
+            try:
+                zones = [z['zone'] for z in zone_api.list()]
+            except ResourceException as e:
+                raise click.ClickException('REST API: %s: %s' %
+                                           (spec, e.message))
+        data = {}
+        for zone, zdata, error in ctx.obj.pmap(zone_api.retrieve, zones):
+            if error is not None:
+                message = getattr(error, 'message', str(error))
+                if 'not found' not in message.lower():
+                    raise click.ClickException('REST API: %s: %s: %s' %
+                                               (spec, zone, message))
+                continue
+            data[zone] = zdata
+        return data, rest
+
+    try:
+        with open(spec) as f:
+            snapshot = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise click.BadParameter('%s: %s' % (spec, e))
+    if 'zones' in snapshot:
+        data = snapshot['zones']
+    elif 'zone' in snapshot and 'records' in snapshot:
+        data = {snapshot['zone']: snapshot}
+    else:
+        raise click.BadParameter('%s: not a zone snapshot or zone info '
+                                 'output' % spec)
+    if zones:
+        data = dict((z, data[z]) for z in zones if z in data)
+    return data, None
+
+
+def _zone_tree(zdata):
+    return merkle.MerkleTree(dict(('%s %s' % key, value) for key, value in
+                                  _record_digests(zdata).items()))
+
+
+def _normalize(rdata):
+    record = dict((k, v) for k, v in rdata.items()
+                  if k not in IGNORED_FIELDS)
+    if 'answers' in record:
+        record['answers'] = [dict((k, v) for k, v in a.items() if k != 'id')
+                             for a in record['answers']]
+    return record
+
+
+def _differing_fields(left, right):
+    return sorted(k for k in frozenset(left).union(right)
+                  if left.get(k) != right.get(k))
+
+
+@cli.command('snapshot', short_help='Save zones for zone compare')
+@click.argument('FILE', type=click.File('w'))
+@click.argument('ZONES', nargs=-1)
+@workers_option
+@click.pass_context
+def snapshot(ctx, zones, file):
+    """Saves ZONES, or every zone in the account, with the records they
+    list to FILE as JSON, for zone compare. The zones are retrieved
+    concurrently.
+
+    \b
+    EXAMPLES:
+        zone snapshot prod.json
+        zone snapshot test.json test.com example.com
+    """
+    data, _ = _load_side(ctx, 'live', zones)
+    json.dump({'created': int(time.time()), 'zones': data}, file)
+    ctx.obj.vlog('saved %d zones', len(data))
+
+
+@cli.command('compare', short_help='Find records that differ between sides')
+@click.argument('LEFT')
+@click.argument('RIGHT')
+@click.argument('ZONES', nargs=-1)
+@workers_option
+@click.pass_context
+def compare(ctx, zones, right, left):
+    """Compares ZONES, or every zone on either side, between LEFT and RIGHT,
+    and reports the records that are on only one side or differ, and the
+    fields they differ in. Exits with an error if any differ.
+
+    \b
+    SIDES:
+        live         the current api key
+        key:KEYID    another configured api key, e.g. another account
+        FILE         a file from zone snapshot or zone info --output json
+
+    \b
+    Each side's zones are retrieved concurrently, and a Merkle tree is
+    built per zone over digests of each listed record's answers and ttl.
+    Zones with equal root hashes are skipped, and only the subtrees whose
+    hashes differ are descended into. When both sides are live, only the
+    records that differ are then retrieved in full, to report every
+    differing field; otherwise the answers and ttl are compared.
+
+    \b
+    EXAMPLES:
+        zone compare key:staging key:prod
+        zone compare live prod-snapshot.json test.com
+        zone compare test.json live test.com
+    """
+    left_data, left_rest = _load_side(ctx, left, zones)
+    right_data, right_rest = _load_side(ctx, right, zones)
+
+    rows = []
+    differing = []
+    for zone in sorted(frozenset(left_data).union(right_data)):
+        if zone not in right_data or zone not in left_data:
+            rows.append({'zone': zone, 'domain': None, 'type': None,
+                         'status': 'only-left' if zone in left_data
+                                   else 'only-right'})
+            continue
+        left_tree = _zone_tree(left_data[zone])
+        right_tree = _zone_tree(right_data[zone])
+        if left_tree.root == right_tree.root:
+            continue
+        for key in left_tree.diff(right_tree):
+            domain, type = key.split(' ', 1)
+            differing.append((zone, domain, type))
+
+    def listed(data, zone, domain, type):
+        for r in data[zone]['records']:
+            if r['domain'] == domain and r['type'] == type:
+                return {'short_answers': sorted(r.get('short_answers', [])),
+                        'ttl': r.get('ttl')}
+        return None
+
+    def fetch(record):
+        left_record = listed(left_data, *record)
+        right_record = listed(right_data, *record)
+        if left_rest and right_rest and left_record and right_record:
+            left_record = _normalize(left_rest.records().retrieve(*record))
+            right_record = _normalize(right_rest.records().retrieve(*record))
+        return left_record, right_record
+
+    failed = 0
+    for (zone, domain, type), pair, error in ctx.obj.pmap(fetch, differing):
+        row = {'zone': zone, 'domain': domain, 'type': type}
+        if error is not None:
+            row['status'] = 'failed'
+            row['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        elif pair[1] is None:
+            row['status'] = 'only-left'
+        elif pair[0] is None:
+            row['status'] = 'only-right'
+        else:
+            row['status'] = 'different'
+            row['fields'] = _differing_fields(*pair)
+        rows.append(row)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(rows)
+    else:
+        ctx.obj.formatter.print_drift(rows)
+
+    if failed:
+        raise click.ClickException('REST API: failed to retrieve %d '
+                                   'records' % failed)
+    if rows:
+        raise click.ClickException('%d zones or records differ' % len(rows))
+
+
+SOA_FIELDS = ('refresh', 'retry', 'expiry', 'nx_ttl')
+
+BULK_FIELDS = {'create': ('link',) + SOA_FIELDS,
+               'set': SOA_FIELDS,
+               'delete': ()}
+
+BULK_STATUS = {'create': 'created', 'set': 'updated', 'delete': 'deleted'}
+
+ZONE_NAME = re.compile(r'^(?=.{1,253}$)([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?'
+                       r'\.)*[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?$',
+                       re.IGNORECASE)
+
+
+def _parse_bulk(lines, mode, defaults):
+    """Parses ZONE [FIELD=VALUE...] lines into {zone, options} operations,
+    with defaults for fields a line does not give. Returns the operations
+    and a list of errors."""
+    ops = []
+    errors = []
+    seen = {}
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split()
+        zone = fields[0].rstrip('.').lower()
+        options = dict(defaults)
+        problems = []
+        if not ZONE_NAME.match(zone):
+            problems.append('invalid zone name %s' % zone)
+        for field in fields[1:]:
+            key, sep, value = field.partition('=')
+            if not sep or key not in BULK_FIELDS[mode]:
+                expected = ' or '.join('%s=VALUE' % k
+                                       for k in BULK_FIELDS[mode])
+                problems.append('expected %s, got %s' %
+                                (expected or 'only a zone', field))
+            elif key == 'link':
+                options[key] = value.rstrip('.').lower()
+                if not ZONE_NAME.match(options[key]):
+                    problems.append('invalid link target %s' % value)
+            elif not value.isdigit():
+                problems.append('%s must be a number of seconds' % key)
+            else:
+                options[key] = int(value)
+
+        if 'link' in options and len(options) > 1:
+            problems.append('a linked zone cannot have SOA options')
+        if mode == 'set' and not options:
+            problems.append('nothing to set')
+        if zone in seen:
+            problems.append('duplicate of line %d' % seen[zone])
+        seen.setdefault(zone, lineno)
+
+        errors.extend('line %d: %s' % (lineno, p) for p in problems)
+        ops.append({'zone': zone, 'options': options})
+    return ops, errors
+
+
+def _check_zones(ctx, mode, ops):
+    """Checks the operations against the zones of the account: created
+    zones must not exist yet, link targets and zones to set or delete
+    must. Zone names are compared case insensitively, and those of
+    existing zones are replaced by the account's spelling."""
+    try:
+        existing = dict((z['zone'].lower(), z['zone'])
+                        for z in ctx.obj.zone_api.list())
+    except ResourceException as e:
+        raise click.ClickException('REST API: %s' % e.message)
+
+    errors = []
+    for op in ops:
+        if mode == 'create':
+            if op['zone'] in existing:
+                errors.append('%s already exists' % op['zone'])
+            link = op['options'].get('link')
+            if link and link not in existing:
+                errors.append('%s: link target %s does not exist' %
+                              (op['zone'], link))
+            elif link:
+                op['options']['link'] = existing[link]
+        elif op['zone'] not in existing:
+            errors.append('%s does not exist' % op['zone'])
+        else:
+            op['zone'] = existing[op['zone']]
+    return errors
+
+
+def _bulk(ctx, mode, file, defaults, retries, resume, yes=True):
+    ctx.obj.check_write_lock()
+
+    if resume:
+        if file:
+            raise click.BadArgumentUsage('FILE cannot be given with --resume')
+        job = ctx.obj.resume_job('zone bulk %s' % mode, resume)
+    else:
+        if not file:
+            raise click.BadArgumentUsage('FILE is required')
+        ops, errors = _parse_bulk(file, mode, defaults)
+        if not errors:
+            errors = _check_zones(ctx, mode, ops)
+        if errors:
+            SAMPLE = 20
+            raise click.ClickException(
+                '%d problems, nothing was changed:\n  %s%s' % (
+                    len(errors), '\n  '.join(errors[:SAMPLE]),
+                    '\n  ...' if len(errors) > SAMPLE else ''))
+        if not ops:
+            raise click.ClickException('%s: no zones given' % file.name)
+        if not yes:
+            click.confirm('Delete %d zones and all of their records?' %
+                          len(ops), abort=True, err=True)
+        job = ctx.obj.start_job('zone bulk %s' % mode, ops)
+
+    zone_api = ctx.obj.zone_api
+    call = retrying({'create': zone_api.create,
+                     'set': zone_api.update,
+                     'delete': zone_api.delete}[mode], retries)
+
+    def run(op):
+        return call(op['zone'], **op['options'])
+
+    results = []
+    failed = 0
+    done_if = {'create': already_exists, 'delete': not_found}.get(mode)
+    for op, _, error in ctx.obj.pmap_job(job, run, done_if):
+        result = {'zone': op['zone'], 'status': BULK_STATUS[mode]}
+        if error is not None:
+            result['status'] = 'failed'
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_results(results)
+
+    if failed:
+        raise click.ClickException('%d of %d zones failed' %
+                                   (failed, len(results)))
+
+
+def bulk_options(f):
+    f = resume_option(f)
+    f = workers_option(f)
+    f = write_options(f)
+    f = click.option('--retries', type=click.IntRange(0), default=3,
+                     help='Times to retry a rate limited call (defaults '
+                          'to 3)')(f)
+    f = click.argument('FILE', type=click.File('r'), required=False)(f)
+    return f
+
+
+def soa_options(f):
+    f = click.option('--nx_ttl', help='SOA NX TTL', type=int)(f)
+    f = click.option('--expiry', help='SOA Expiry', type=int)(f)
+    f = click.option('--retry', help='SOA Retry', type=int)(f)
+    f = click.option('--refresh', help='SOA Refresh', type=int)(f)
+    return f
+
+
+def _soa_defaults(**options):
+    return dict((k, v) for k, v in options.items() if v is not None)
+
+
+@cli.group('bulk', short_help='Create, update or delete many zones')
+@click.pass_context
+def bulk(ctx):
+    """Create, update or delete many zones from a FILE (or - for stdin) of
+    lines holding a zone and optionally FIELD=VALUE options:
+
+    \b
+        linked.com link=test.com
+        test.com refresh=3600 nx_ttl=300
+
+    \b
+    Options given on the command line apply to every line that does not
+    set them. Every line is validated, and checked against the zones of
+    the account, before the first change is made. The zones are then
+    changed concurrently, with rate limited calls retried after a backoff,
+    and the result for every zone is reported. The changes are journaled
+    as a job, so an interrupted run is continued with --resume JOB_ID.
+    """
+    pass
+
+
+@bulk.command('create', short_help='Create many zones')
+@bulk_options
+@soa_options
+@click.option('--link', help='Create linked zones pointing to the given zone')
+@click.pass_context
+def bulk_create(ctx, link, refresh, retry, expiry, nx_ttl, file, retries,
+                resume):
+    """Creates the zones listed in FILE. Lines may set link, refresh,
+    retry, expiry and nx_ttl.
+
+    \b
+    EXAMPLES:
+        zone bulk create --link test.com linked.txt
+        zone bulk create --nx_ttl 300 new-zones.txt
+        cat zones.txt | zone bulk create --workers 20 -
+    """
+    defaults = _soa_defaults(link=link, refresh=refresh, retry=retry,
+                             expiry=expiry, nx_ttl=nx_ttl)
+    _bulk(ctx, 'create', file, defaults, retries, resume)
+
+
+@bulk.command('set', short_help='Update the SOA of many zones')
+@bulk_options
+@soa_options
+@click.pass_context
+def bulk_set(ctx, refresh, retry, expiry, nx_ttl, file, retries, resume):
+    """Updates the SOA timers of the zones listed in FILE. Lines may set
+    refresh, retry, expiry and nx_ttl.
+
+    \b
+    EXAMPLES:
+        zone bulk set --refresh 7200 zones.txt
+        ns1 --fields zone zone list | ns1 zone bulk set --nx_ttl 300 -
+    """
+    defaults = _soa_defaults(refresh=refresh, retry=retry, expiry=expiry,
+                             nx_ttl=nx_ttl)
+    _bulk(ctx, 'set', file, defaults, retries, resume)
+
+
+@bulk.command('delete', short_help='Delete many zones')
+@bulk_options
+@click.option('-y', '--yes', is_flag=True,
+              help='Do not ask for confirmation')
+@click.pass_context
+def bulk_delete(ctx, yes, file, retries, resume):
+    """Deletes the zones listed in FILE, and all of their records. This
+    cannot be undone.
+
+    \b
+    EXAMPLES:
+        zone bulk delete retired.txt
+        zone bulk delete -y retired.txt
+    """
+    _bulk(ctx, 'delete', file, {}, retries, resume, yes=yes)
+
+
+# Fields of a retrieved record that are copied by zone clone
+CLONE_FIELDS = ('answers', 'filters', 'regions', 'meta', 'ttl',
+                'use_client_subnet', 'link', 'networks')
+
+
+def _rename(name, src, dst):
+    """Moves name from the src suffix to dst, or returns None if it is
+    not in src."""
+    if name == src:
+        return dst
+    if name.endswith('.' + src):
+        return name[:-len(src)] + dst
+    return None
+
+
+def _drop_feeds(meta):
+    return dict((k, v) for k, v in meta.items()
+                if not (isinstance(v, dict) and 'feed' in v))
+
+
+def _clone_record(rdata, src, dst, links, feeds):
+    """Returns the {zone, domain, type, options} operation creating a copy
+    of rdata in dst, or None if it is left out."""
+    options = copy.deepcopy(dict((k, rdata[k]) for k in CLONE_FIELDS
+                                 if k in rdata))
+    options['answers'] = [dict((k, v) for k, v in a.items() if k != 'id')
+                          for a in options.get('answers', [])]
+
+    if options.get('link'):
+        if links == 'drop':
+            return None
+        if links == 'rewrite':
+            options['link'] = _rename(options['link'], src,
+                                      dst) or options['link']
+
+    if feeds == 'drop':
+        if 'meta' in options:
+            options['meta'] = _drop_feeds(options['meta'])
+        for a in options['answers']:
+            if 'meta' in a:
+                a['meta'] = _drop_feeds(a['meta'])
+        for region in options.get('regions', {}).values():
+            if 'meta' in region:
+                region['meta'] = _drop_feeds(region['meta'])
+
+    return {'zone': dst,
+            'domain': _rename(rdata['domain'], src, dst),
+            'type': rdata['type'],
+            'options': options}
+
+
+@cli.command('clone', short_help='Copy a zone and all of its records')
+@click.argument('SRC', required=False)
+@click.argument('DST', required=False)
+@click.option('--links', type=click.Choice(['rewrite', 'keep', 'drop']),
+              default='rewrite',
+              help='Point linked records within SRC to DST (rewrite, the '
+                   'default), keep their targets, or leave them out')
+@click.option('--feeds', type=click.Choice(['keep', 'drop']),
+              default='keep',
+              help='Keep or drop meta values connected to data feeds')
+@click.option('--retries', type=click.IntRange(0), default=3,
+              help='Times to retry a rate limited call (defaults to 3)')
+@write_options
+@workers_option
+@resume_option
+@click.pass_context
+def clone(ctx, resume, retries, feeds, links, dst, src):
+    """Creates the zone DST with the SOA settings of SRC, and copies every
+    record of SRC into it with its answers, filters, regions and meta. Record
+    names under SRC are moved to DST.
+
+    \b
+    The records of SRC are retrieved concurrently, then created in DST
+    concurrently, with rate limited calls retried after a backoff. Linked
+    records are created after all the others, so that the records they
+    point to exist. NS records at the apex are skipped, since NS1 creates
+    its own. The record creations are journaled as a job, so an interrupted
+    clone is continued with --resume JOB_ID.
+
+    \b
+    EXAMPLES:
+        zone clone test.com staging.test.com
+        zone clone --links keep --feeds drop test.com test.net
+        zone clone --workers 20 --resume 20161019120000-1a2b3c
+    """
+    ctx.obj.check_write_lock()
+
+    if resume:
+        if src or dst:
+            raise click.BadArgumentUsage(
+                'SRC and DST cannot be given with --resume')
+        job = ctx.obj.resume_job('zone clone', resume)
+    else:
+        if not (src and dst):
+            raise click.BadArgumentUsage('SRC and DST are required')
+        zone_api = ctx.obj.zone_api
+        try:
+            zdata = zone_api.retrieve(src)
+        except ResourceException as e:
+            raise click.ClickException('REST API: %s' % e.message)
+
+        record_api = ctx.obj.rest.records()
+        fetch = retrying(record_api.retrieve, retries)
+        records = [(src, r['domain'], r['type']) for r in zdata['records']
+                   if not (r['type'] == 'NS' and r['domain'] == src)]
+        ops = []
+        for record, rdata, error in ctx.obj.pmap(lambda r: fetch(*r),
+                                                 records):
+            if error is not None:
+                raise click.ClickException(
+                    'REST API: %s %s: %s' % (record[1], record[2],
+                                             getattr(error, 'message',
+                                                     error)))
+            op = _clone_record(rdata, src, dst, links, feeds)
+            if op is not None:
+                ops.append(op)
+
+        soa = dict((k, zdata[k]) for k in SOA_FIELDS + ('ttl',)
+                   if zdata.get(k) is not None)
+        try:
+            zone_api.create(dst, **soa)
+        except ResourceException as e:
+            raise click.ClickException('REST API: %s' % e.message)
+        ctx.obj.vlog('created %s, copying %d records', dst, len(ops))
+        job = ctx.obj.start_job('zone clone', ops)
+
+    create = retrying(ctx.obj.rest.records().create, retries)
+
+    def run(op):
+        return create(op['zone'], op['domain'], op['type'], **op['options'])
+
+    results = []
+    failed = 0
+    # linked records are created once the records they may point to exist
+    for op, _, error in ctx.obj.pmap_job(
+            job, run, already_exists,
+            stage=lambda op: bool(op['options'].get('link'))):
+        result = {'domain': op['domain'], 'type': op['type']}
+        if error is not None:
+            result['error'] = getattr(error, 'message', str(error))
+            failed += 1
+        results.append(result)
+
+    if ctx.obj.formatter.output_format != 'text':
+        ctx.obj.formatter.out_json(results)
+    else:
+        ctx.obj.formatter.print_import(results)
+
+    if failed:
+        raise click.ClickException('%d of %d records failed to copy' %
+                                   (failed, len(results)))
@@ -0,0 +1,182 @@
+"""Shell completion backend.
+
+Invoked by the generated completion scripts on every TAB press as
+
+    python -m ns1cli.complete [--home DIR] CWORD WORD...
+
+and prints one candidate per line. The scripts pass the ns1 directory the
+index is kept in, as State.home_dir was when they were generated. To keep
+this fast, it only uses the standard library and reads the index written by
+`ns1 completion refresh`; it never imports click, nsone or the command
+modules. A stale index is refreshed by a detached `ns1 completion refresh`
+in the background, at most once per REFRESH_TIMEOUT while refreshes fail.
+"""
+import json
+import os
+import sys
+import time
+
+
+# The usual State.home_dir, for scripts generated without --home
+HOME_DIR = os.path.expanduser('~/.ns1')
+
+INDEX_DIR = 'completion'
+INDEX_FILE = 'index.json'
+DOMAINS_DIR = 'domains'
+REFRESH_MARKER = 'refreshing'
+
+# Seconds before the dynamic parts of the index are refreshed
+MAX_AGE = 3600
+
+# Seconds a started refresh is given before another may be started. A
+# failed refresh leaves its marker, so this is also the retry interval.
+REFRESH_TIMEOUT = 300
+
+RECORD_TYPES = ('A', 'AAAA', 'ALIAS', 'AFSDB', 'CNAME', 'DNAME', 'HINFO',
+                'MX', 'NAPTR', 'NS', 'PTR', 'RP', 'SPF', 'SRV', 'TXT')
+
+
+def index_dir(home_dir=HOME_DIR):
+    return os.path.join(home_dir, INDEX_DIR)
+
+
+def domains_path(home_dir, zone):
+    return os.path.join(index_dir(home_dir), DOMAINS_DIR, zone)
+
+
+def _replace(path, text):
+    """Atomically replaces the file at path with text."""
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp = '%s.%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.rename(tmp, path)
+
+
+def write_json(path, data):
+    _replace(path, json.dumps(data))
+
+
+def write_lines(path, lines):
+    _replace(path, '\n'.join(lines))
+
+
+def load_index(home_dir=HOME_DIR):
+    try:
+        with open(os.path.join(index_dir(home_dir), INDEX_FILE)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _load_domains(home_dir, zone):
+    try:
+        with open(domains_path(home_dir, zone)) as f:
+            return f.read().split()
+    except (IOError, OSError):
+        return []
+
+
+def _refresh_in_background(home_dir):
+    marker = os.path.join(index_dir(home_dir), REFRESH_MARKER)
+    try:
+        if time.time() - os.path.getmtime(marker) < REFRESH_TIMEOUT:
+            return
+    except OSError:
+        pass
+    if os.name != 'posix':
+        return
+
+    # imported here, since most completions never need it
+    import subprocess
+
+    if not os.path.exists(index_dir(home_dir)):
+        os.makedirs(index_dir(home_dir))
+    open(marker, 'w').close()
+    devnull = open(os.devnull, 'w')
+    subprocess.Popen([sys.executable, '-m', 'ns1cli', 'completion',
+                      'refresh'],
+                     stdin=devnull, stdout=devnull, stderr=devnull,
+                     close_fds=True, preexec_fn=os.setsid)
+
+
+def _argument_values(index, name, previous, home_dir):
+    """Candidates for the positional argument NAME, given the preceding
+    positional arguments of the command."""
+    if name == 'ZONE':
+        return index.get('zones', [])
+    elif name == 'DOMAIN':
+        if not previous:
+            return []
+        return _load_domains(home_dir, previous[-1])
+    elif name == 'TYPE':
+        return RECORD_TYPES
+    elif name == 'JOBID':
+        return index.get('monitors', [])
+    elif name == 'SOURCEID':
+        return index.get('sources', [])
+    return []
+
+
+def complete(index, words, cword, home_dir=HOME_DIR):
+    """Returns the candidates for words[cword], where words[0] is the
+    program name."""
+    node = index.get('commands')
+    if not node:
+        return []
+
+    current = words[cword] if cword < len(words) else ''
+    positional = []
+    value_for = None
+    for word in words[1:cword]:
+        if value_for is not None:
+            value_for = None
+        elif word.startswith('-'):
+            if '=' not in word and word in node.get('value_options', {}):
+                value_for = word
+        elif word in node.get('commands', {}):
+            node = node['commands'][word]
+            positional = []
+        else:
+            positional.append(word)
+
+    if value_for is not None:
+        candidates = node['value_options'][value_for]
+    elif current.startswith('-'):
+        candidates = node.get('options', []) + \
+            sorted(node.get('value_options', {}))
+    elif node.get('commands'):
+        candidates = sorted(node['commands'])
+    else:
+        args = node.get('args', [])
+        if len(positional) < len(args):
+            name = args[len(positional)]
+        elif args and args[-1].endswith('...'):
+            name = args[-1]
+        else:
+            return []
+        candidates = _argument_values(index, name, positional, home_dir)
+
+    return [c for c in candidates if c.startswith(current)]
+
+
+def main(argv):
+    home_dir = HOME_DIR
+    if argv[:1] == ['--home'] and len(argv) > 1:
+        home_dir, argv = argv[1], argv[2:]
+    try:
+        cword = int(argv[0])
+    except (IndexError, ValueError):
+        return 1
+    index = load_index(home_dir)
+    if time.time() - index.get('updated', 0) > MAX_AGE:
+        _refresh_in_background(home_dir)
+    for candidate in complete(index, argv[1:], cword, home_dir):
+        sys.stdout.write(candidate + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
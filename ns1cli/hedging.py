@@ -0,0 +1,196 @@
+"""Deadlines and hedging for read requests.
+
+With a timeout, a GET not answered within it fails with a ResourceException
+instead of holding up a whole sweep. With hedging, a GET not answered
+within a percentile of the recent latencies of its resource (zones, stats,
+...) is sent a second time, and whichever answer comes first is used. A
+budget keeps hedges to a fraction of reads, so a slow API is not answered
+with twice the load.
+
+Only GETs are hedged or abandoned: they are idempotent, while abandoning a
+write would leave its outcome unknown.
+"""
+import collections
+import math
+import threading
+import time
+
+from nsone.rest.resource import ResourceException
+from six.moves import queue
+
+from ns1cli import metrics
+
+
+# Latencies kept per resource, and needed before hedging starts
+WINDOW = 256
+MIN_SAMPLES = 20
+
+# Hedges that can be sent at once before the budget has to refill
+BURST = 10
+
+# The active Hedger, if timeouts or hedging are enabled
+_active = None
+
+
+class LatencyTracker(object):
+    """The most recent request latencies of each resource."""
+
+    def __init__(self, window=WINDOW, min_samples=MIN_SAMPLES):
+        self.lock = threading.Lock()
+        self.window = window
+        self.min_samples = min_samples
+        self.latencies = {}
+
+    def record(self, resource, seconds):
+        with self.lock:
+            latencies = self.latencies.get(resource)
+            if latencies is None:
+                latencies = self.latencies[resource] = \
+                    collections.deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def percentile(self, resource, p):
+        """Returns the pth percentile latency of resource, or None until it
+        has enough samples."""
+        with self.lock:
+            latencies = sorted(self.latencies.get(resource, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[max(int(math.ceil(p / 100.0 * len(latencies))) - 1,
+                             0)]
+
+
+class Budget(object):
+    """Lets hedges be at most ratio of reads: each read earns ratio of a
+    hedge, up to BURST saved, and each hedge spends one."""
+
+    def __init__(self, ratio, burst=BURST):
+        self.lock = threading.Lock()
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class Hedger(object):
+
+    def __init__(self, timeout=None, percentile=None, budget=0.05):
+        self.timeout = timeout
+        self.percentile = percentile
+        self.budget = Budget(budget)
+        self.tracker = LatencyTracker()
+
+    def send(self, send, method, url, *args, **kwargs):
+        """Calls send(method, url, ...) on a thread of its own, and again if
+        it is slow to answer, returning the first answer."""
+        if method != 'GET':
+            return send(method, url, *args, **kwargs)
+
+        resource = metrics.request_resource(url)
+        results = queue.Queue()
+
+        def attempt(hedge):
+            start = time.time()
+            try:
+                result = send(method, url, *args, **kwargs)
+            except Exception as e:
+                results.put((hedge, None, e))
+                return
+            self.tracker.record(resource, time.time() - start)
+            results.put((hedge, result, None))
+
+        def start_attempt(hedge):
+            thread = threading.Thread(target=attempt, args=(hedge,))
+            thread.daemon = True
+            thread.start()
+
+        start = time.time()
+        deadline = start + self.timeout if self.timeout else None
+        hedge_at = None
+        if self.percentile:
+            self.budget.earn()
+            delay = self.tracker.percentile(resource, self.percentile)
+            if delay is not None:
+                hedge_at = start + delay
+
+        if deadline is None and hedge_at is None:
+            # nothing to wait for on another thread
+            result = send(method, url, *args, **kwargs)
+            self.tracker.record(resource, time.time() - start)
+            return result
+
+        start_attempt(False)
+        pending = 1
+        error = None
+        while pending:
+            wake = min(t for t in (deadline, hedge_at, float('inf'))
+                       if t is not None)
+            try:
+                if wake == float('inf'):
+                    hedge, result, e = results.get()
+                else:
+                    hedge, result, e = results.get(
+                        timeout=max(wake - time.time(), 0.001))
+            except queue.Empty:
+                now = time.time()
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    if self.budget.spend():
+                        metrics.count('ns1cli_hedged_requests_total',
+                                      (('resource', resource),))
+                        start_attempt(True)
+                        pending += 1
+                if deadline is not None and now >= deadline:
+                    metrics.count('ns1cli_deadline_exceeded_total',
+                                  (('resource', resource),))
+                    raise ResourceException('%s %s: no answer within %gs' %
+                                            (method, url, self.timeout))
+                continue
+
+            pending -= 1
+            if e is None:
+                if hedge:
+                    metrics.count('ns1cli_hedge_wins_total',
+                                  (('resource', resource),))
+                return result
+            error = error or e
+        raise error
+
+
+def enable(timeout=None, percentile=None, budget=0.05):
+    global _active
+    _active = Hedger(timeout, percentile, budget)
+    return _active
+
+
+def instrument(transport):
+    """Registers a copy of the named rest client transport whose reads go
+    through the active Hedger, and returns its name."""
+    # the registry the rest client's resources look their transport up in
+    from nsone.rest.resource import TransportBase
+
+    name = transport + '+hedged'
+    if name in TransportBase.REGISTRY:
+        return name
+    base = TransportBase.REGISTRY[transport]
+
+    class HedgedTransport(base):
+
+        def send(self, method, url, *args, **kwargs):
+            if _active is None:
+                return base.send(self, method, url, *args, **kwargs)
+            return _active.send(lambda *a, **kw: base.send(self, *a, **kw),
+                                method, url, *args, **kwargs)
+
+    TransportBase.REGISTRY[name] = HedgedTransport
+    return name
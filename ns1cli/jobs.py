@@ -0,0 +1,168 @@
+"""Background jobs of the console.
+
+A command ending in & runs on its own thread, sharing the console's rest
+client, while the console keeps reading commands. Console output is written
+through ThreadOutput, which sends whatever a job's thread writes to that
+job's JobOutput: buffered until the job is brought to the foreground, then
+written straight to the terminal.
+"""
+import collections
+import contextlib
+import threading
+import time
+import traceback
+
+import six
+
+from ns1cli import util
+
+
+_local = threading.local()
+
+
+class ThreadOutput(object):
+    """Stands in for sys.stdout or sys.stderr, passing writes from job
+    threads to their JobOutput."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, data):
+        output = getattr(_local, 'output', None)
+        (output or self._stream).write(data)
+
+    def flush(self):
+        output = getattr(_local, 'output', None)
+        (output or self._stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+@contextlib.contextmanager
+def captured(output):
+    """Sends what the current thread writes to the console to output."""
+    previous = getattr(_local, 'output', None)
+    _local.output = output
+    try:
+        yield output
+    finally:
+        _local.output = previous
+
+
+class JobOutput(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = six.StringIO()
+        self._stream = None
+
+    def write(self, data):
+        with self._lock:
+            (self._stream or self._buffer).write(data)
+
+    def flush(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.flush()
+
+    def attach(self, stream):
+        """Writes the buffered output to stream, and then everything else
+        as it is written."""
+        with self._lock:
+            stream.write(self._buffer.getvalue())
+            stream.flush()
+            self._buffer = six.StringIO()
+            self._stream = stream
+
+    def detach(self):
+        with self._lock:
+            self._stream = None
+
+
+class Job(object):
+
+    def __init__(self, id, command, func):
+        self.id = id
+        self.command = command
+        self.status = 'Running'
+        self.started = time.time()
+        self.finished = None
+        self.reported = False
+        self.output = JobOutput()
+        self.cancel = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(func,))
+        self.thread.daemon = True
+
+    def _run(self, func):
+        util.cancel_on(self.cancel)
+        status = 'Failed'
+        try:
+            with captured(self.output):
+                if func():
+                    status = 'Done'
+        except Exception:
+            traceback.print_exc(file=self.output)
+        finally:
+            if self.cancel.is_set():
+                status = 'Killed'
+            self.status = status
+            self.finished = time.time()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def wait(self):
+        # join in steps, so ^C still interrupts the wait on python 2
+        while self.thread.is_alive():
+            self.thread.join(0.1)
+
+    def kill(self):
+        """Stops the job: api calls it has not started yet are cancelled,
+        while those in flight, and their journal entries, are finished."""
+        self.cancel.set()
+
+
+class Jobs(object):
+    """The console's job table, numbering jobs from 1 like a shell."""
+
+    def __init__(self):
+        self._jobs = collections.OrderedDict()
+
+    def __iter__(self):
+        return iter(list(self._jobs.values()))
+
+    def start(self, command, func):
+        id = max(self._jobs) + 1 if self._jobs else 1
+        job = self._jobs[id] = Job(id, command, func)
+        job.thread.start()
+        return job
+
+    def get(self, id):
+        """Returns the job with the given id, or the newest job if id is
+        None, or None if there is no such job."""
+        if id is None:
+            jobs = list(self._jobs.values())
+            return jobs[-1] if jobs else None
+        return self._jobs.get(id)
+
+    def remove(self, job):
+        self._jobs.pop(job.id, None)
+
+    def running(self):
+        return [j for j in self if j.running]
+
+    def unreported(self):
+        """Returns the jobs that finished since the last call. Finished jobs
+        stay in the table until brought to the foreground, for their
+        output."""
+        finished = []
+        for job in self:
+            if not job.running and not job.reported:
+                job.reported = True
+                finished.append(job)
+        return finished
@@ -0,0 +1,176 @@
+"""Write-ahead journal for bulk write operations.
+
+A job is journaled to <ns1 directory>/journal/<job id> as JSON lines:
+
+    {"job": ID, "command": COMMAND, "created": TIMESTAMP}
+    {"op": INDEX, "data": OPERATION}      one per planned operation
+    {"note": INDEX, "data": NOTE}         what an operation is about to do
+    {"done": INDEX}                       appended as each one completes
+
+The file is only ever appended to. The plan, and the directory entry of
+the file, are synced to disk before any operation runs. Notes and
+completions are written through to the OS as they happen, so they survive
+the process dying, and are synced in batches, so an OS crash can at worst
+repeat the last batch of operations on resume.
+"""
+import binascii
+import json
+import os
+import threading
+import time
+
+
+JOURNAL_DIR = 'journal'
+
+# Completions written between syncs, and the longest time between them
+SYNC_BATCH = 100
+SYNC_INTERVAL = 1.0
+
+
+class JournalError(Exception):
+    pass
+
+
+def journal_dir(home_dir):
+    return os.path.join(home_dir, JOURNAL_DIR)
+
+
+def _new_job_id():
+    return '%s-%s' % (time.strftime('%Y%m%d%H%M%S'),
+                      binascii.hexlify(os.urandom(3)).decode('ascii'))
+
+
+def _sync_dir(directory):
+    """Syncs a directory, so the files created in it survive a crash."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        # not possible, nor needed, on windows
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal(object):
+
+    def __init__(self, path, job_id, command, ops, done, resumed=False,
+                 notes=None):
+        self.path = path
+        self.job_id = job_id
+        self.command = command
+        self.ops = ops
+        self.done = done
+        # the last note of each operation, see note
+        self.notes = notes or {}
+        # whether an earlier run may have done operations it did not journal
+        self.resumed = resumed
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._synced_at = time.time()
+        self._file = open(path, 'a')
+
+    @classmethod
+    def create(cls, home_dir, command, ops):
+        """Journals a new job of ops, which must be JSON serializable."""
+        directory = journal_dir(home_dir)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        job_id = _new_job_id()
+        path = os.path.join(directory, job_id)
+
+        lines = [json.dumps({'job': job_id, 'command': command,
+                             'created': int(time.time())})]
+        lines.extend(json.dumps({'op': i, 'data': op})
+                     for i, op in enumerate(ops))
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        _sync_dir(directory)
+        return cls(path, job_id, command, list(ops), set())
+
+    @classmethod
+    def load(cls, home_dir, job_id):
+        """Reads the journal of an unfinished job."""
+        path = os.path.join(journal_dir(home_dir), os.path.basename(job_id))
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except (IOError, OSError):
+            raise JournalError('no unfinished job %s' % job_id)
+
+        command = None
+        ops = []
+        done = set()
+        notes = {}
+        torn = False
+        for lineno, line in enumerate(lines, 1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if lineno == len(lines):
+                    torn = True
+                    break
+                raise JournalError('job %s: corrupt journal line %d' %
+                                   (job_id, lineno))
+            if 'job' in entry:
+                command = entry['command']
+            elif 'op' in entry:
+                ops.append(entry['data'])
+            elif 'done' in entry:
+                done.add(entry['done'])
+            elif 'note' in entry:
+                notes[entry['note']] = entry['data']
+
+        if command is None:
+            raise JournalError('job %s: missing journal header' % job_id)
+        journal = cls(path, job_id, command, ops, done, resumed=True,
+                      notes=notes)
+        if torn:
+            # end the torn final write, so appended lines stay parseable
+            journal._file.write('\n')
+        return journal
+
+    def pending(self):
+        """Returns (index, op) for each operation not yet done."""
+        return [(i, op) for i, op in enumerate(self.ops)
+                if i not in self.done]
+
+    def note(self, index, data):
+        """Journals what operation index is about to do, e.g. the result of
+        a write that is not idempotent, for a resumed run to check whether
+        it already happened."""
+        with self._lock:
+            self._append({'note': index, 'data': data})
+            self.notes[index] = data
+
+    def mark_done(self, index):
+        with self._lock:
+            self._append({'done': index})
+            self.done.add(index)
+
+    def _append(self, entry):
+        # with self._lock held
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self._unsynced += 1
+        due = time.time() - self._synced_at >= SYNC_INTERVAL
+        if due or self._unsynced >= SYNC_BATCH:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.time()
+
+    def close(self):
+        """Syncs the journal, and removes it once every operation is done.
+        Returns the number of operations left."""
+        with self._lock:
+            self._sync()
+            self._file.close()
+        left = len(self.ops) - len(self.done)
+        if not left:
+            os.remove(self.path)
+        return left
@@ -0,0 +1,162 @@
+"""JSON Patch (RFC 6902) documents, applied locally to records.
+
+A patch is compiled once, checking its operations and parsing their JSON
+pointers (RFC 6901), and can then be applied to any number of records.
+"""
+import copy
+import json
+
+import six
+
+
+class PatchError(ValueError):
+    pass
+
+
+OPS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+def parse_pointer(pointer):
+    """Returns the reference tokens of a JSON pointer."""
+    if not isinstance(pointer, six.string_types):
+        raise PatchError('invalid JSON pointer: %r' % (pointer,))
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise PatchError('JSON pointer must start with /: %s' % pointer)
+    return [t.replace('~1', '/').replace('~0', '~')
+            for t in pointer[1:].split('/')]
+
+
+def _index(container, token, pointer, append=False):
+    if append and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise PatchError('invalid array index %s in %s' % (token, pointer))
+    index = int(token)
+    if index > len(container) or (index == len(container) and not append):
+        raise PatchError('array index %s out of range in %s' %
+                         (token, pointer))
+    return index
+
+
+def _parent(doc, tokens, pointer):
+    """Returns the container holding the location tokens point to."""
+    for token in tokens[:-1]:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise PatchError('%s does not exist' % pointer)
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token, pointer)]
+        else:
+            raise PatchError('%s does not exist' % pointer)
+    if not isinstance(doc, (dict, list)):
+        raise PatchError('%s does not exist' % pointer)
+    return doc
+
+
+def _get(doc, tokens, pointer):
+    if not tokens:
+        return doc
+    parent = _parent(doc, tokens, pointer)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError('%s does not exist' % pointer)
+        return parent[tokens[-1]]
+    return parent[_index(parent, tokens[-1], pointer)]
+
+
+def _add(doc, tokens, pointer, value):
+    if not tokens:
+        return value
+    parent = _parent(doc, tokens, pointer)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        parent.insert(_index(parent, tokens[-1], pointer, append=True), value)
+    return doc
+
+
+def _remove(doc, tokens, pointer):
+    if not tokens:
+        raise PatchError('cannot remove the whole document')
+    parent = _parent(doc, tokens, pointer)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError('%s does not exist' % pointer)
+        return parent.pop(tokens[-1])
+    return parent.pop(_index(parent, tokens[-1], pointer))
+
+
+def _equal(a, b):
+    # json types: true is not 1, but 1 is 1.0
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return sorted(a) == sorted(b) and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def compile_patch(patch):
+    """Checks a patch document, returning its operations as (op, path
+    tokens, path, value, from tokens, from) tuples for apply_patch."""
+    if not isinstance(patch, list):
+        raise PatchError('a patch must be a list of operations')
+    ops = []
+    for i, op in enumerate(patch):
+        if not isinstance(op, dict) or op.get('op') not in OPS:
+            raise PatchError('operation %d: op must be one of %s' %
+                             (i, ', '.join(OPS)))
+        name = op['op']
+        if 'path' not in op:
+            raise PatchError('operation %d: missing path' % i)
+        if name in ('add', 'replace', 'test') and 'value' not in op:
+            raise PatchError('operation %d: missing value' % i)
+        source = None
+        if name in ('move', 'copy'):
+            if 'from' not in op:
+                raise PatchError('operation %d: missing from' % i)
+            source = parse_pointer(op['from'])
+        tokens = parse_pointer(op['path'])
+        if name == 'move' and tokens[:len(source)] == source and \
+                len(tokens) > len(source):
+            raise PatchError('operation %d: cannot move %s into itself' %
+                             (i, op['from']))
+        ops.append((name, tokens, op['path'], op.get('value'), source,
+                    op.get('from')))
+    return ops
+
+
+def apply_patch(ops, doc):
+    """Returns a copy of doc with the compiled patch ops applied. Raises
+    PatchError if an operation fails, including a failed test."""
+    doc = copy.deepcopy(doc)
+    for name, tokens, path, value, source, source_path in ops:
+        if name == 'add':
+            doc = _add(doc, tokens, path, copy.deepcopy(value))
+        elif name == 'remove':
+            _remove(doc, tokens, path)
+        elif name == 'replace':
+            _get(doc, tokens, path)
+            if tokens:
+                _remove(doc, tokens, path)
+            doc = _add(doc, tokens, path, copy.deepcopy(value))
+        elif name == 'move':
+            if tokens == source:
+                _get(doc, tokens, path)
+                continue
+            if source:
+                value = _remove(doc, source, source_path)
+            else:
+                value = doc
+            doc = _add(doc, tokens, path, value)
+        elif name == 'copy':
+            value = copy.deepcopy(_get(doc, source, source_path))
+            doc = _add(doc, tokens, path, value)
+        elif not _equal(_get(doc, tokens, path), value):
+            raise PatchError('test failed: %s is not %s' %
+                             (path, json.dumps(value, sort_keys=True)))
+    return doc
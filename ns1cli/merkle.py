@@ -0,0 +1,61 @@
+"""Merkle trees of record digests, for finding differing records cheaply.
+
+Leaves are bucketed by a prefix of the hash of their key rather than by
+position, so a record added on one side only changes the hashes on its own
+path, and the trees of two sides stay aligned however their keys differ.
+"""
+import hashlib
+
+
+def digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class MerkleTree(object):
+    """A tree over {key: digest} leaves, where the node for a hex prefix
+    hashes its children, down to DEPTH hex digits."""
+
+    DEPTH = 2
+
+    def __init__(self, leaves):
+        self.buckets = {}
+        for key, value in leaves.items():
+            self.buckets.setdefault(digest(key)[:self.DEPTH], {})[key] = value
+
+        self.nodes = {}
+        for prefix, bucket in self.buckets.items():
+            self.nodes[prefix] = digest(''.join(
+                '%s=%s;' % item for item in sorted(bucket.items())))
+        for length in range(self.DEPTH - 1, -1, -1):
+            parents = {}
+            for prefix, value in sorted(self.nodes.items()):
+                if len(prefix) == length + 1:
+                    parents.setdefault(prefix[:length], []).append(
+                        prefix + value)
+            for prefix, children in parents.items():
+                self.nodes[prefix] = digest(''.join(children))
+
+    @property
+    def root(self):
+        return self.nodes.get('', digest(''))
+
+    def diff(self, other):
+        """Returns the sorted keys whose digests differ between the trees,
+        or that are in only one of them, descending only into the subtrees
+        whose hashes differ."""
+        keys = set()
+        pending = ['']
+        while pending:
+            prefix = pending.pop()
+            if self.nodes.get(prefix) == other.nodes.get(prefix):
+                continue
+            if len(prefix) == self.DEPTH:
+                mine = self.buckets.get(prefix, {})
+                theirs = other.buckets.get(prefix, {})
+                keys.update(k for k in set(mine) | set(theirs)
+                            if mine.get(k) != theirs.get(k))
+                continue
+            for c in '0123456789abcdef':
+                if prefix + c in self.nodes or prefix + c in other.nodes:
+                    pending.append(prefix + c)
+        return sorted(keys)
@@ -0,0 +1,341 @@
+"""Opt-in metrics of the API requests made by the CLI.
+
+Requests are counted and timed by an instrumented copy of the rest client
+transport, and aggregated in memory: recording one is a dict update under a
+lock. The totals are only written out when flushed, at exit and, if an
+interval is given, periodically. Two sinks are supported:
+
+    textfile   a Prometheus textfile collector file, rewritten atomically
+               under a lock, with the totals of previous and concurrent
+               runs carried over so counters keep increasing across
+               invocations
+    statsd     StatsD over UDP, sending what was counted since the last
+               flush, with labels appended to the metric name
+
+Metrics, with resource (zones, records, monitoring, ...) and method labels
+where known:
+
+    ns1cli_requests_total               requests made
+    ns1cli_request_errors_total         failed requests, also by status
+    ns1cli_request_duration_seconds     request latency histogram
+    ns1cli_retries_total                rate limited requests retried
+    ns1cli_throttled_seconds_total      time spent waiting, by reason: rate
+                                        (--rate limits) or backoff (retries)
+    ns1cli_hedged_requests_total        reads sent again by --hedge
+    ns1cli_hedge_wins_total             hedged reads answered by the copy
+    ns1cli_deadline_exceeded_total      reads abandoned at their --timeout
+"""
+import atexit
+import bisect
+import collections
+import contextlib
+import os
+import re
+import socket
+import threading
+import time
+
+from six.moves.urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+
+
+# Latency histogram bucket bounds, in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+# The active Metrics, if metrics are enabled
+_active = None
+
+
+class Metrics(object):
+    """Counters and histograms keyed by (name, labels), where labels is a
+    tuple of (label, value) pairs, flushed to a list of sinks."""
+
+    def __init__(self, sinks, log=None):
+        self.sinks = sinks
+        self.log = log
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        # per bucket (not cumulative) counts, then the sum
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        bucket = bisect.bisect_left(BUCKETS, value)
+        with self.lock:
+            counts = self.histograms.get((name, labels))
+            if counts is None:
+                counts = self.histograms[(name, labels)] = \
+                    [0] * len(BUCKETS) + [0.0]
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def samples(self):
+        """Returns a snapshot of the metrics as (family, type, name, labels,
+        value) samples, in Prometheus form."""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((k, v[:]) for k, v in self.histograms.items())
+
+        samples = [(name, 'counter', name, labels, value)
+                   for (name, labels), value in counters]
+        for (name, labels), counts in histograms:
+            total = 0
+            for bound, count in zip(BUCKETS, counts):
+                total += count
+                samples.append((name, 'histogram', name + '_bucket',
+                                labels + (('le', _number(bound)),), total))
+            samples.append((name, 'histogram', name + '_sum', labels,
+                            counts[-1]))
+            samples.append((name, 'histogram', name + '_count', labels,
+                            total))
+        return samples
+
+    def flush(self):
+        samples = self.samples()
+        with self.flush_lock:
+            for sink in self.sinks:
+                try:
+                    sink.write(samples)
+                except (IOError, OSError, socket.error) as e:
+                    if self.log is not None:
+                        self.log('metrics: %s', e)
+
+    def start(self, interval):
+        """Flushes every interval seconds, on a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _unescape(value):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n'
+                  else m.group(1), value)
+
+
+def read_textfile(path):
+    """Returns the samples of a textfile written by TextfileSink, or none if
+    it does not exist."""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return []
+
+    samples = []
+    family = type = None
+    for line in lines:
+        if line.startswith('# TYPE '):
+            _, _, family, type = line.split(None, 3)
+            continue
+        match = SAMPLE.match(line)
+        if not match or family is None:
+            continue
+        name, labels, value = match.groups()
+        labels = tuple((k, _unescape(v))
+                       for k, v in LABEL.findall(labels or ''))
+        try:
+            samples.append((family, type, name, labels, float(value)))
+        except ValueError:
+            continue
+    return samples
+
+
+class TextfileSink(object):
+    """Writes a Prometheus textfile collector file. Every write adds what
+    was counted since the previous one to the totals in the file, read
+    again under a lock so concurrent runs do not lose each other's
+    counts."""
+
+    def __init__(self, path):
+        self.path = path
+        self.written = {}
+
+    def write(self, samples):
+        with _locked(self.path + '.lock'):
+            self._write(samples)
+
+    def _write(self, samples):
+        families = collections.OrderedDict()
+        for family, type, name, labels, value in read_textfile(self.path):
+            series = families.setdefault((family, type),
+                                         collections.OrderedDict())
+            series[(name, labels)] = value
+        for family, type, name, labels, value in samples:
+            series = families.setdefault((family, type),
+                                         collections.OrderedDict())
+            delta = value - self.written.get((name, labels), 0)
+            series[(name, labels)] = series.get((name, labels), 0) + delta
+
+        lines = []
+        for (family, type), series in families.items():
+            lines.append('# TYPE %s %s' % (family, type))
+            for (name, labels), value in series.items():
+                if labels:
+                    name += '{%s}' % ','.join('%s="%s"' % (k, _escape(v))
+                                              for k, v in labels)
+                lines.append('%s %s' % (name, _number(value)))
+
+        # the collector may read at any time, so replace the file whole
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.rename(tmp, self.path)
+        self.written = dict(((name, labels), value)
+                            for _, _, name, labels, value in samples)
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Holds an exclusive lock on path, where flock is available."""
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class StatsdSink(object):
+    """Sends what was counted since the previous write to a StatsD server
+    as counters, packed into as few datagrams as possible."""
+
+    MAX_PACKET = 512
+
+    def __init__(self, address):
+        host, _, port = address.rpartition(':')
+        family, kind, proto, _, self.address = socket.getaddrinfo(
+            host.strip('[]') or 'localhost', int(port), 0,
+            socket.SOCK_DGRAM)[0]
+        self.sock = socket.socket(family, kind, proto)
+        self.sent = {}
+
+    def write(self, samples):
+        packet = ''
+        for family, type, name, labels, value in samples:
+            delta = value - self.sent.get((name, labels), 0)
+            if not delta:
+                continue
+            self.sent[(name, labels)] = value
+            line = '%s:%s|c' % (_statsd_name(name, labels), _number(delta))
+            if packet and len(packet) + len(line) >= self.MAX_PACKET:
+                self.sock.sendto(packet.encode('utf-8'), self.address)
+                packet = ''
+            packet += ('\n' if packet else '') + line
+        if packet:
+            self.sock.sendto(packet.encode('utf-8'), self.address)
+
+
+def _statsd_name(name, labels):
+    parts = [name]
+    for _, value in labels:
+        if value == '+Inf':
+            value = 'inf'
+        parts.append(re.sub(r'[^a-zA-Z0-9_-]', '_', value))
+    return '.'.join(parts)
+
+
+def enable(sinks, interval=None, log=None):
+    """Starts recording metrics, flushed to sinks at exit and every
+    interval seconds if given."""
+    global _active
+    if _active is None:
+        _active = Metrics(sinks, log)
+        atexit.register(_active.flush)
+        if interval:
+            _active.start(interval)
+    return _active
+
+
+def request_resource(url):
+    """Returns the api resource of a request url, e.g. zones for
+    https://api.nsone.net/v1/zones/example.com."""
+    for part in urlparse(url).path.split('/'):
+        if part and not re.match(r'^v\d+$', part):
+            return part
+    return ''
+
+
+def _status(error):
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', getattr(response, 'code', None))
+    return str(status) if status else 'error'
+
+
+def instrument(transport):
+    """Registers a copy of the named rest client transport that records
+    every request, and returns its name."""
+    # the registry the rest client's resources look their transport up in
+    from nsone.rest.resource import TransportBase
+
+    name = transport + '+metrics'
+    if name in TransportBase.REGISTRY:
+        return name
+    base = TransportBase.REGISTRY[transport]
+
+    class InstrumentedTransport(base):
+
+        def send(self, method, url, *args, **kwargs):
+            labels = (('resource', request_resource(url)), ('method', method))
+            start = time.time()
+            try:
+                return base.send(self, method, url, *args, **kwargs)
+            except Exception as e:
+                if _active is not None:
+                    _active.inc('ns1cli_request_errors_total',
+                                labels + (('status', _status(e)),))
+                raise
+            finally:
+                if _active is not None:
+                    _active.inc('ns1cli_requests_total', labels)
+                    _active.observe('ns1cli_request_duration_seconds', labels,
+                                    time.time() - start)
+
+    TransportBase.REGISTRY[name] = InstrumentedTransport
+    return name
+
+
+def count(name, labels=()):
+    if _active is not None:
+        _active.inc(name, labels)
+
+
+def retried():
+    if _active is not None:
+        _active.inc('ns1cli_retries_total')
+
+
+def throttled(seconds, reason):
+    if _active is not None:
+        _active.inc('ns1cli_throttled_seconds_total', (('reason', reason),),
+                    seconds)
@@ -0,0 +1,75 @@
+"""CPU and memory profiling of command execution."""
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # python < 3.4
+    tracemalloc = None
+
+
+PROFILE_DIR = 'profiles'
+
+
+@contextlib.contextmanager
+def profiled(state, name):
+    """Profiles the enclosed block according to state.profile_opts.
+
+    With cpu profiling, the stats are written to a .pstats file under the ns1
+    directory and the top functions by cumulative time are logged. With
+    memory profiling, the peak traced memory and the top allocation sites
+    are logged.
+    """
+    opts = state.profile_opts
+    cpu = opts.get('cpu')
+    mem = opts.get('mem') and tracemalloc is not None
+    if not cpu and not mem:
+        yield
+        return
+
+    if mem:
+        tracemalloc.start()
+    if cpu:
+        prof = cProfile.Profile()
+        prof.enable()
+
+    try:
+        yield
+    finally:
+        # stop both before reporting, so neither measures the other's report
+        if cpu:
+            prof.disable()
+        if mem:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        if cpu:
+            _report_cpu(state, name, prof, opts['top'])
+        if mem:
+            _report_mem(state, snapshot, peak, opts['top'])
+
+
+def _report_cpu(state, name, prof, top):
+    directory = os.path.join(state.home_dir, PROFILE_DIR)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, '%s-%s.pstats' %
+                        (name, time.strftime('%Y%m%d-%H%M%S')))
+    prof.dump_stats(path)
+
+    stats = pstats.Stats(prof, stream=sys.stderr)
+    stats.sort_stats('cumulative').print_stats(top)
+    state.log('cpu profile written to %s', path)
+
+
+def _report_mem(state, snapshot, peak, top):
+    state.log('peak memory: %.1f KiB', peak / 1024.0)
+    state.log('top %d allocation sites:', top)
+    for stat in snapshot.statistics('lineno')[:top]:
+        state.log('    %s', stat)
@@ -1,18 +1,102 @@
 import atexit
 import code
+import copy
+import functools
 import os
 import readline
 import shlex
 import sys
 
 import click
+import six
 from nsone.rest.resource import ResourceException
 
 from ns1cli import __version__
+from ns1cli.jobs import Jobs, ThreadOutput, captured
+from ns1cli.profiling import profiled
+from ns1cli.transaction import Transaction
+from ns1cli.util import Formatter, collecting, compile_where, pmap
 
 APP_NAME = 'NS1 CLI'
 BANNER = 'ns1 CLI version %s' % __version__
 
+CONSOLE_HELP = """
+Console commands:
+  begin     Start buffering record edits; journaled bulk writes cannot
+            run until commit or rollback
+  commit    Apply buffered record creates, edits and deletes, one
+            request per record
+  rollback  Discard buffered record edits
+  jobs      List background jobs; end a command with & to run it as one
+  wait      Wait for background jobs: wait [JOB...]
+  fg        Wait for a job and show its output: fg [JOB]
+  kill      Stop background jobs: kill JOB...
+  clear     Clear the screen
+  quit      Exit the console
+
+Pipelines:
+  COMMAND | COMMAND ...   Run the second command for each item output by
+                          the first, e.g. zone list | zone info
+  ... | where COND...     Keep items where FIELD=VALUE, FIELD!=VALUE or
+                          FIELD~=REGEX
+  ... | each FIELD        Pass on the items of a list FIELD, e.g. the
+                          records of zone info, with their parent's fields"""
+
+JOB_COMMANDS = ('jobs', 'wait', 'fg', 'kill')
+
+
+def _split_pipeline(command):
+    stages = [[]]
+    for word in command:
+        if word == '|':
+            stages.append([])
+        else:
+            stages[-1].append(word)
+    return stages
+
+
+def _item_args(command, item):
+    """Returns the values item has for the leading arguments of command."""
+    args = []
+    for param in command.params:
+        if not isinstance(param, click.Argument):
+            continue
+        value = item.get(param.name) if isinstance(item, dict) else None
+        if isinstance(value, bool) or \
+                not isinstance(value, six.string_types + six.integer_types):
+            break
+        args.append(six.text_type(value))
+    return args
+
+
+def _where(items, args):
+    predicate = compile_where(args)
+    return [item for item in items if predicate(item)]
+
+
+def _each(items, args):
+    if len(args) != 1:
+        raise ValueError('expected a FIELD')
+    result = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        children = item.get(args[0])
+        if not isinstance(children, list):
+            raise ValueError('%s is not a list field' % args[0])
+        parent = dict((k, v) for k, v in item.items()
+                      if not isinstance(v, (dict, list)))
+        for child in children:
+            if not isinstance(child, dict):
+                child = {args[0]: child}
+            merged = dict(parent)
+            merged.update(child)
+            result.append(merged)
+    return result
+
+
+PIPE_FILTERS = {'where': _where, 'each': _each}
+
 
 class NS1Repl(code.InteractiveConsole):
 
@@ -23,6 +107,13 @@ class NS1Repl(code.InteractiveConsole):
         self.ctx = ctx
         self.cli = cli
         self.exit_cmds = ['quit', 'exit']
+        self.jobs = Jobs()
+        self.quit_warned = False
+
+        # background jobs write to their own buffers, see ns1cli.jobs
+        self.terminal = sys.stdout
+        sys.stdout = ThreadOutput(sys.stdout)
+        sys.stderr = ThreadOutput(sys.stderr)
 
         code.InteractiveConsole.__init__(self)
         history_file = os.path.join(ctx.obj.home_dir, self.HISTORY_FILE)
@@ -46,42 +137,306 @@ class NS1Repl(code.InteractiveConsole):
         if not source:
             return
 
+        background = source.rstrip().endswith('&')
+        if background:
+            source = source.rstrip()[:-1]
         command = shlex.split(source)
+        if not command:
+            return
 
         if command[0] in self.exit_cmds:
+            running = self.jobs.running()
+            if running and not self.quit_warned:
+                self.quit_warned = True
+                click.echo('%d jobs still running, quit again to stop them'
+                           % len(running))
+                return
             sys.exit(0)
-        elif command[0] == 'clear':
+        self.quit_warned = False
+
+        builtin = command[0] in ('clear', 'help', 'begin', 'commit',
+                                 'rollback') + JOB_COMMANDS
+        if builtin and background:
+            click.echo('%s cannot run in the background' % command[0])
+            return
+        if command[0] == 'clear':
             click.clear()
             return
         elif command[0] == 'help':
             click.echo(self.cli.get_help(self.ctx))
+            click.echo(CONSOLE_HELP)
+            return
+        elif command[0] in ('begin', 'commit', 'rollback'):
+            getattr(self, 'do_' + command[0])()
+            return
+        elif command[0] in JOB_COMMANDS:
+            getattr(self, 'do_' + command[0])(command[1:])
             return
 
-        try:
-            help_idx = command.index('help')
-            command[help_idx] = '--help'
-        except ValueError:
-            pass
+        stages = _split_pipeline(command)
+        if len(stages) > 1:
+            run = functools.partial(self.run_pipeline, stages)
+        else:
+            try:
+                help_idx = command.index('help')
+                command[help_idx] = '--help'
+            except ValueError:
+                pass
 
-        subgroup = self.cli.get_command(self.ctx, command[0])
+            subgroup = self.cli.get_command(self.ctx, command[0])
+            if not subgroup:
+                click.echo("unknown command '%s': try 'help'" % command[0])
+                return
+            run = functools.partial(self.run_command, subgroup, command)
 
-        if subgroup:
-            try:
-                with subgroup.make_context(None, command[1:], parent=self.ctx) as sub_ctx:
+        if background:
+            if self.ctx.obj.transaction is not None:
+                click.echo('background jobs cannot run in a transaction')
+                return
+            state = self._job_state(self.ctx.obj)
+            job = self.jobs.start(source.strip(), lambda: run(state))
+            click.echo('[%d] started' % job.id)
+        else:
+            run(self.ctx.obj)
+
+    def run_command(self, subgroup, command, state):
+        """Runs a command with state as its context object, returning
+        whether it succeeded."""
+        try:
+            with profiled(state, command[0]):
+                with subgroup.make_context(None, command[1:], parent=self.ctx,
+                                           obj=state) as sub_ctx:
                     subgroup.invoke(sub_ctx)
                     sub_ctx.exit()
-            except click.ClickException as e:
-                e.show()
-            except ResourceException as e:
-                click.echo('REST API error: %s' % e.message)
+        except click.ClickException as e:
+            e.show()
+        except ResourceException as e:
+            click.echo('REST API error: %s' % e.message)
+        except SystemExit as e:
+            return not e.code
+        else:
+            return True
+        return False
+
+    def run_pipeline(self, stages, state):
+        """Runs the stages of a pipeline, returning whether they all
+        succeeded.
+
+        The first stage runs once. Every later command runs once per item
+        output by the stage before it, concurrently, with the item's fields
+        filling in its leading arguments: a zone for zone commands, a zone,
+        domain and type for record commands. Items pass between stages as
+        the objects commands output as json, and only the last stage's
+        output is shown, in the order of its items.
+        """
+        if not all(stages):
+            click.echo('empty pipeline stage')
+            return False
+        if stages[0][0] in PIPE_FILTERS:
+            click.echo('%s needs the output of a command' % stages[0][0])
+            return False
+
+        items = None
+        ok = True
+        for i, stage in enumerate(stages):
+            last = i == len(stages) - 1
+            if stage[0] in PIPE_FILTERS:
+                try:
+                    items = PIPE_FILTERS[stage[0]](items, stage[1:])
+                except ValueError as e:
+                    click.echo('%s: %s' % (stage[0], e))
+                    return False
+                if last:
+                    formatter = Formatter(state.get_config('output_format'),
+                                          **state.output_filters)
+                    if formatter.output_format == 'text':
+                        formatter.output_format = 'ndjson'
+                    formatter.out_json(items)
+                continue
+
+            command, depth = self._resolve(stage)
+            if command is None:
+                click.echo("unknown command '%s': try 'help'" % stage[0])
+                return False
+            if items is None:
+                items, failed = self._run_stage([stage], state)
+                if failed:
+                    return False
+                continue
+
+            calls = [stage[:depth] + _item_args(command, item) + stage[depth:]
+                     for item in items]
+            items, failed = self._run_stage(calls, state, last)
+            if failed:
+                ok = False
+                click.echo('%d of %d calls of %s failed' %
+                           (failed, len(calls), ' '.join(stage[:depth])))
+        return ok
+
+    def _resolve(self, stage):
+        """Returns the command a stage runs, and the number of its words
+        naming the command and its groups."""
+        command = self.cli.get_command(self.ctx, stage[0])
+        depth = 1
+        while isinstance(command, click.MultiCommand) and depth < len(stage):
+            sub = command.get_command(self.ctx, stage[depth])
+            if sub is None:
+                break
+            command = sub
+            depth += 1
+        return command, depth
+
+    def _run_stage(self, calls, state, last=False):
+        """Runs each of calls, the command lines of a pipeline stage,
+        concurrently. Returns the items they output as json, and the number
+        that failed. The output of the last stage is written instead, in
+        the order of calls."""
+        def call(command):
+            call_state = self._job_state(state)
+            if not last:
+                call_state.cfg['output_format'] = 'json'
+                call_state.output_filters = {}
+            subgroup = self.cli.get_command(self.ctx, command[0])
+            if last:
+                with captured(six.StringIO()) as output:
+                    return self.run_command(subgroup, command, call_state), \
+                        output.getvalue()
+            with collecting([]) as items:
+                return self.run_command(subgroup, command, call_state), items
+
+        # the records api of a transaction is not thread safe
+        workers = 1 if state.transaction is not None else state.cfg['workers']
+        items = []
+        failed = 0
+        for _, result, error in pmap(call, calls, workers=workers):
+            if error is not None:
+                click.echo(getattr(error, 'message', error))
+                result = (False, '' if last else [])
+            succeeded, output = result
+            failed += not succeeded
+            if last:
+                sys.stdout.write(output)
+            elif succeeded:
+                items.extend(output)
+        sys.stdout.flush()
+        return items, failed
+
+    def _job_state(self, state):
+        """Returns a copy of state for a background job or pipeline call,
+        sharing its rest client but not the settings and formatter that
+        commands change as they run."""
+        state = copy.copy(state)
+        state.cfg = dict(state.cfg)
+        state.output_filters = dict(state.output_filters)
+        state.key_opts = dict(state.key_opts)
+        # profiling only measures the thread that starts it
+        state.profile_opts = {}
+        return state
+
+    def _job_args(self, args, default=None):
+        """Returns the jobs given by number (optionally prefixed with %),
+        or default if none are given."""
+        if not args:
+            return default
+        jobs = []
+        for arg in args:
+            job = None
+            if arg.lstrip('%').isdigit():
+                job = self.jobs.get(int(arg.lstrip('%')))
+            if job is None:
+                click.echo('no such job: %s' % arg)
+                return None
+            jobs.append(job)
+        return jobs
+
+    def _report(self, job):
+        click.echo('[%d] %-8s %6.1fs  %s' % (job.id, job.status,
+                                             job.elapsed(), job.command))
+
+    def do_jobs(self, args):
+        for job in self.jobs:
+            job.reported = job.reported or not job.running
+            self._report(job)
+
+    def do_wait(self, args):
+        for job in self._job_args(args, self.jobs.running()) or []:
+            job.wait()
+        for job in self.jobs.unreported():
+            self._report(job)
+
+    def do_fg(self, args):
+        if args:
+            jobs = self._job_args(args[:1])
+            if not jobs:
                 return
-            except SystemExit:
-                pass
+            job = jobs[0]
         else:
-            click.echo("unknown command '%s': try 'help'" % command[0])
+            job = self.jobs.get(None)
+            if job is None:
+                click.echo('no current job')
+                return
+        job.output.attach(self.terminal)
+        try:
+            job.wait()
+        except KeyboardInterrupt:
+            job.output.detach()
+            click.echo('\n[%d] continues in the background' % job.id)
+            return
+        job.reported = True
+        self.jobs.remove(job)
+        if job.status != 'Done':
+            self._report(job)
+
+    def do_kill(self, args):
+        if not args:
+            click.echo('usage: kill JOB...')
+            return
+        for job in self._job_args(args) or []:
+            if job.running:
+                job.kill()
+                click.echo('[%d] killing' % job.id)
+
+    def do_begin(self):
+        state = self.ctx.obj
+        if state.transaction is not None:
+            click.echo('transaction already in progress')
+            return
+        state.transaction = Transaction(state.rest.records())
+        click.echo('record edits will be buffered until commit')
+
+    def do_commit(self):
+        state = self.ctx.obj
+        if state.transaction is None:
+            click.echo('no transaction in progress')
+            return
+        transaction, state.transaction = state.transaction, None
+
+        failed = 0
+        for (zone, domain, type), _, error in transaction.commit(state.pmap):
+            if error is not None:
+                failed += 1
+                click.echo('%s %s %s: %s' % (zone, domain, type,
+                                             getattr(error, 'message', error)))
+            else:
+                state.vlog('%s %s %s committed', zone, domain, type)
+        if failed:
+            click.echo('%d records failed to commit' % failed)
+        else:
+            click.echo('transaction committed')
+
+    def do_rollback(self):
+        state = self.ctx.obj
+        if state.transaction is None:
+            click.echo('no transaction in progress')
+            return
+        state.transaction = None
+        click.echo('transaction rolled back')
 
     def raw_input(self, prompt):
-        return code.InteractiveConsole.raw_input(self, prompt='ns1> ')
+        for job in self.jobs.unreported():
+            self._report(job)
+        prompt = 'ns1> ' if self.ctx.obj.transaction is None else 'ns1*> '
+        return code.InteractiveConsole.raw_input(self, prompt=prompt)
 
     def complete(self, text, state):
         """Return the next possible completion for 'text'.
@@ -0,0 +1,254 @@
+"""Offline evaluation of NS1 record filter chains.
+
+Approximates how the NS1 edge applies a record's filter chain, so traffic
+steering changes can be checked against synthetic queries before they are
+pushed. Only the commonly used filters are implemented; see FILTERS.
+"""
+import binascii
+import collections
+import random
+import socket
+
+import six
+
+
+class SimulationError(ValueError):
+    pass
+
+
+def _ip_int(ip):
+    """Returns (address family, integer value) of an IPv4/IPv6 address."""
+    family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+    try:
+        packed = socket.inet_pton(family, ip)
+    except (socket.error, ValueError):
+        raise SimulationError('invalid ip address: %s' % ip)
+    return family, int(binascii.hexlify(packed), 16)
+
+
+def _prefix(cidr):
+    """Returns (family, network, mask) for a CIDR prefix."""
+    ip, sep, length = str(cidr).strip().partition('/')
+    family, value = _ip_int(ip)
+    bits = 32 if family == socket.AF_INET else 128
+    if not sep:
+        length = bits
+    elif length.isdigit() and int(length) <= bits:
+        length = int(length)
+    else:
+        raise SimulationError('invalid prefix length in %s, expected 0 to '
+                              '%d' % (cidr, bits))
+    mask = ((1 << length) - 1) << (bits - length)
+    return family, value & mask, mask
+
+
+def _is_false(value):
+    if isinstance(value, dict):
+        # data feed, assumed to report up
+        return False
+    if isinstance(value, six.string_types):
+        return value.strip().lower() in ('false', '0', 'no', 'off', '')
+    return not value
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [v.strip() for v in str(value).split(',')]
+
+
+class Answer(object):
+    """An answer with its effective meta: answer meta, then the meta of its
+    region, then the record meta."""
+
+    def __init__(self, adata, regions, record_meta):
+        self.text = ' '.join(str(f) for f in adata['answer'])
+        meta = dict(record_meta)
+        region = adata.get('region')
+        if region and region in regions:
+            meta.update(regions[region].get('meta', {}))
+        meta.update(adata.get('meta', {}))
+        self.meta = meta
+        self.prefixes = [_prefix(p) for p in _as_list(meta.get('ip_prefixes'))]
+
+    def weight(self):
+        try:
+            return max(float(self.meta.get('weight', 1)), 0.0)
+        except (TypeError, ValueError):
+            return 1.0
+
+    def priority(self):
+        try:
+            return int(self.meta.get('priority'))
+        except (TypeError, ValueError):
+            return float('inf')
+
+
+# Query attributes: (country, region, matched) where matched is the frozenset
+# of answer indexes whose ip_prefixes contain the client address.
+
+def f_up(answers, config, query, rng):
+    return [a for a in answers if not _is_false(a.meta.get('up', True))]
+
+
+def f_geotarget_country(answers, config, query, rng):
+    country = query[0]
+    matched = [a for a in answers
+               if country in [c.upper() for c in _as_list(
+                   a.meta.get('country'))]]
+    return matched or answers
+
+
+def f_geotarget_regional(answers, config, query, rng):
+    region = query[1]
+    matched = [a for a in answers
+               if region in [r.upper() for r in _as_list(
+                   a.meta.get('georegion'))]]
+    return matched or answers
+
+
+def f_netfence_prefix(answers, config, query, rng):
+    remove_empty = not _is_false(config.get('remove_no_ip_prefixes', False))
+    result = []
+    for i, a in answers:
+        if a.prefixes:
+            if i in query[2]:
+                result.append((i, a))
+        elif not remove_empty:
+            result.append((i, a))
+    return result
+
+
+def f_priority(answers, config, query, rng):
+    if not answers:
+        return answers
+    best = min(a.priority() for a in answers)
+    return [a for a in answers if a.priority() == best]
+
+
+def f_select_first_n(answers, config, query, rng):
+    try:
+        return answers[:int(config.get('N', 1))]
+    except (TypeError, ValueError):
+        raise SimulationError('invalid select_first_n N: %s' % config['N'])
+
+
+def f_shuffle(answers, config, query, rng):
+    answers = list(answers)
+    rng.shuffle(answers)
+    return answers
+
+
+def f_weighted_shuffle(answers, config, query, rng):
+    # Efraimidis-Spirakis: sort by u ** (1 / weight), largest first
+    keyed = []
+    for a in answers:
+        w = a.weight()
+        keyed.append((rng.random() ** (1.0 / w) if w else 0.0, a))
+    keyed.sort(key=lambda k: k[0], reverse=True)
+    return [a for _, a in keyed]
+
+
+FILTERS = {'up': f_up,
+           'geotarget_country': f_geotarget_country,
+           'geotarget_regional': f_geotarget_regional,
+           'netfence_prefix': f_netfence_prefix,
+           'priority': f_priority,
+           'select_first_n': f_select_first_n,
+           'shuffle': f_shuffle,
+           'weighted_shuffle': f_weighted_shuffle}
+
+# Filters that need the answer indexes alongside the answers
+INDEXED_FILTERS = ('netfence_prefix',)
+
+RANDOM_FILTERS = ('shuffle', 'weighted_shuffle')
+
+ALIASES = {'netfence': 'netfence_prefix'}
+
+
+class Simulator(object):
+    """Evaluates the filter chain of a record (in rest api form) for
+    queries given as (client ip, country, region).
+
+    The deterministic filters before the first random one only depend on
+    the query's country, region and matching ip prefixes, so their result
+    is computed once per distinct combination and reused; only the random
+    filters run for every query.
+    """
+
+    def __init__(self, record, seed=None):
+        regions = record.get('regions') or {}
+        meta = record.get('meta') or {}
+        self.answers = [Answer(a, regions, meta) for a in record['answers']]
+        self.rng = random.Random(seed)
+
+        self.chain = []
+        for f in record.get('filters') or []:
+            if f.get('disabled'):
+                continue
+            name = ALIASES.get(f['filter'], f['filter'])
+            if name not in FILTERS:
+                raise SimulationError('unsupported filter: %s' % f['filter'])
+            self.chain.append((name, f.get('config') or {}))
+
+        split = len(self.chain)
+        for i, (name, _) in enumerate(self.chain):
+            if name in RANDOM_FILTERS:
+                split = i
+                break
+        self.fixed, self.random = self.chain[:split], self.chain[split:]
+
+        self._prefixed = [(i, a) for i, a in enumerate(self.answers)
+                          if a.prefixes]
+        self._uses_prefixes = any(n in INDEXED_FILTERS for n, _ in self.chain)
+        self._cache = {}
+
+    def _matched(self, ip):
+        if not self._uses_prefixes or not self._prefixed:
+            return frozenset()
+        family, value = _ip_int(ip)
+        return frozenset(i for i, a in self._prefixed
+                         if any(f == family and value & mask == net
+                                for f, net, mask in a.prefixes))
+
+    def _run(self, chain, answers, query):
+        for name, config in chain:
+            if name in INDEXED_FILTERS:
+                answers = FILTERS[name](answers, config, query, self.rng)
+            else:
+                kept = FILTERS[name]([a for _, a in answers], config, query,
+                                     self.rng)
+                index = dict((id(a), i) for i, a in answers)
+                answers = [(index[id(a)], a) for a in kept]
+        return answers
+
+    def evaluate(self, ip, country, region):
+        """Returns the answers returned for one query, in order."""
+        query = ((country or '').upper(), (region or '').upper(),
+                 self._matched(ip))
+        answers = self._cache.get(query)
+        if answers is None:
+            answers = self._cache[query] = self._run(
+                self.fixed, list(enumerate(self.answers)), query)
+        if self.random:
+            answers = self._run(self.random, answers, query)
+        return [a.text for _, a in answers]
+
+    def run(self, queries):
+        """Evaluates every (ip, country, region) query, returning the total
+        number of queries, and Counters of how often each answer was returned
+        first and returned at all."""
+        first = collections.Counter()
+        returned = collections.Counter()
+        total = 0
+        for ip, country, region in queries:
+            total += 1
+            result = self.evaluate(ip, country, region)
+            if result:
+                first[result[0]] += 1
+                returned.update(result)
+            else:
+                first[None] += 1
+        return total, first, returned
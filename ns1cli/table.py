@@ -0,0 +1,47 @@
+"""Column oriented in-memory tables for account reports."""
+import collections
+import itertools
+
+from six.moves import zip
+
+
+class Table(object):
+    """A table stored as one list per column.
+
+    Aggregates work on whole columns at a time (zip, Counter, compress),
+    which keeps the per-row work in C rather than in Python loops.
+    """
+
+    def __init__(self, names):
+        self.columns = collections.OrderedDict((n, []) for n in names)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def append(self, row):
+        for name, column in self.columns.items():
+            column.append(row.get(name))
+
+    def where(self, name, predicate):
+        """Returns a new table of the rows where predicate(value of name)
+        is true."""
+        mask = [predicate(v) for v in self.columns[name]]
+        result = Table(self.columns.keys())
+        for n, column in self.columns.items():
+            result.columns[n] = list(itertools.compress(column, mask))
+        return result
+
+    def rows(self, *names):
+        """Returns the values of the named columns as a list of tuples."""
+        return list(zip(*[self.columns[n] for n in names]))
+
+    def count_by(self, *names):
+        """Groups by the named columns, returning sorted (key..., count)
+        tuples."""
+        counts = collections.Counter(zip(*[self.columns[n] for n in names]))
+        return [key + (count,)
+                for key, count in sorted(counts.items(),
+                                         key=lambda i: tuple(
+                                             (v is None, v) for v in i[0]))]
@@ -0,0 +1,123 @@
+"""Buffered record edits for console transactions."""
+import copy
+
+import six
+from nsone.rest.resource import ResourceException
+
+
+# Record.update keyword arguments that map to differently named fields in
+# the record body.
+FIELD_NAMES = {'use_csubnet': 'use_client_subnet'}
+
+
+def _normalize_answers(answers):
+    if isinstance(answers, six.string_types):
+        answers = [answers]
+    result = []
+    for a in answers:
+        if isinstance(a, dict):
+            result.append(a)
+        elif isinstance(a, (list, tuple)):
+            result.append({'answer': list(a)})
+        else:
+            result.append({'answer': [a]})
+    return result
+
+
+class Transaction(object):
+    """Stands in for the records rest api while a console transaction is
+    open. Each record is retrieved once, creates, updates and deletes are
+    applied to local copies, and commit sends them: the deletes first, then
+    one create or update per changed record. Nothing is sent before commit,
+    so a rollback leaves the zone untouched.
+    """
+
+    def __init__(self, record_api):
+        self._api = record_api
+        self._records = {}
+        self._changed = {}
+        self._created = {}
+        self._deleted = set()
+
+    def __len__(self):
+        return len(self._changed) + len(self._created) + len(self._deleted)
+
+    def _key(self, zone, domain, type):
+        return (zone, domain, type.upper())
+
+    def _record(self, key):
+        record = self._records.get(key)
+        if record is None:
+            if key in self._deleted:
+                raise ResourceException('record %s %s %s is deleted in this '
+                                        'transaction' % key)
+            record = self._records[key] = self._api.retrieve(*key)
+        return record
+
+    def retrieve(self, zone, domain, type):
+        return copy.deepcopy(self._record(self._key(zone, domain, type)))
+
+    def update(self, zone, domain, type, **kwargs):
+        key = self._key(zone, domain, type)
+        record = self._record(key)
+        if 'answers' in kwargs:
+            kwargs['answers'] = _normalize_answers(kwargs['answers'])
+
+        # edits of a record created in this transaction go into its create
+        fields = self._created.get(key)
+        if fields is None:
+            fields = self._changed.setdefault(key, {})
+        for name, value in kwargs.items():
+            fields[name] = copy.deepcopy(value)
+            record[FIELD_NAMES.get(name, name)] = copy.deepcopy(value)
+        return copy.deepcopy(record)
+
+    def create(self, zone, domain, type, **kwargs):
+        key = self._key(zone, domain, type)
+        if key in self._created or \
+                (key in self._records and key not in self._deleted):
+            raise ResourceException('record %s %s %s already exists in this '
+                                    'transaction' % key)
+        if 'answers' in kwargs:
+            kwargs['answers'] = _normalize_answers(kwargs['answers'])
+
+        record = {'zone': zone, 'domain': domain, 'type': key[2],
+                  'answers': [], 'filters': [], 'regions': {}, 'meta': {}}
+        for name, value in kwargs.items():
+            record[FIELD_NAMES.get(name, name)] = copy.deepcopy(value)
+        self._records[key] = record
+        self._created[key] = copy.deepcopy(kwargs)
+        return copy.deepcopy(record)
+
+    def delete(self, zone, domain, type):
+        key = self._key(zone, domain, type)
+        self._changed.pop(key, None)
+        if self._created.pop(key, None) is None:
+            # retrieved first, so a missing record fails now, not at commit
+            self._record(key)
+            self._deleted.add(key)
+        self._records.pop(key, None)
+
+    def commit(self, pmap):
+        """Sends the buffered edits, running the deletes and then the creates
+        and updates through pmap. Returns the pmap results, which are
+        ((zone, domain, type), record, exception) tuples."""
+        def flush(key):
+            if key in self._created:
+                return self._api.create(*key, **self._created[key])
+            return self._api.update(*key, **self._changed[key])
+
+        deleted = pmap(lambda key: self._api.delete(*key),
+                       sorted(self._deleted))
+        # a record deleted and created again needs its delete to succeed
+        failed = frozenset(key for key, _, error in deleted
+                           if error is not None)
+        results = pmap(flush, sorted(k for k in
+                                     frozenset(self._created).union(
+                                         self._changed)
+                                     if k not in failed))
+        self._records = {}
+        self._changed = {}
+        self._created = {}
+        self._deleted = set()
+        return deleted + results
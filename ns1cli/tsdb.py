@@ -0,0 +1,119 @@
+"""Compact on-disk store for usage time series.
+
+Each series is a single file of native float64 pairs (timestamp, value),
+sorted by timestamp, so a series loads straight into an array without any
+parsing. Points are only ever appended, apart from the trailing points
+being overwritten when the API reports a newer value for a still-open
+period.
+
+The usage api reports finer buckets for shorter periods, so a series can
+hold daily points followed by hourly ones. Each point covers the time up to
+the next one, and no two points ever cover the same time.
+"""
+import array
+import bisect
+import calendar
+import datetime
+import itertools
+import os
+
+from six.moves import zip
+from six.moves.urllib.parse import quote
+
+
+HOUR = 3600
+DAY = 86400
+
+RESOLUTIONS = ('hour', 'day', 'month')
+
+# Usage api periods and the span of history each one covers.
+PERIODS = (('1h', HOUR), ('24h', DAY), ('30d', 30 * DAY))
+
+_ITEMSIZE = array.array('d').itemsize
+
+
+class Series(object):
+
+    SUFFIX = '.ts'
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, quote(name, safe='') + self.SUFFIX)
+
+    def load(self):
+        """Returns the timestamps and values of the series as two arrays."""
+        data = array.array('d')
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                count = os.fstat(f.fileno()).st_size // _ITEMSIZE
+                data.fromfile(f, count - count % 2)
+        return data[0::2], data[1::2]
+
+    def last_timestamp(self):
+        """Returns the timestamp of the newest point, or None if empty."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 2 * _ITEMSIZE:
+                return None
+            f.seek(size - size % (2 * _ITEMSIZE) - 2 * _ITEMSIZE)
+            data = array.array('d')
+            data.fromfile(f, 2)
+        return int(data[0])
+
+    def update(self, points):
+        """Merges (timestamp, value) points into the series. Stored points
+        at or after the first new timestamp are replaced. New points that
+        fall inside the stored point before them, a coarser bucket ending
+        where the replaced points begin, are already counted and dropped."""
+        points = sorted(points)
+        timestamps, _ = self.load()
+        keep = bisect.bisect_left(timestamps, points[0][0]) if points else 0
+        if 0 < keep < len(timestamps):
+            points = [p for p in points if p[0] >= timestamps[keep]]
+        if not points:
+            return
+
+        data = array.array('d', itertools.chain.from_iterable(points))
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, 'ab') as f:
+            f.truncate(keep * 2 * _ITEMSIZE)
+            data.tofile(f)
+
+
+def fetch_period(last, now):
+    """Returns the shortest usage api period that covers everything newer
+    than the last stored timestamp. The newest point may be a bucket that
+    was still open when fetched, so the period has to reach back to its
+    start, not just to when it was fetched."""
+    if last is not None:
+        for period, span in PERIODS:
+            if now - last < span:
+                return period
+    return PERIODS[-1][0]
+
+
+def _bucket(resolution):
+    if resolution == 'hour':
+        return lambda ts: ts - ts % HOUR
+    if resolution == 'day':
+        return lambda ts: ts - ts % DAY
+
+    def month(ts):
+        d = datetime.datetime.utcfromtimestamp(ts)
+        return calendar.timegm((d.year, d.month, 1, 0, 0, 0))
+    return month
+
+
+def downsample(timestamps, values, resolution, since=None):
+    """Sums values into hour, day or month buckets in a single pass over the
+    (sorted) series. Returns a list of (bucket timestamp, total) pairs."""
+    bucket = _bucket(resolution)
+    start = 0 if since is None else bisect.bisect_left(timestamps, since)
+    pairs = zip(timestamps[start:], values[start:])
+    return [(int(b), int(sum(v for _, v in group)))
+            for b, group in itertools.groupby(pairs,
+                                              key=lambda p: bucket(int(p[0])))]
@@ -1,17 +1,314 @@
+import collections
+import contextlib
+import fnmatch
 import json
+import random
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
+import six
 from click import echo, style, secho
 
+from ns1cli import metrics
+
+
+DEFAULT_WORKERS = 10
+
+
+class RateLimiter(object):
+    """Spaces out calls to wait() so that at most rate of them return per
+    second, across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            at = max(self.next, now)
+            self.next = at + self.interval
+        if at > now:
+            metrics.throttled(at - now, 'rate')
+            time.sleep(at - now)
+
+
+def _status(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', getattr(response, 'code', None))
+
+
+def _message(error):
+    return str(getattr(error, 'message', error)).lower()
+
+
+def is_rate_limited(error):
+    """Whether an api error is an HTTP 429 rate limit response."""
+    return _status(error) == 429 or 'rate limit' in _message(error)
+
+
+def already_exists(error):
+    """Whether an api error is a create refused as the object exists."""
+    return _status(error) == 409 or 'already exists' in _message(error)
+
+
+def not_found(error):
+    """Whether an api error is an HTTP 404 for a missing object."""
+    return _status(error) == 404 or 'not found' in _message(error)
+
+
+def retrying(func, retries, delay=1.0):
+    """Wraps func to retry calls that fail with a rate limit error up to
+    retries times, backing off exponentially with jitter from delay
+    seconds."""
+    def call(*args, **kwargs):
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_rate_limited(e) or \
+                        cancelled():
+                    raise
+            wait = delay * 2 ** attempt * random.uniform(0.5, 1.5)
+            metrics.retried()
+            metrics.throttled(wait, 'backoff')
+            time.sleep(wait)
+    return call
+
+
+class Cancelled(Exception):
+
+    def __init__(self):
+        Exception.__init__(self, 'cancelled')
+        self.message = 'cancelled'
+
+
+_cancel = threading.local()
+
+
+def cancel_on(event):
+    """Makes pmap calls made from the current thread stop once event is
+    set: the calls not yet started fail with Cancelled, as do retries not
+    yet made."""
+    _cancel.event = event
+
+
+def cancelled():
+    """Whether the current thread's cancel_on event is set."""
+    cancel = getattr(_cancel, 'event', None)
+    return cancel is not None and cancel.is_set()
+
+
+def pmap(func, items, workers=DEFAULT_WORKERS, rate=None):
+    """Applies func to each of items on a pool of worker threads.
+
+    Returns a list of (item, result, exception) tuples in the order of items.
+    Exceptions raised by func are captured rather than propagated, so one
+    failed API call does not abort the rest of a bulk operation. If rate is
+    given, at most rate calls are started per second.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    limiter = RateLimiter(rate) if rate else None
+    cancel = getattr(_cancel, 'event', None)
+
+    def call(item):
+        # on the worker threads too, for the retries of func
+        _cancel.event = cancel
+        if cancelled():
+            return item, None, Cancelled()
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    workers = max(1, min(int(workers), len(items)))
+    if workers == 1:
+        return [call(item) for item in items]
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def read_lines(f):
+    """Yields the stripped lines of a file, skipping blank lines and #
+    comments."""
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def compile_matcher(pattern, regex=False):
+    """Returns a case insensitive predicate matching strings against a glob
+    pattern, or searching for a regular expression if regex is true."""
+    if regex:
+        return re.compile(pattern, re.IGNORECASE).search
+    return re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+
+
+_MISSING = object()
+
+
+def _lookup(item, path):
+    for key in path:
+        if not isinstance(item, dict) or key not in item:
+            return _MISSING
+        item = item[key]
+    return item
+
+
+def _text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return six.text_type(value)
+
+
+def compile_fields(fields):
+    """Compiles comma separated dotted field paths, e.g. 'zone,meta.up',
+    into a function projecting a dict onto those fields. Paths missing from
+    a dict are left out of its projection."""
+    paths = [tuple(f.strip().split('.')) for f in fields.split(',')
+             if f.strip()]
+
+    def project(item):
+        result = collections.OrderedDict()
+        for path in paths:
+            value = _lookup(item, path)
+            if value is _MISSING:
+                continue
+            node = result
+            for key in path[:-1]:
+                node = node.setdefault(key, collections.OrderedDict())
+            node[path[-1]] = value
+        return result
+
+    project.paths = paths
+    return project
+
+
+def compile_where(conditions):
+    """Compiles FIELD=VALUE, FIELD!=VALUE and FIELD~=REGEX conditions into a
+    predicate on dicts that is true when every condition holds. FIELD is a
+    dotted path; a list value holds VALUE if any of its items do."""
+    tests = []
+    for condition in conditions:
+        for op in ('!=', '~=', '='):
+            field, sep, value = condition.partition(op)
+            if sep:
+                break
+        if not sep or not field:
+            raise ValueError('expected FIELD=VALUE, FIELD!=VALUE or '
+                             'FIELD~=REGEX, got: %s' % condition)
+        if op == '~=':
+            try:
+                search = compile_matcher(value, regex=True)
+            except re.error as e:
+                raise ValueError('invalid regex %s: %s' % (value, e))
+            test = (lambda s, search=search: search(s) is not None)
+        else:
+            test = (lambda s, value=value: s == value)
+        tests.append((tuple(field.strip().split('.')), op != '!=', test))
+
+    def predicate(item):
+        for path, equal, test in tests:
+            found = _lookup(item, path)
+            if isinstance(found, list):
+                matched = any(test(_text(v)) for v in found)
+            else:
+                matched = found is not _MISSING and test(_text(found))
+            if matched != equal:
+                return False
+        return True
+
+    return predicate
+
+
+_collect = threading.local()
+
+
+@contextlib.contextmanager
+def collecting(items):
+    """Makes Formatter.out_json calls from the current thread append their
+    items to items rather than write them, for console pipelines."""
+    previous = getattr(_collect, 'items', None)
+    _collect.items = items
+    try:
+        yield items
+    finally:
+        _collect.items = previous
+
 
 class Formatter(object):
-    def __init__(self, output_format):
+    def __init__(self, output_format, fields=None, where=None):
+        # Text output with --fields is written as tab separated fields.
+        if output_format == 'text' and fields:
+            output_format = 'fields'
         self.output_format = output_format
+        self.project = compile_fields(fields) if fields else None
+        self.where = compile_where(where) if where else None
 
     def out(self, msg):
         echo(msg)
 
+    def _select(self, items):
+        for item in items:
+            if self.where is not None and not self.where(item):
+                continue
+            if self.project is not None:
+                item = self.project(item)
+            yield item
+
+    def _out_fields(self, item):
+        values = []
+        for path in self.project.paths:
+            value = _lookup(item, path)
+            values.append('-' if value is _MISSING else _text(value))
+        self.out('\t'.join(values))
+
     def out_json(self, data):
-        echo(json.dumps(data))
+        collected = getattr(_collect, 'items', None)
+        if collected is not None:
+            collected.extend(data if isinstance(data, list) else [data])
+            return
+
+        if self.project is None and self.where is None:
+            if self.output_format == 'ndjson' and isinstance(data, list):
+                for item in data:
+                    echo(json.dumps(item))
+                return
+            echo(json.dumps(data))
+            return
+
+        # Projected and filtered items are written one at a time, so only
+        # the selected fields are ever serialized.
+        items = data if isinstance(data, list) else [data]
+        if self.output_format == 'fields':
+            for item in self._select(items):
+                self._out_fields(item)
+        elif self.output_format == 'ndjson' or not isinstance(data, list):
+            for item in self._select(items):
+                echo(json.dumps(item))
+        else:
+            echo('[', nl=False)
+            for i, item in enumerate(self._select(items)):
+                echo((', ' if i else '') + json.dumps(item), nl=False)
+            echo(']')
 
     def pretty_print(self, d, indent=0):
         import collections
@@ -0,0 +1,150 @@
+"""Local validation of record answers, before they are sent to NS1.
+
+Each supported record type has a list of field checks, built once at import,
+so validating a whole zone file is a loop of regex matches and inet_pton
+calls rather than a round trip per bad answer. Types without checks are
+passed through to the API as is.
+"""
+import re
+import socket
+
+import six
+
+
+class ValidationError(ValueError):
+    pass
+
+
+HOSTNAME = re.compile(r'^(?=.{1,254}$)(\*\.)?([a-z0-9_]([a-z0-9_-]{0,61}'
+                      r'[a-z0-9_])?\.)*[a-z0-9_]([a-z0-9_-]{0,61}'
+                      r'[a-z0-9_])?\.?$', re.IGNORECASE)
+
+NAPTR_FLAGS = re.compile(r'^[a-z0-9]*$', re.IGNORECASE)
+
+
+def _address(family, name):
+    def check(value):
+        try:
+            socket.inet_pton(family, value)
+        except (socket.error, ValueError, TypeError):
+            return 'invalid %s address %s' % (name, value)
+    return check
+
+
+def _host(value):
+    if not isinstance(value, six.string_types) or not HOSTNAME.match(value):
+        return 'invalid hostname %s' % value
+
+
+def _uint16(value):
+    if isinstance(value, six.string_types) and value.isdigit():
+        value = int(value)
+    # bool is an int subclass, but True is not a number here
+    if isinstance(value, bool) or not isinstance(value, six.integer_types) \
+            or not 0 <= value <= 65535:
+        return '%s is not a number from 0 to 65535' % value
+
+
+def _text(value):
+    # digit only fields are given as numbers
+    if not isinstance(value, six.string_types + six.integer_types):
+        return '%s is not text' % value
+
+
+def _naptr_flags(value):
+    if not isinstance(value, six.string_types) or \
+            not NAPTR_FLAGS.match(value):
+        return 'invalid NAPTR flags %s' % value
+
+
+def _target(value):
+    # the root name is a valid target: a null MX (RFC 7505), no SRV
+    # service (RFC 2782) or no NAPTR replacement
+    if value != '.':
+        return _host(value)
+
+
+# Field checks per record type. A trailing None means any number of
+# further fields of the last check.
+FIELDS = {
+    'A': [_address(socket.AF_INET, 'IPv4')],
+    'AAAA': [_address(socket.AF_INET6, 'IPv6')],
+    'ALIAS': [_host],
+    'AFSDB': [_uint16, _host],
+    'CNAME': [_host],
+    'DNAME': [_host],
+    'HINFO': [_text, _text],
+    'MX': [_uint16, _target],
+    'NAPTR': [_uint16, _uint16, _naptr_flags, _text, _text, _target],
+    'NS': [_host],
+    'PTR': [_host],
+    'RP': [_host, _host],
+    'SPF': [_text, None],
+    'SRV': [_uint16, _uint16, _uint16, _target],
+    'TXT': [_text, None],
+}
+
+# Types whose answers given as a single string are one field
+TEXT_TYPES = ('SPF', 'TXT')
+
+
+def answer_fields(type, answer):
+    """Returns the rdata fields of an answer given as a string, a list of
+    fields or a rest api answer object."""
+    if isinstance(answer, dict):
+        answer = answer.get('answer', [])
+    if isinstance(answer, six.string_types):
+        answer = [answer]
+    answer = list(answer)
+    if len(answer) == 1 and type not in TEXT_TYPES:
+        if isinstance(answer[0], six.string_types):
+            return answer[0].split()
+    return answer
+
+
+def answer_error(type, answer):
+    """Returns why an answer is invalid for a record type, or None."""
+    checks = FIELDS.get(type.upper())
+    if checks is None:
+        return None
+    fields = answer_fields(type.upper(), answer)
+
+    if checks[-1] is None:
+        checks = checks[:-1]
+        if len(fields) < len(checks):
+            return '%s answers need at least %d fields' % (type, len(checks))
+        checks = checks + [checks[-1]] * (len(fields) - len(checks))
+    elif len(fields) != len(checks):
+        return '%s answers have %d fields, got %d' % (
+            type, len(checks), len(fields))
+
+    for check, field in zip(checks, fields):
+        error = check(field)
+        if error:
+            return error
+    return None
+
+
+def check_answers(type, answers):
+    """Raises ValidationError for the first invalid answer."""
+    for answer in answers:
+        error = answer_error(type, answer)
+        if error:
+            raise ValidationError(error)
+
+
+def summary(errors, sample=20):
+    """Describes a list of errors, showing at most sample of them."""
+    return '%d invalid answers, nothing was changed:\n  %s%s' % (
+        len(errors), '\n  '.join(errors[:sample]),
+        '\n  ...' if len(errors) > sample else '')
+
+
+def record_errors(records):
+    """Yields a message for every invalid answer of records given as
+    dicts with domain, type and answers."""
+    for r in records:
+        for answer in r.get('answers', []):
+            error = answer_error(r['type'], answer)
+            if error:
+                yield '%s %s: %s' % (r['domain'], r['type'], error)
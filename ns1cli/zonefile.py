@@ -0,0 +1,231 @@
+"""Streaming parser for RFC 1035 master (BIND zone) files."""
+import collections
+import re
+
+
+CLASSES = ('IN', 'CH', 'HS', 'CS')
+
+# Positions of rdata fields holding domain names, which may be relative
+# to the current $ORIGIN.
+NAME_FIELDS = {'ALIAS': (0,),
+               'CNAME': (0,),
+               'DNAME': (0,),
+               'NS': (0,),
+               'PTR': (0,),
+               'MX': (1,),
+               'AFSDB': (1,),
+               'RP': (0, 1),
+               'SRV': (3,),
+               'NAPTR': (5,)}
+
+# Types whose rdata is one or more <character-string>s.
+STRING_TYPES = ('TXT', 'SPF')
+
+# Records managed by NS1 itself when a zone is created.
+SKIP_TYPES = ('SOA',)
+
+_TTL_RE = re.compile(r'^\d+([wdhms]\d+)*[wdhms]?$', re.IGNORECASE)
+_TTL_PART_RE = re.compile(r'(\d+)([wdhms]?)', re.IGNORECASE)
+_TTL_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+class ZoneFileError(ValueError):
+
+    def __init__(self, lineno, msg):
+        ValueError.__init__(self, 'line %d: %s' % (lineno, msg))
+        self.lineno = lineno
+
+
+RR = collections.namedtuple('RR', ['lineno', 'name', 'ttl', 'type', 'rdata'])
+
+
+class Quoted(str):
+    """A token that was given as a quoted <character-string>."""
+
+
+def is_ttl(token):
+    return not isinstance(token, Quoted) and bool(_TTL_RE.match(token))
+
+
+def parse_ttl(token):
+    """Converts a TTL such as 3600 or 1h30m into seconds."""
+    return sum(int(n) * _TTL_UNITS[u.lower()]
+               for n, u in _TTL_PART_RE.findall(token))
+
+
+def qualify(name, origin):
+    """Returns name as an absolute domain without the trailing dot."""
+    if name == '@':
+        return origin
+    if name.endswith('.'):
+        return name[:-1]
+    if not origin:
+        return name
+    return '%s.%s' % (name, origin)
+
+
+def _tokenize(line, lineno, depth):
+    """Splits one physical line into tokens, honouring quotes, comments and
+    parentheses. Returns the tokens and the new parenthesis depth."""
+    tokens = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c == ';':
+            break
+        elif c.isspace():
+            i += 1
+        elif c == '(':
+            depth += 1
+            i += 1
+        elif c == ')':
+            if not depth:
+                raise ZoneFileError(lineno, 'unbalanced parenthesis')
+            depth -= 1
+            i += 1
+        elif c == '"':
+            buf = []
+            i += 1
+            while i < n and line[i] != '"':
+                if line[i] == '\\' and i + 1 < n:
+                    i += 1
+                buf.append(line[i])
+                i += 1
+            if i >= n:
+                raise ZoneFileError(lineno, 'unterminated string')
+            tokens.append(Quoted(''.join(buf)))
+            i += 1
+        else:
+            start = i
+            while i < n and not line[i].isspace() and line[i] not in ';()"':
+                i += 1
+            tokens.append(line[start:i])
+    return tokens, depth
+
+
+def _entries(lines):
+    """Yields (lineno, owner_blank, tokens) for each logical entry, joining
+    entries that span several lines within parentheses."""
+    depth = 0
+    entry = None
+    for lineno, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if entry is None:
+            entry = (lineno, line[:1].isspace(), [])
+        tokens, depth = _tokenize(line, lineno, depth)
+        entry[2].extend(tokens)
+        if depth:
+            continue
+        if entry[2]:
+            yield entry
+        entry = None
+    if depth:
+        raise ZoneFileError(entry[0], 'unbalanced parenthesis')
+
+
+def parse(lines, origin):
+    """Parses an iterable of master file lines, yielding an RR for every
+    resource record. Names in the result are lower case and absolute,
+    without a trailing dot.
+
+    Only one entry is held in memory at a time, so arbitrarily large
+    files may be streamed through.
+    """
+    origin = origin.rstrip('.').lower()
+    default_ttl = None
+    last_ttl = None
+    owner = None
+
+    for lineno, owner_blank, tokens in _entries(lines):
+        keyword = tokens[0].upper()
+        if keyword == '$ORIGIN':
+            if len(tokens) != 2:
+                raise ZoneFileError(lineno, '$ORIGIN requires a domain')
+            origin = qualify(tokens[1], origin).lower()
+            continue
+        elif keyword == '$TTL':
+            if len(tokens) != 2 or not is_ttl(tokens[1]):
+                raise ZoneFileError(lineno, '$TTL requires a ttl value')
+            default_ttl = parse_ttl(tokens[1])
+            continue
+        elif keyword.startswith('$'):
+            raise ZoneFileError(lineno, 'unsupported directive %s' % keyword)
+
+        if not owner_blank:
+            owner = qualify(tokens.pop(0), origin).lower()
+        elif owner is None:
+            raise ZoneFileError(lineno, 'record has no owner name')
+
+        ttl = None
+        for _ in range(2):
+            if tokens and is_ttl(tokens[0]):
+                ttl = parse_ttl(tokens.pop(0))
+            elif tokens and tokens[0].upper() in CLASSES:
+                tokens.pop(0)
+
+        if not tokens:
+            raise ZoneFileError(lineno, 'record has no type')
+        rtype = tokens.pop(0).upper()
+
+        if ttl is None:
+            ttl = default_ttl if default_ttl is not None else last_ttl
+        else:
+            last_ttl = ttl
+
+        if not tokens:
+            raise ZoneFileError(lineno, '%s record has no rdata' % rtype)
+
+        yield RR(lineno, owner, ttl, rtype, _rdata(rtype, tokens, origin))
+
+
+def _rdata(rtype, tokens, origin):
+    """Converts rdata tokens into an NS1 answer."""
+    if rtype in STRING_TYPES:
+        return ''.join(tokens)
+
+    fields = []
+    names = NAME_FIELDS.get(rtype, ())
+    for i, t in enumerate(tokens):
+        if i in names and t != '.':
+            t = qualify(t, origin)
+        elif t.isdigit() and not isinstance(t, Quoted):
+            t = int(t)
+        fields.append(str(t) if isinstance(t, Quoted) else t)
+
+    if len(fields) == 1:
+        return fields[0]
+    return fields
+
+
+def group(rrs, zone):
+    """Groups RRs into one NS1 record per (domain, type), with all answers
+    for that pair. Returns a list of record dicts suitable for
+    Records.create, in order of first appearance.
+
+    SOA records and NS records at the zone apex are skipped, since NS1
+    creates its own when the zone is created.
+    """
+    zone = zone.rstrip('.').lower()
+    records = collections.OrderedDict()
+    for rr in rrs:
+        if rr.type in SKIP_TYPES or (rr.type == 'NS' and rr.name == zone):
+            continue
+        if rr.name != zone and not rr.name.endswith('.' + zone):
+            raise ZoneFileError(rr.lineno,
+                                '%s is outside of zone %s' % (rr.name, zone))
+
+        key = (rr.name, rr.type)
+        if key not in records:
+            records[key] = {'zone': zone,
+                            'domain': rr.name,
+                            'type': rr.type,
+                            'answers': []}
+            if rr.ttl is not None:
+                records[key]['ttl'] = rr.ttl
+        elif rr.ttl is not None:
+            # an NS1 record has one ttl for all answers
+            records[key]['ttl'] = min(records[key].get('ttl', rr.ttl), rr.ttl)
+
+        records[key]['answers'].append(rr.rdata)
+
+    return list(records.values())
@@ -0,0 +1,253 @@
+import collections
+import copy
+import json
+import time
+
+import pytest
+from click.testing import CliRunner
+from nsone.rest.resource import ResourceException
+
+from ns1cli import cli as cli_module
+
+
+def _short_answer(answer):
+    return ' '.join(str(field) for field in answer['answer'])
+
+
+class FakeZones(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def list(self):
+        self.api.calls.append(('zones.list',))
+        if self.api.error:
+            raise ResourceException(self.api.error)
+        return [dict(self.api.zones[z]) for z in sorted(self.api.zones)]
+
+    def retrieve(self, zone):
+        self.api.calls.append(('zones.retrieve', zone))
+        if zone not in self.api.zones:
+            raise ResourceException('zone not found')
+        data = dict(self.api.zones[zone])
+        data['records'] = [
+            {'domain': r['domain'], 'type': r['type'],
+             'short_answers': [_short_answer(a) for a in r['answers']],
+             'link': r.get('link'), 'ttl': r['ttl'],
+             'tier': 3 if r['filters'] else 1}
+            for (z, _, _), r in sorted(self.api.records.items()) if z == zone]
+        return data
+
+    def create(self, zone, **kwargs):
+        self.api.calls.append(('zones.create', zone))
+        if zone in self.api.zones:
+            raise ResourceException('zone already exists')
+        self.api.zones[zone] = dict(kwargs, zone=zone)
+        return dict(self.api.zones[zone])
+
+    def update(self, zone, **kwargs):
+        self.api.calls.append(('zones.update', zone))
+        if zone not in self.api.zones:
+            raise ResourceException('zone not found')
+        self.api.zones[zone].update(kwargs)
+        return dict(self.api.zones[zone])
+
+    def delete(self, zone):
+        self.api.calls.append(('zones.delete', zone))
+        if self.api.zones.pop(zone, None) is None:
+            raise ResourceException('zone not found')
+
+
+class FakeRecords(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def retrieve(self, zone, domain, type):
+        self.api.calls.append(('records.retrieve', domain, type))
+        record = self.api.records.get((zone, domain, type))
+        if record is None:
+            raise ResourceException('record not found')
+        return copy.deepcopy(record)
+
+    def create(self, zone, domain, type, **kwargs):
+        self.api.calls.append(('records.create', domain, type))
+        if (zone, domain, type) in self.api.records:
+            raise ResourceException('record already exists')
+        link = kwargs.get('link')
+        if link and not any(d == link for _, d, _ in self.api.records):
+            raise ResourceException('link target %s not found' % link)
+        self.api.add_record(zone, domain, type, **kwargs)
+        return self.retrieve(zone, domain, type)
+
+    def update(self, zone, domain, type, **kwargs):
+        self.api.calls.append(('records.update', domain, type))
+        record = self.api.records.get((zone, domain, type))
+        if record is None:
+            raise ResourceException('record not found')
+        for name, value in kwargs.items():
+            if value is None:
+                raise ResourceException('invalid value for %s' % name)
+            record[name] = copy.deepcopy(value)
+        return copy.deepcopy(record)
+
+    def delete(self, zone, domain, type):
+        self.api.calls.append(('records.delete', domain, type))
+        if self.api.records.pop((zone, domain, type), None) is None:
+            raise ResourceException('record not found')
+
+
+class FakeMonitors(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def list(self):
+        return list(self.api.monitors.values())
+
+    def retrieve(self, jobid):
+        if jobid not in self.api.monitors:
+            raise ResourceException('monitor not found')
+        return copy.deepcopy(self.api.monitors[jobid])
+
+    def create(self, body):
+        self.api.calls.append(('monitors.create', body['name']))
+        body = dict(body, id=str(len(self.api.monitors) + 1))
+        self.api.monitors[body['id']] = body
+        return body
+
+
+class FakeDataSources(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def list(self):
+        self.api.calls.append(('datasource.list',))
+        return [dict(source) for source in self.api.sources.values()]
+
+
+class FakeDataFeeds(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def list(self, sourceid):
+        self.api.calls.append(('datafeed.list', sourceid))
+        if sourceid not in self.api.sources:
+            raise ResourceException('data source not found')
+        return copy.deepcopy(self.api.feeds.get(sourceid, []))
+
+
+class FakeStats(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def qps(self, zone=None, domain=None, type=None):
+        self.api.calls.append(('stats.qps', domain, type))
+        self.api.qps_times.append(time.time())
+        qps = self.api.qps.get((domain, type), 0)
+        if isinstance(qps, Exception):
+            raise qps
+        return {'qps': qps}
+
+
+class FakeApi(object):
+    """An in memory account standing in for the rest client, recording the
+    calls made to it."""
+
+    def __init__(self):
+        self.zones = {}
+        self.records = {}
+        self.monitors = {}
+        # the qps of each (domain, type), or the error retrieving it raises
+        self.qps = {}
+        self.qps_times = []
+        self.sources = collections.OrderedDict()
+        # the feeds of each data source id
+        self.feeds = {}
+        self.calls = []
+        # the accounts of further api keys, see add_key
+        self.accounts = collections.OrderedDict()
+        # the message listing zones fails with, if set
+        self.error = None
+
+    def add_key(self, key_id):
+        """Adds an api key to the config invoke uses, for an account of its
+        own. The first key added is the default."""
+        account = self.accounts[key_id] = FakeApi()
+        return account
+
+    def add_zone(self, zone, **kwargs):
+        self.zones[zone] = dict(kwargs, zone=zone)
+
+    def add_record(self, zone, domain, type, answers=(), **kwargs):
+        answers = [a if isinstance(a, dict) else
+                   {'answer': a if isinstance(a, list) else a.split()}
+                   for a in answers]
+        record = {'zone': zone, 'domain': domain, 'type': type,
+                  'answers': answers, 'filters': [], 'regions': {},
+                  'meta': {}, 'ttl': 3600}
+        record.update(kwargs)
+        self.records[(zone, domain, type)] = record
+
+    def add_source(self, id, name, feeds=()):
+        self.sources[id] = {'id': id, 'name': name, 'sourcetype': 'nsone_v1'}
+        self.feeds[id] = [dict(feed) for feed in feeds]
+
+    def writes(self):
+        return [c for c in self.calls
+                if not c[0].endswith(('.retrieve', '.list'))]
+
+
+class FakeRest(object):
+
+    def __init__(self, api, config):
+        key_id = config.getCurrentKeyID() if config is not None else None
+        self.api = api.accounts.get(key_id, api)
+        self.config = config
+
+    def zones(self):
+        return FakeZones(self.api)
+
+    def records(self):
+        return FakeRecords(self.api)
+
+    def monitors(self):
+        return FakeMonitors(self.api)
+
+    def stats(self):
+        return FakeStats(self.api)
+
+    def datasource(self):
+        return FakeDataSources(self.api)
+
+    def datafeed(self):
+        return FakeDataFeeds(self.api)
+
+
+@pytest.fixture
+def api(tmpdir, monkeypatch):
+    """A FakeApi that ns1 commands run with invoke are sent to."""
+    monkeypatch.setenv('HOME', str(tmpdir))
+    fake = FakeApi()
+    monkeypatch.setattr(cli_module, 'NSONE',
+                        lambda config: FakeRest(fake, config))
+    return fake
+
+
+@pytest.fixture
+def invoke(api, tmpdir):
+    """Runs an ns1 command against the api fixture."""
+    path = str(tmpdir.join('config.json'))
+
+    def run(*args, **kwargs):
+        key_ids = list(api.accounts) or ['test']
+        with open(path, 'w') as f:
+            json.dump({'default_key': key_ids[0],
+                       'keys': dict((k, {'key': k, 'desc': k})
+                                    for k in key_ids)}, f)
+        return CliRunner().invoke(cli_module.cli, ['-c', path] + list(args),
+                                  **kwargs)
+    return run
@@ -1,7 +1,9 @@
-from click.testing import CliRunner
+import json
 
+from click.testing import CliRunner
 
-from ns1cli.cli import cli
+from ns1cli.cli import State, cli
+from ns1cli.util import DEFAULT_WORKERS
 
 
 def test_cli():
@@ -9,3 +11,42 @@ def test_cli():
     assert 1 == 1
     # result = runner.invoke(cli, ['help'])
     # assert result.exit_code == 0
+
+
+def _keys(api, *key_ids):
+    for key_id in key_ids:
+        account = api.add_key(key_id)
+        account.add_zone('%s.com' % key_id)
+        if key_id == 'broken':
+            account.error = 'unauthorized'
+
+
+def test_keys(api, invoke):
+    _keys(api, 'prod', 'staging', 'dev')
+    result = invoke('--output', 'json', 'zone', 'list', '--keys', 'prod, dev')
+    assert result.exit_code == 0
+    assert json.loads(result.output) == [{'zone': 'prod.com', 'key': 'prod'},
+                                         {'zone': 'dev.com', 'key': 'dev'}]
+
+    result = invoke('--output', 'json', 'zone', 'list')
+    assert json.loads(result.output) == [{'zone': 'prod.com'}]
+
+
+def test_keys_failed(api, invoke):
+    _keys(api, 'prod', 'broken')
+    result = invoke('--output', 'json', 'zone', 'list', '--all-keys')
+    assert result.exit_code == 1
+    lines = result.output.splitlines()
+    assert lines[0] == 'broken: unauthorized'
+    assert json.loads(lines[1]) == [{'zone': 'prod.com', 'key': 'prod'}]
+    assert lines[2] == 'Error: REST API: request failed for keys: broken'
+
+    result = invoke('zone', 'list', '--keys', 'broken')
+    assert result.exit_code == 1
+    assert 'request failed for all keys' in result.output
+
+
+def test_state_config_not_shared(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    State().cfg['workers'] = 1
+    assert State().cfg['workers'] == DEFAULT_WORKERS
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+
+from ns1cli import complete
+
+
+INDEX = {
+    'updated': 0,
+    'zones': ['test.com', 'example.com'],
+    'commands': {
+        'commands': {
+            'record': {
+                'commands': {
+                    'info': {'options': ['--help'], 'value_options': {},
+                             'args': ['ZONE', 'DOMAIN', 'TYPE']},
+                },
+            },
+            'zone': {
+                'commands': {
+                    'info': {'options': ['--help'], 'value_options': {},
+                             'args': ['ZONE']},
+                    'list': {'options': ['--help', '--all-keys'],
+                             'value_options': {'--keys': []}, 'args': []},
+                },
+            },
+        },
+    },
+}
+
+
+def test_complete(tmpdir):
+    home = str(tmpdir)
+    complete.write_lines(complete.domains_path(home, 'test.com'),
+                         ['test.com', 'www.test.com'])
+
+    assert complete.complete(INDEX, ['ns1', 'z'], 1, home) == ['zone']
+    assert complete.complete(INDEX, ['ns1', 'zone', ''], 2, home) == \
+        ['info', 'list']
+    assert complete.complete(INDEX, ['ns1', 'zone', 'list', '--'], 3,
+                             home) == ['--help', '--all-keys', '--keys']
+    assert complete.complete(INDEX, ['ns1', 'zone', 'info', 't'], 3,
+                             home) == ['test.com']
+    assert complete.complete(INDEX, ['ns1', 'record', 'info', 'test.com',
+                                     'w'], 4, home) == ['www.test.com']
+    assert complete.complete(INDEX, ['ns1', 'record', 'info', 'test.com',
+                                     'www.test.com', 'A'], 5, home) == \
+        ['A', 'AAAA', 'ALIAS', 'AFSDB']
+
+
+def test_main_home(tmpdir, capsys):
+    home = str(tmpdir)
+    index = dict(INDEX, updated=time.time())
+    complete.write_json(os.path.join(complete.index_dir(home),
+                                     complete.INDEX_FILE), index)
+
+    assert complete.main(['--home', home, '3', 'ns1', 'zone', 'info',
+                          'e']) == 0
+    assert capsys.readouterr()[0] == 'example.com\n'
+
+
+def test_script_home(api, invoke, tmpdir):
+    result = invoke('completion', 'script', 'bash')
+    assert result.exit_code == 0
+    home = os.path.join(str(tmpdir), '.ns1')
+    assert '--home "%s"' % home in result.output
+
+    with open(os.path.join(complete.index_dir(home),
+                           complete.INDEX_FILE)) as f:
+        assert 'zone' in json.load(f)['commands']['commands']
+
+
+def test_refresh(api, invoke, tmpdir):
+    api.add_zone('test.com')
+    api.add_record('test.com', 'www.test.com', 'A', ['1.1.1.1'])
+    api.add_source('s1', 'monitoring')
+    home = os.path.join(str(tmpdir), '.ns1')
+    marker = os.path.join(complete.index_dir(home), complete.REFRESH_MARKER)
+    complete.write_lines(marker, [])
+
+    result = invoke('completion', 'refresh')
+    assert result.exit_code == 0
+    assert not os.path.exists(marker)
+    index = complete.load_index(home)
+    assert index['zones'] == ['test.com'] and index['sources'] == ['s1']
+    assert complete.complete(index, ['ns1', 'record', 'info', 'test.com',
+                                     'w'], 4, home) == ['www.test.com']
+
+
+def test_refresh_failed(api, invoke, tmpdir, monkeypatch):
+    api.error = 'unauthorized'
+    home = os.path.join(str(tmpdir), '.ns1')
+    spawned = []
+    monkeypatch.setattr('subprocess.Popen',
+                        lambda *args, **kwargs: spawned.append(args))
+
+    complete._refresh_in_background(home)
+    assert len(spawned) == 1
+    result = invoke('completion', 'refresh')
+    assert result.exit_code == 1
+
+    # the failed refresh is not retried on every TAB press
+    complete._refresh_in_background(home)
+    assert len(spawned) == 1
+    marker = os.path.join(complete.index_dir(home), complete.REFRESH_MARKER)
+    stale = time.time() - complete.REFRESH_TIMEOUT - 1
+    os.utime(marker, (stale, stale))
+    complete._refresh_in_background(home)
+    assert len(spawned) == 2
@@ -0,0 +1,78 @@
+import json
+import os
+
+
+def _sources(api):
+    api.add_source('s1', 'web', feeds=[
+        {'id': 'f1', 'name': 'www',
+         'destinations': [{'desttype': 'answer', 'destid': 'a1',
+                           'record': 'r1'},
+                          {'desttype': 'region', 'destid': 'us',
+                           'record': 'r1'}]},
+        {'id': 'f2', 'name': 'idle', 'destinations': []}])
+    api.add_source('s2', 'api', feeds=[
+        {'id': 'f3', 'name': 'api',
+         'destinations': [{'desttype': 'record', 'destid': 'r2',
+                           'record': 'r2'}]}])
+
+
+def _feed_rows(rows):
+    return sorted((r['source'], r['source_name'], r['feed'], r['feed_name'],
+                   r['desttype'], r['destid'], r['record']) for r in rows)
+
+
+EXPECTED = [('s1', 'web', 'f1', 'www', 'answer', 'a1', 'r1'),
+            ('s1', 'web', 'f1', 'www', 'region', 'us', 'r1'),
+            ('s1', 'web', 'f2', 'idle', None, None, None),
+            ('s2', 'api', 'f3', 'api', 'record', 'r2', 'r2')]
+
+
+def test_feed_list_all(api, invoke, tmpdir):
+    _sources(api)
+    result = invoke('--output', 'ndjson', 'data', 'feed', 'list', '--all',
+                    '--cache', '--workers', '2')
+    assert result.exit_code == 0
+    rows = [json.loads(line) for line in result.output.splitlines()]
+    assert _feed_rows(rows) == EXPECTED
+    assert sorted(c[1] for c in api.calls
+                  if c[0] == 'datafeed.list') == ['s1', 's2']
+
+    with open(os.path.join(str(tmpdir), '.ns1', 'feeds.json')) as f:
+        index = json.load(f)
+    assert _feed_rows(index['destinations']) == EXPECTED
+    assert index['updated'] > 0
+
+    result = invoke('data', 'feed', 'list', '--all')
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].split() == ['SOURCE', 'FEED', 'DESTTYPE', 'DESTID',
+                                'RECORD']
+    assert sorted(line.split() for line in lines[1:]) == [
+        ['api', 'api', 'record', 'r2', 'r2'],
+        ['web', 'idle', '-', '-', '-'],
+        ['web', 'www', 'answer', 'a1', 'r1'],
+        ['web', 'www', 'region', 'us', 'r1']]
+
+
+def test_feed_list_cached(api, invoke):
+    _sources(api)
+    result = invoke('data', 'feed', 'list', '--all', '--cached')
+    assert result.exit_code == 1
+    assert 'data feed list --all --cache first' in result.output
+
+    assert invoke('data', 'feed', 'list', '--all', '--cache').exit_code == 0
+    del api.calls[:]
+    api.sources.clear()
+    result = invoke('--output', 'json', 'data', 'feed', 'list', '--all',
+                    '--cached')
+    assert result.exit_code == 0
+    assert _feed_rows(json.loads(result.output)) == EXPECTED
+    assert api.calls == []
+
+
+def test_feed_list_options(api, invoke):
+    _sources(api)
+    for args in [('--all', 's1'), ('--all', '--cache', '--cached'),
+                 ('--cache', 's1'), ('--cached', 's1'), ()]:
+        result = invoke('data', 'feed', 'list', *args)
+        assert result.exit_code == 2, args
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from nsone.rest.resource import ResourceException
+
+from ns1cli.hedging import Hedger
+
+URL = 'https://api.nsone.net/v1/zones/test.com'
+
+
+def fast(method, url):
+    time.sleep(0.001)
+    return 'fast'
+
+
+def test_hedge():
+    hedger = Hedger(percentile=90, budget=1)
+    for _ in range(20):
+        assert hedger.send(fast, 'GET', URL) == 'fast'
+
+    calls = []
+
+    def slow_once(method, url):
+        calls.append(url)
+        if len(calls) == 1:
+            time.sleep(1)
+            return 'slow'
+        return fast(method, url)
+
+    start = time.time()
+    assert hedger.send(slow_once, 'GET', URL) == 'fast'
+    assert time.time() - start < 0.5
+    assert len(calls) == 2
+
+
+def test_hedge_budget():
+    # no reads yet have earned a hedge
+    hedger = Hedger(percentile=50, budget=0.01)
+    for _ in range(20):
+        hedger.send(fast, 'GET', URL)
+
+    calls = []
+
+    def slow(method, url):
+        calls.append(url)
+        time.sleep(0.05)
+        return 'slow'
+
+    assert hedger.send(slow, 'GET', URL) == 'slow'
+    assert len(calls) == 1
+
+
+def test_timeout():
+    hedger = Hedger(timeout=0.05)
+
+    def slow(method, url):
+        time.sleep(1)
+
+    start = time.time()
+    with pytest.raises(ResourceException):
+        hedger.send(slow, 'GET', URL)
+    assert time.time() - start < 0.5
+
+    # writes are never abandoned
+    assert hedger.send(lambda m, u: time.sleep(0.1) or 'ok', 'PUT', URL) == \
+        'ok'
@@ -0,0 +1,29 @@
+import threading
+
+from ns1cli.jobs import Jobs
+from ns1cli.util import Cancelled, pmap
+
+
+def test_kill():
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def call(item):
+        started.set()
+        release.wait(5)
+        return item
+
+    def run():
+        results.extend(pmap(call, range(3), workers=1))
+        return True
+
+    job = Jobs().start('record delete', run)
+    started.wait(5)
+    job.kill()
+    release.set()
+    job.wait()
+
+    # the call in flight finishes, the others are not made
+    assert job.status == 'Killed'
+    assert results[0] == (0, 0, None)
+    assert [type(error) for _, _, error in results[1:]] == [Cancelled] * 2
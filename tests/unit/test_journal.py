@@ -0,0 +1,127 @@
+import os
+import re
+
+import pytest
+from nsone.rest.resource import ResourceException
+
+from ns1cli.cli import State
+from ns1cli.journal import Journal, JournalError, journal_dir
+from ns1cli.util import not_found
+
+
+OPS = [{'zone': 'test.com', 'domain': 'a.test.com', 'type': 'A'},
+       {'zone': 'test.com', 'domain': 'b.test.com', 'type': 'A'},
+       {'zone': 'test.com', 'domain': 'c.test.com', 'type': 'A'}]
+
+
+def test_journal(tmpdir):
+    home = str(tmpdir)
+    job = Journal.create(home, 'record delete', OPS)
+    assert not job.resumed
+    job.mark_done(1)
+    assert job.close() == 2
+
+    # a write torn by a crash is ignored
+    with open(job.path, 'a') as f:
+        f.write('{"done": 0')
+    job = Journal.load(home, job.job_id)
+    assert job.resumed
+    assert job.command == 'record delete'
+    assert job.pending() == [(0, OPS[0]), (2, OPS[2])]
+
+    job.mark_done(0)
+    job.mark_done(2)
+    assert job.close() == 0
+    assert not os.path.exists(job.path)
+    with pytest.raises(JournalError):
+        Journal.load(home, job.job_id)
+
+
+def test_resume_lost_done(api, invoke, tmpdir):
+    api.add_zone('test.com')
+    for op in OPS:
+        api.add_record(op['zone'], op['domain'], op['type'], ['1.1.1.1'])
+    home = os.path.join(str(tmpdir), '.ns1')
+
+    # a.test.com was deleted, but the run died before journaling it
+    job = Journal.create(home, 'record delete', OPS)
+    del api.records[('test.com', 'a.test.com', 'A')]
+    job.close()
+
+    result = invoke('record', 'delete', '--resume', job.job_id)
+    assert result.exit_code == 0, result.output
+    assert api.records == {}
+    assert os.listdir(journal_dir(home)) == []
+
+
+def test_pmap_job_done_if(api):
+
+    def delete(op):
+        raise ResourceException('record not found')
+
+    # only a resumed job may have done operations it did not journal
+    state = State()
+    job = state.start_job('record delete', OPS[:1])
+    [(_, _, error)] = state.pmap_job(job, delete, not_found)
+    assert isinstance(error, ResourceException)
+
+    job = Journal.load(state.home_dir, job.job_id)
+    [(_, _, error)] = state.pmap_job(job, delete, not_found)
+    assert error is None
+    assert not os.path.exists(job.path)
+
+
+def _crash_after_update(monkeypatch):
+    """Makes journaling the first completion fail, as if the run died once
+    its write reached the api."""
+    mark_done = Journal.mark_done
+
+    def crash(self, index):
+        monkeypatch.setattr(Journal, 'mark_done', mark_done)
+        raise RuntimeError('killed')
+    monkeypatch.setattr(Journal, 'mark_done', crash)
+
+
+def _job_id(output):
+    return re.search(r'--resume (\S+)', output).group(1)
+
+
+def test_resume_answer_remove(api, invoke, tmpdir, monkeypatch):
+    api.add_zone('test.com')
+    api.add_record('test.com', 'a.test.com', 'A', ['1.1.1.1', '2.2.2.2'])
+    answers = tmpdir.join('answers.txt')
+    answers.write('test.com a.test.com A 1.1.1.1\n')
+
+    _crash_after_update(monkeypatch)
+    result = invoke('record', 'answer', 'remove', '--workers', '1',
+                    '--from-file', str(answers))
+    assert result.exit_code == 1
+    record = api.records[('test.com', 'a.test.com', 'A')]
+    assert record['answers'] == [{'answer': ['2.2.2.2']}]
+
+    result = invoke('record', 'answer', 'remove', '--resume',
+                    _job_id(result.output))
+    assert result.exit_code == 0, result.output
+    assert record['answers'] == [{'answer': ['2.2.2.2']}]
+    assert os.listdir(journal_dir(os.path.join(str(tmpdir), '.ns1'))) == []
+
+
+def test_resume_patch(api, invoke, tmpdir, monkeypatch):
+    api.add_zone('test.com')
+    api.add_record('test.com', 'a.test.com', 'A', ['1.1.1.1'])
+    api.add_record('test.com', 'b.test.com', 'A', ['1.1.1.1'])
+    patch = '[{"op": "add", "path": "/answers/-", ' \
+        '"value": {"answer": ["2.2.2.2"]}}]'
+
+    _crash_after_update(monkeypatch)
+    result = invoke('record', 'patch', '--workers', '1', '-y', '--match',
+                    'domain=*.test.com', '-p', patch)
+    assert result.exit_code == 1
+    result = invoke('record', 'patch', '--resume', _job_id(result.output))
+    assert result.exit_code == 0, result.output
+
+    # each record got the answer once, though one update was not journaled
+    for domain in ('a.test.com', 'b.test.com'):
+        assert api.records[('test.com', domain, 'A')]['answers'] == \
+            [{'answer': ['1.1.1.1']}, {'answer': ['2.2.2.2']}]
+    assert len(api.writes()) == 2
@@ -0,0 +1,47 @@
+import pytest
+
+from ns1cli.jsonpatch import PatchError, apply_patch, compile_patch
+
+
+RECORD = {'ttl': 3600,
+          'meta': {'up': True},
+          'filters': [{'filter': 'up'}, {'filter': 'shuffle'}],
+          'answers': [{'answer': ['1.1.1.1']}]}
+
+
+def patch(ops, doc=RECORD):
+    return apply_patch(compile_patch(ops), doc)
+
+
+def test_operations():
+    result = patch([
+        {'op': 'replace', 'path': '/ttl', 'value': 300},
+        {'op': 'add', 'path': '/answers/-', 'value': {'answer': ['2.2.2.2']}},
+        {'op': 'add', 'path': '/meta/a~1b', 'value': 1},
+        {'op': 'remove', 'path': '/meta/up'},
+        {'op': 'move', 'from': '/filters/1', 'path': '/filters/0'},
+        {'op': 'copy', 'from': '/ttl', 'path': '/meta/ttl'},
+        {'op': 'test', 'path': '/meta/ttl', 'value': 300.0},
+    ])
+    assert result == {'ttl': 300,
+                      'meta': {'a/b': 1, 'ttl': 300},
+                      'filters': [{'filter': 'shuffle'}, {'filter': 'up'}],
+                      'answers': [{'answer': ['1.1.1.1']},
+                                  {'answer': ['2.2.2.2']}]}
+    # the record is left as is
+    assert RECORD['ttl'] == 3600 and len(RECORD['answers']) == 1
+
+
+@pytest.mark.parametrize('ops', [
+    {'op': 'add', 'path': '/ttl', 'value': 1},
+    [{'op': 'frob', 'path': '/ttl'}],
+    [{'op': 'add', 'path': 'ttl', 'value': 1}],
+    [{'op': 'replace', 'path': '/missing', 'value': 1}],
+    [{'op': 'remove', 'path': '/answers/1'}],
+    [{'op': 'add', 'path': '/answers/01', 'value': 1}],
+    [{'op': 'move', 'from': '/meta', 'path': '/meta/up'}],
+    [{'op': 'test', 'path': '/meta/up', 'value': 1}],
+])
+def test_errors(ops):
+    with pytest.raises(PatchError):
+        patch(ops)
@@ -0,0 +1,18 @@
+from ns1cli.merkle import MerkleTree
+
+
+def test_diff():
+    leaves = dict(('host%d A' % i, str(i)) for i in range(1000))
+    other = dict(leaves)
+    del other['host7 A']
+    other['host21 A'] = 'changed'
+    other['new A'] = '1'
+
+    assert MerkleTree(leaves).root == MerkleTree(dict(leaves)).root
+    assert MerkleTree(leaves).diff(MerkleTree(dict(leaves))) == []
+    assert MerkleTree(leaves).diff(MerkleTree(other)) == [
+        'host21 A', 'host7 A', 'new A']
+
+
+def test_empty():
+    assert MerkleTree({}).diff(MerkleTree({'a': '1'})) == ['a']
@@ -0,0 +1,58 @@
+from nsone.rest.resource import BaseResource, TransportBase
+
+from ns1cli import metrics
+from ns1cli.cli import State
+from ns1cli.metrics import Metrics, TextfileSink, read_textfile
+
+
+def test_textfile(tmpdir):
+    path = str(tmpdir.join('ns1.prom'))
+    metrics = Metrics([])
+    labels = (('resource', 'zones'), ('method', 'GET'))
+    metrics.inc('ns1cli_requests_total', labels)
+    metrics.observe('ns1cli_request_duration_seconds', labels, 0.2)
+    metrics.observe('ns1cli_request_duration_seconds', labels, 3.0)
+
+    TextfileSink(path).write(metrics.samples())
+    # totals carry over to the next run
+    TextfileSink(path).write(metrics.samples())
+
+    samples = dict(((name, labels), value)
+                   for _, _, name, labels, value in read_textfile(path))
+    bucket = 'ns1cli_request_duration_seconds_bucket'
+    assert samples[('ns1cli_requests_total', labels)] == 2
+    assert samples[('ns1cli_request_duration_seconds_count', labels)] == 4
+    assert samples[(bucket, labels + (('le', '0.25'),))] == 2
+    assert samples[(bucket, labels + (('le', '+Inf'),))] == 4
+
+
+def test_textfile_concurrent(tmpdir):
+    # two runs writing the same file, each flushing twice
+    path = str(tmpdir.join('ns1.prom'))
+    first, second = Metrics([]), Metrics([])
+    first_sink, second_sink = TextfileSink(path), TextfileSink(path)
+
+    first.inc('ns1cli_requests_total')
+    first_sink.write(first.samples())
+    second.inc('ns1cli_requests_total', value=2)
+    second_sink.write(second.samples())
+    first.inc('ns1cli_requests_total')
+    first_sink.write(first.samples())
+    second_sink.write(second.samples())
+
+    [(_, _, name, _, value)] = read_textfile(path)
+    assert (name, value) == ('ns1cli_requests_total', 4)
+
+
+def test_client_with_metrics(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setattr(metrics, '_active', None)
+    state = State()
+    state.rest_cfg_opts.update(api_key='test', transport='requests')
+    state.metrics_opts['file'] = str(tmpdir.join('ns1.prom'))
+    state.load_rest_client()
+
+    assert state.rest.config['transport'] == 'requests+metrics'
+    resource = BaseResource(state.rest.config)
+    assert isinstance(resource._transport,
+                      TransportBase.REGISTRY['requests+metrics'])
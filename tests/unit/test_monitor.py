@@ -0,0 +1,51 @@
+import json
+
+from ns1cli.commands.cmd_monitor import _jobs
+
+
+TEMPLATE = {'name': 'http', 'job_type': 'http',
+            'config': {'url': 'https://{host}/health'}}
+
+
+def test_jobs():
+    jobs = _jobs(TEMPLATE, ['a.test.com', 'b.test.com'], '{name} {host}')
+    assert [j['body']['name'] for j in jobs] == ['http a.test.com',
+                                                 'http b.test.com']
+    assert jobs[0]['body']['config'] == {'url': 'https://a.test.com/health'}
+
+    tcp = {'name': 'tcp', 'config': {'port': 443}}
+    [job] = _jobs(tcp, ['10.0.0.1'], '{host}')
+    assert job == {'host': '10.0.0.1',
+                   'body': {'name': '10.0.0.1',
+                            'config': {'port': 443, 'host': '10.0.0.1'}}}
+
+    assert _jobs(TEMPLATE, None, '{name} {host}') == \
+        [{'host': None, 'body': dict(TEMPLATE, name='http')}]
+
+
+def test_create_hosts(api, invoke, tmpdir):
+    template = tmpdir.join('http.json')
+    template.write(json.dumps(TEMPLATE))
+
+    result = invoke('--output', 'json', 'monitor', 'create', '--template',
+                    str(template), '--hosts', '-',
+                    input='# backends\na.test.com\n\nb.test.com\n')
+    assert result.exit_code == 0
+    assert sorted(m['name'] for m in api.monitors.values()) == \
+        ['http a.test.com', 'http b.test.com']
+
+
+def test_create_empty_hosts(api, invoke, tmpdir):
+    template = tmpdir.join('http.json')
+    template.write(json.dumps(TEMPLATE))
+
+    result = invoke('monitor', 'create', '--template', str(template),
+                    '--hosts', '-', input='# no hosts yet\n')
+    assert result.exit_code == 2
+    assert 'no hosts given' in result.output
+    assert api.monitors == {}
+
+    api.monitors['1'] = dict(TEMPLATE, id='1')
+    result = invoke('monitor', 'clone', '1', '--hosts', '-', input='')
+    assert result.exit_code == 2
+    assert len(api.monitors) == 1
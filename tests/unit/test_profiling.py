@@ -0,0 +1,28 @@
+import os
+import pstats
+
+from ns1cli.profiling import PROFILE_DIR
+
+
+def test_profile(api, invoke, tmpdir):
+    api.add_zone('test.com')
+    result = invoke('--profile', '--profile-top', '5', 'zone', 'list')
+    assert result.exit_code == 0
+    assert 'test.com' in result.output
+
+    directory = os.path.join(str(tmpdir), '.ns1', PROFILE_DIR)
+    [name] = os.listdir(directory)
+    assert name.startswith('zone-') and name.endswith('.pstats')
+    assert 'cpu profile written to %s' % os.path.join(directory, name) in \
+        result.output
+    # the dump is a loadable profile of the command
+    stats = pstats.Stats(os.path.join(directory, name))
+    assert any(func == 'list' for _, _, func in stats.stats)
+
+
+def test_profile_mem(api, invoke, tmpdir):
+    result = invoke('--profile-mem', 'zone', 'list')
+    assert result.exit_code == 0
+    assert 'peak memory: ' in result.output
+    assert 'top 20 allocation sites:' in result.output
+    assert not os.path.exists(os.path.join(str(tmpdir), '.ns1', PROFILE_DIR))
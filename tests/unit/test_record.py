@@ -0,0 +1,116 @@
+import pytest
+
+from ns1cli import cli as cli_module
+from ns1cli import jsonpatch
+from ns1cli.commands.cmd_record import patch_record
+
+
+def _account(api):
+    api.add_zone('test.com')
+    api.add_record('test.com', 'test.com', 'NS', ['dns1.p01.nsone.net'])
+    api.add_record('test.com', 'web1.test.com', 'A', ['1.1.1.1'])
+    api.add_record('test.com', 'web2.test.com', 'A', ['2.2.2.2'])
+    api.add_record('test.com', 'mail.test.com', 'MX', ['10 mx.test.com'])
+
+
+def test_delete_match(api, invoke):
+    _account(api)
+    result = invoke('--output', 'json', 'record', 'delete', '--match',
+                    'domain=web*', '-y')
+    assert result.exit_code == 0
+    assert sorted(api.records) == [('test.com', 'mail.test.com', 'MX'),
+                                   ('test.com', 'test.com', 'NS')]
+
+
+def test_delete_match_regex(api, invoke):
+    _account(api)
+    result = invoke('record', 'delete', '--regex', '--match',
+                    'domain=^web[0-9]+\\.', '-y')
+    assert result.exit_code == 0
+    assert len(api.records) == 2
+
+    result = invoke('record', 'delete', '--regex', '--match', 'domain=(')
+    assert result.exit_code == 2
+    assert 'invalid regex' in result.output
+    assert len(api.records) == 2
+
+
+def test_delete_match_apex_ns(api, invoke):
+    _account(api)
+    result = invoke('record', 'delete', '--match', 'zone=test.com', '-y')
+    assert result.exit_code == 0
+    assert 'Skipping the apex NS records of 1 zones' in result.output
+    assert sorted(api.records) == [('test.com', 'test.com', 'NS')]
+
+    result = invoke('record', 'delete', '--match', 'type=NS', '-y',
+                    '--include-apex-ns')
+    assert result.exit_code == 0
+    assert api.records == {}
+
+
+def test_answers_from_args():
+    from ns1cli.commands.cmd_record import _answers_from_args
+    assert _answers_from_args('MX', ('10 mx.test.com',), ()) == \
+        [[10, 'mx.test.com']]
+    assert _answers_from_args('TXT', ('v=spf1 include:_spf.test.com ~all',),
+                              ()) == [['v=spf1 include:_spf.test.com ~all']]
+
+
+def test_answer_txt(api, invoke):
+    spf = 'v=spf1 include:_spf.test.com ~all'
+    api.add_zone('test.com')
+    api.add_record('test.com', 'test.com', 'TXT', [['hello world']])
+
+    result = invoke('record', 'answer', 'add', 'test.com', 'test.com', 'TXT',
+                    spf)
+    assert result.exit_code == 0
+    record = api.records[('test.com', 'test.com', 'TXT')]
+    assert record['answers'] == [{'answer': ['hello world']},
+                                 {'answer': [spf]}]
+
+    result = invoke('record', 'answer', 'remove', '--from-file', '-',
+                    input='test.com test.com TXT hello world\n')
+    assert result.exit_code == 0
+    assert record['answers'] == [{'answer': [spf]}]
+
+
+def _patch(api, ops, dry_run=False):
+    return patch_record(cli_module.NSONE(None).records(), 'test.com',
+                        'web1.test.com', 'A', jsonpatch.compile_patch(ops),
+                        dry_run)
+
+
+def test_patch_record(api):
+    _account(api)
+    record, changed = _patch(api, [
+        {'op': 'replace', 'path': '/ttl', 'value': 300}], dry_run=True)
+    assert changed and record['ttl'] == 300
+    assert api.writes() == []
+
+    record, changed = _patch(api, [
+        {'op': 'add', 'path': '/meta/up', 'value': True}])
+    assert changed
+    assert api.records[('test.com', 'web1.test.com', 'A')]['meta'] == \
+        {'up': True}
+
+    # unchanged records are not written
+    assert _patch(api, [{'op': 'test', 'path': '/ttl', 'value': 3600}]) == \
+        (record, False)
+    assert api.writes() == [('records.update', 'web1.test.com', 'A')]
+
+
+def test_patch_record_remove(api):
+    _account(api)
+    api.records[('test.com', 'web1.test.com', 'A')].update(
+        meta={'up': True}, filters=[{'filter': 'up'}])
+    record, changed = _patch(api, [{'op': 'remove', 'path': '/meta'},
+                                   {'op': 'remove', 'path': '/filters'}])
+    assert changed
+    assert record['meta'] == {} and record['filters'] == []
+
+    with pytest.raises(jsonpatch.PatchError) as e:
+        _patch(api, [{'op': 'remove', 'path': '/ttl'}])
+    assert 'ttl cannot be removed' in str(e.value)
+    with pytest.raises(jsonpatch.PatchError) as e:
+        _patch(api, [{'op': 'replace', 'path': '/domain', 'value': 'x'}])
+    assert 'domain cannot be changed' in str(e.value)
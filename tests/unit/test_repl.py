@@ -0,0 +1,79 @@
+import click
+import pytest
+
+from ns1cli import cli as cli_module
+from ns1cli.cli import State, cli
+from ns1cli.repl import NS1Repl, _each, _item_args
+from ns1cli.util import Formatter, collecting
+
+
+@pytest.fixture
+def repl(api):
+    api.add_zone('a.com')
+    api.add_zone('b.com')
+    api.add_record('a.com', 'www.a.com', 'A', ['1.1.1.1'])
+    api.add_record('b.com', 'www.b.com', 'A', ['2.2.2.2'])
+
+    state = State()
+    # the fake client of the api fixture
+    state.rest = cli_module.NSONE(None)
+    # skip the terminal and history setup of __init__
+    console = NS1Repl.__new__(NS1Repl)
+    console.ctx = click.Context(cli, obj=state)
+    console.cli = cli
+    return console
+
+
+def test_collecting():
+    items = []
+    with collecting(items):
+        Formatter('json').out_json([{'zone': 'a.com'}])
+        Formatter('json').out_json({'zone': 'b.com'})
+    assert items == [{'zone': 'a.com'}, {'zone': 'b.com'}]
+
+
+def test_item_args():
+    info = cli.get_command(None, 'record').get_command(None, 'info')
+    item = {'zone': 'a.com', 'domain': 'www.a.com', 'type': 'A', 'ttl': 60}
+    assert _item_args(info, item) == ['a.com', 'www.a.com', 'A']
+    # arguments are filled in up to the first the item has no value for
+    assert _item_args(info, {'zone': 'a.com', 'type': 'A'}) == ['a.com']
+    assert _item_args(info, 'a.com') == []
+
+
+def test_each():
+    items = [{'zone': 'a.com', 'records': [{'domain': 'www.a.com'}],
+              'meta': {}}]
+    assert _each(items, ['records']) == [
+        {'zone': 'a.com', 'domain': 'www.a.com'}]
+    with pytest.raises(ValueError):
+        _each(items, ['zone'])
+
+
+def test_run_stage(repl):
+    state = repl.ctx.obj
+    items, failed = repl._run_stage(
+        [['zone', 'info', 'a.com'], ['zone', 'info', 'missing.com']], state)
+    assert failed == 1
+    assert [item['zone'] for item in items] == ['a.com']
+
+
+def test_run_pipeline(repl, capsys):
+    state = repl.ctx.obj
+    stages = [['zone', 'list'], ['zone', 'info'], ['each', 'records'],
+              ['where', 'domain~=^www']]
+    assert repl.run_pipeline(stages, state)
+    out = capsys.readouterr().out.splitlines()
+    assert [line for line in out if 'www.a.com' in line]
+    assert [line for line in out if 'www.b.com' in line]
+    # the calls of the second stage are made per item of the first
+    assert ('zones.retrieve', 'a.com') in state.rest.api.calls
+    assert ('zones.retrieve', 'b.com') in state.rest.api.calls
+
+
+def test_run_pipeline_errors(repl, capsys):
+    state = repl.ctx.obj
+    assert not repl.run_pipeline([['zone', 'list'], ['each', 'zone']], state)
+    assert 'zone is not a list field' in capsys.readouterr().out
+    assert not repl.run_pipeline([['where', 'zone=a.com']], state)
+    assert not repl.run_pipeline([['zone', 'list'], []], state)
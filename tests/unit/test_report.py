@@ -0,0 +1,68 @@
+import json
+
+from ns1cli.commands.cmd_report import DEFAULT_SOA
+from ns1cli.table import Table
+
+
+def _account(api):
+    api.add_zone('a.com', **DEFAULT_SOA)
+    api.add_zone('b.com', **dict(DEFAULT_SOA, refresh=600))
+    api.add_record('a.com', 'www.a.com', 'A', ['1.1.1.1', '2.2.2.2'],
+                   filters=[{'filter': 'up'}])
+    api.add_record('a.com', 'api.a.com', 'A', ['3.3.3.3'], ttl=60)
+    api.add_record('a.com', 'a.com', 'MX', ['10 mx.a.com'])
+    api.add_record('b.com', 'www.b.com', 'CNAME', ['a.com'], ttl=60)
+
+
+def _report(invoke, *args):
+    result = invoke('--output', 'json', 'report', *args)
+    assert result.exit_code == 0, result.output
+    return dict((s['section'], s['rows']) for s in json.loads(result.output))
+
+
+def test_count_by():
+    table = Table(['zone', 'ttl'])
+    for zone, ttl in [('b.com', 60), ('a.com', None), ('a.com', 60),
+                      ('a.com', 60)]:
+        table.append({'zone': zone, 'ttl': ttl})
+    assert table.count_by('ttl') == [(60, 3), (None, 1)]
+    assert table.count_by('zone', 'ttl') == \
+        [('a.com', 60, 2), ('a.com', None, 1), ('b.com', 60, 1)]
+
+
+def test_report(api, invoke):
+    _account(api)
+    sections = _report(invoke, '--max-answers', '1')
+    assert sections['ttl'] == [{'ttl': 60, 'records': 2},
+                               {'ttl': 3600, 'records': 2}]
+    assert sections['types'] == [
+        {'zone': 'a.com', 'type': 'A', 'records': 2},
+        {'zone': 'a.com', 'type': 'MX', 'records': 1},
+        {'zone': 'b.com', 'type': 'CNAME', 'records': 1}]
+    # judged from the tier of each record
+    assert [r['domain'] for r in sections['no-filters']] == \
+        ['a.com', 'api.a.com', 'www.b.com']
+    assert sections['many-answers'] == [
+        {'zone': 'a.com', 'domain': 'www.a.com', 'type': 'A', 'answers': 2}]
+    assert sections['default-soa'] == [{'zone': 'a.com'}]
+    # zones are only listed and retrieved without --records
+    assert not [c for c in api.calls if c[0] == 'records.retrieve']
+
+
+def test_report_records(api, invoke):
+    _account(api)
+    sections = _report(invoke, '--records', '--section', 'no-filters',
+                       '--section', 'many-answers')
+    assert sorted(sections) == ['many-answers', 'no-filters']
+    assert [r['domain'] for r in sections['no-filters']] == \
+        ['a.com', 'api.a.com', 'www.b.com']
+    assert sections['many-answers'] == []
+    assert len([c for c in api.calls if c[0] == 'records.retrieve']) == 4
+
+
+def test_report_text(api, invoke):
+    _account(api)
+    result = invoke('report', '--section', 'ttl')
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ['TTL:', '  ttl   records',
+                                          '  60    2', '  3600  2']
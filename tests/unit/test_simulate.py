@@ -0,0 +1,68 @@
+import pytest
+
+from ns1cli.simulate import SimulationError, Simulator
+
+
+def record(filters, *answers):
+    return {'answers': [{'answer': [ip], 'meta': meta}
+                        for ip, meta in answers],
+            'filters': [{'filter': f, 'config': c} for f, c in filters]}
+
+
+def test_chain():
+    rdata = record([('up', {}),
+                    ('geotarget_country', {}),
+                    ('select_first_n', {'N': 1})],
+                   ('1.1.1.1', {'country': 'US,CA'}),
+                   ('2.2.2.2', {'country': ['DE'], 'up': False}),
+                   ('3.3.3.3', {'country': ['FR']}))
+    simulator = Simulator(rdata)
+    assert simulator.evaluate('10.0.0.1', 'ca', None) == ['1.1.1.1']
+    assert simulator.evaluate('10.0.0.1', 'FR', None) == ['3.3.3.3']
+    # down answers are never returned, and unmatched countries get all
+    assert simulator.evaluate('10.0.0.1', 'DE', None) == ['1.1.1.1']
+
+
+def test_netfence_priority():
+    rdata = record([('netfence_prefix', {'remove_no_ip_prefixes': True}),
+                    ('priority', {})],
+                   ('1.1.1.1', {'ip_prefixes': ['10.0.0.0/8'],
+                                'priority': 2}),
+                   ('2.2.2.2', {'ip_prefixes': '10.1.0.0/16, 2001:db8::/32',
+                                'priority': 1}),
+                   ('3.3.3.3', {}))
+    simulator = Simulator(rdata)
+    assert simulator.evaluate('10.2.0.1', None, None) == ['1.1.1.1']
+    assert simulator.evaluate('10.1.0.1', None, None) == ['2.2.2.2']
+    assert simulator.evaluate('2001:db8::1', None, None) == ['2.2.2.2']
+    assert simulator.evaluate('192.168.0.1', None, None) == []
+
+
+def test_weighted_shuffle():
+    rdata = record([('weighted_shuffle', {}), ('select_first_n', {})],
+                   ('1.1.1.1', {'weight': 3}),
+                   ('2.2.2.2', {'weight': 1}),
+                   ('3.3.3.3', {'weight': 0}))
+    total, first, returned = Simulator(rdata, seed=1).run(
+        [('10.0.0.1', 'US', None)] * 4000)
+    assert total == 4000
+    assert 2800 < first['1.1.1.1'] < 3200
+    assert first['1.1.1.1'] + first['2.2.2.2'] == 4000
+    assert '3.3.3.3' not in first
+
+
+@pytest.mark.parametrize('prefix', ['10.0.0.0/33', '10.0.0.0/x',
+                                    '10.0.0.0/', '2001:db8::/129',
+                                    '10.0.0/8'])
+def test_invalid_prefix(prefix):
+    with pytest.raises(SimulationError):
+        Simulator(record([], ('1.1.1.1', {'ip_prefixes': [prefix]})))
+
+
+def test_invalid_filter():
+    with pytest.raises(SimulationError):
+        Simulator(record([('sticky_shuffle', {})], ('1.1.1.1', {})))
+    simulator = Simulator(record([('select_first_n', {'N': 'x'})],
+                                 ('1.1.1.1', {})))
+    with pytest.raises(SimulationError):
+        simulator.evaluate('10.0.0.1', None, None)
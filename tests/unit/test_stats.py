@@ -0,0 +1,60 @@
+import json
+
+from nsone.rest.resource import ResourceException
+
+
+def _account(api):
+    api.add_zone('a.com')
+    api.add_zone('b.com')
+    for zone, domain, type, qps in [('a.com', 'www.a.com', 'A', 30),
+                                    ('a.com', 'api.a.com', 'A', 10),
+                                    ('a.com', 'a.com', 'MX', 0),
+                                    ('b.com', 'www.b.com', 'A', 20)]:
+        api.add_record(zone, domain, type, ['1.1.1.1'])
+        api.qps[(domain, type)] = qps
+
+
+def test_top(api, invoke):
+    _account(api)
+    result = invoke('--output', 'json', 'stats', 'top', '-n', '3',
+                    '--all-zones')
+    assert result.exit_code == 0
+    ranked = [(r['domain'], r['qps'], r['share'])
+              for r in json.loads(result.output)]
+    # shares are of each record's own zone
+    assert ranked == [('www.a.com', 30, 0.75), ('www.b.com', 20, 1.0),
+                      ('api.a.com', 10, 0.25)]
+
+    result = invoke('stats', 'top', 'a.com')
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 4
+    assert lines[1].split() == ['1', '30.00', '75.0%', 'a.com', 'www.a.com',
+                                'A']
+    assert lines[3].split() == ['3', '0.00', '0.0%', 'a.com', 'a.com', 'MX']
+
+
+def test_top_rate(api, invoke):
+    _account(api)
+    result = invoke('--output', 'json', 'stats', 'top', '--all-zones',
+                    '--rate', '20', '--workers', '4')
+    assert result.exit_code == 0
+    assert [r['domain'] for r in json.loads(result.output)] == \
+        ['www.a.com', 'www.b.com', 'api.a.com', 'a.com']
+    # 4 requests at most 20 a second are at least 3 intervals apart
+    times = sorted(api.qps_times)
+    assert times[-1] - times[0] >= 3 / 20.0 - 0.01
+
+
+def test_top_failed(api, invoke):
+    _account(api)
+    api.qps[('www.a.com', 'A')] = ResourceException('rate limit exceeded')
+    result = invoke('--output', 'json', 'stats', 'top', 'a.com')
+    assert result.exit_code == 1
+    lines = result.output.splitlines()
+    assert lines[0] == 'www.a.com A: rate limit exceeded'
+    # the share is of the records that were measured
+    assert [(r['domain'], r['share']) for r in json.loads(lines[1])] == \
+        [('api.a.com', 1.0), ('a.com', 0.0)]
+    assert lines[2] == 'Error: REST API: failed to retrieve qps for 1 of 3 ' \
+        'records'
@@ -0,0 +1,103 @@
+import os
+
+import click
+import pytest
+from nsone.rest.resource import ResourceException
+
+from ns1cli import cli as cli_module
+from ns1cli.cli import State, cli
+from ns1cli.journal import journal_dir
+from ns1cli.repl import NS1Repl
+from ns1cli.transaction import Transaction
+from ns1cli.util import pmap
+
+
+def _transaction(api, *domains):
+    api.add_zone('test.com')
+    for i, domain in enumerate(domains, 1):
+        api.add_record('test.com', domain, 'A', ['%d.%d.%d.%d' % ((i,) * 4)])
+    return Transaction(cli_module.NSONE(None).records())
+
+
+def test_buffered(api):
+    txn = _transaction(api, 'a.test.com', 'b.test.com')
+    txn.update('test.com', 'a.test.com', 'A', answers=['3.3.3.3'])
+    txn.update('test.com', 'a.test.com', 'A', ttl=60)
+    txn.create('test.com', 'c.test.com', 'A', answers=['4.4.4.4'])
+    txn.update('test.com', 'c.test.com', 'A', ttl=30)
+    txn.delete('test.com', 'b.test.com', 'A')
+    assert len(txn) == 3
+    assert api.writes() == []
+
+    with pytest.raises(ResourceException):
+        txn.retrieve('test.com', 'b.test.com', 'A')
+    assert txn.retrieve('test.com', 'c.test.com', 'A')['ttl'] == 30
+
+    results = txn.commit(lambda func, items: pmap(func, items, workers=1))
+    assert [error for _, _, error in results] == [None] * 3
+    assert api.writes() == [('records.delete', 'b.test.com', 'A'),
+                            ('records.update', 'a.test.com', 'A'),
+                            ('records.create', 'c.test.com', 'A')]
+    assert api.records[('test.com', 'a.test.com', 'A')]['ttl'] == 60
+    created = api.records[('test.com', 'c.test.com', 'A')]
+    assert created['ttl'] == 30
+    assert created['answers'] == [{'answer': ['4.4.4.4']}]
+
+
+def test_create_then_delete(api):
+    txn = _transaction(api)
+    txn.create('test.com', 'a.test.com', 'A', answers=['1.1.1.1'])
+    txn.delete('test.com', 'a.test.com', 'A')
+    assert len(txn) == 0
+    assert txn.commit(lambda func, items: pmap(func, items)) == []
+    assert api.writes() == []
+
+
+def test_delete_then_create(api):
+    txn = _transaction(api, 'a.test.com')
+    txn.delete('test.com', 'a.test.com', 'A')
+    txn.create('test.com', 'a.test.com', 'A', answers=['2.2.2.2'])
+    with pytest.raises(ResourceException):
+        txn.create('test.com', 'a.test.com', 'A', answers=['3.3.3.3'])
+
+    txn.commit(lambda func, items: pmap(func, items))
+    assert api.writes() == [('records.delete', 'a.test.com', 'A'),
+                            ('records.create', 'a.test.com', 'A')]
+    assert api.records[('test.com', 'a.test.com', 'A')]['answers'] == \
+        [{'answer': ['2.2.2.2']}]
+
+
+def test_rollback(api):
+    txn = _transaction(api, 'a.test.com')
+    txn.delete('test.com', 'a.test.com', 'A')
+    txn.create('test.com', 'b.test.com', 'A', answers=['2.2.2.2'])
+    with pytest.raises(ResourceException):
+        txn.delete('test.com', 'missing.test.com', 'A')
+    # rolling back is dropping the transaction
+    assert api.writes() == []
+
+
+def test_no_jobs_in_transaction(api, capsys):
+    state = State()
+    state.rest = cli_module.NSONE(None)
+    txn = state.transaction = _transaction(api, 'a.test.com', 'b.test.com')
+    # skip the terminal and history setup of __init__
+    console = NS1Repl.__new__(NS1Repl)
+    console.ctx = click.Context(cli, obj=state)
+    console.cli = cli
+
+    record = cli.get_command(console.ctx, 'record')
+    assert not console.run_command(
+        record, ['record', 'delete', '--match', 'domain=*.test.com', '-y'],
+        state)
+    assert 'record delete jobs cannot run in a transaction' in \
+        capsys.readouterr().err
+    assert len(txn) == 0
+    assert not os.path.exists(journal_dir(state.home_dir)) or \
+        not os.listdir(journal_dir(state.home_dir))
+
+    # single record edits are still buffered
+    assert console.run_command(
+        record, ['record', 'delete', 'test.com', 'a.test.com', 'A'], state)
+    assert len(txn) == 1
+    assert api.writes() == []
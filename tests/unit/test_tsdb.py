@@ -0,0 +1,50 @@
+from ns1cli.tsdb import DAY, HOUR, Series, downsample, fetch_period
+
+
+def test_update_replaces_open_bucket(tmpdir):
+    series = Series(str(tmpdir), 'test.com')
+    series.update([(0, 10), (HOUR, 20), (2 * HOUR, 5)])
+    series.update([(2 * HOUR, 30), (3 * HOUR, 1)])
+
+    timestamps, values = series.load()
+    assert list(timestamps) == [0, HOUR, 2 * HOUR, 3 * HOUR]
+    assert list(values) == [10, 20, 30, 1]
+    assert series.last_timestamp() == 3 * HOUR
+
+
+def test_update_finer_points(tmpdir):
+    # a 30d fetch stores daily buckets, today's still open
+    series = Series(str(tmpdir), 'test.com')
+    series.update([(0, 240), (DAY, 240), (2 * DAY, 100)])
+
+    # a 24h fetch then reports hourly points, from the middle of yesterday
+    now = 2 * DAY + 10 * HOUR
+    assert fetch_period(series.last_timestamp(), now) == '24h'
+    series.update([(ts, 10) for ts in range(now - DAY, now + 1, HOUR)])
+
+    timestamps, values = series.load()
+    assert list(timestamps[:3]) == [0, DAY, 2 * DAY]
+    assert list(timestamps[3:5]) == [2 * DAY + HOUR, 2 * DAY + 2 * HOUR]
+    # yesterday is only counted once, today hour by hour
+    days = downsample(timestamps, values, 'day')
+    assert days == [(0, 240), (DAY, 240), (2 * DAY, 110)]
+
+
+def test_fetch_period():
+    now = 100 * DAY
+    assert fetch_period(None, now) == '30d'
+    assert fetch_period(now - 60, now) == '1h'
+    assert fetch_period(now - 2 * HOUR, now) == '24h'
+    assert fetch_period(now - 2 * DAY, now) == '30d'
+    assert fetch_period(now - 60 * DAY, now) == '30d'
+
+
+def test_downsample():
+    timestamps = [0, HOUR, DAY, DAY + HOUR, 40 * DAY]
+    values = [1, 2, 3, 4, 5]
+    assert downsample(timestamps, values, 'hour', since=HOUR) == \
+        [(HOUR, 2), (DAY, 3), (DAY + HOUR, 4), (40 * DAY, 5)]
+    assert downsample(timestamps, values, 'day') == \
+        [(0, 3), (DAY, 7), (40 * DAY, 5)]
+    assert downsample(timestamps, values, 'month') == \
+        [(0, 10), (31 * DAY, 5)]
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from ns1cli.util import Cancelled, cancel_on, compile_fields, compile_where, \
+    pmap
+
+
+ZONE = {'zone': 'test.com', 'ttl': 3600,
+        'meta': {'up': True, 'country': ['US', 'CA']}}
+
+
+def test_fields():
+    project = compile_fields('zone, meta.up,missing.field')
+    assert project(ZONE) == {'zone': 'test.com', 'meta': {'up': True}}
+
+
+def test_where():
+    assert compile_where(['zone=test.com', 'meta.up=true'])(ZONE)
+    assert compile_where(['meta.country=CA'])(ZONE)
+    assert not compile_where(['ttl!=3600'])(ZONE)
+    assert not compile_where(['missing=x'])(ZONE)
+    assert compile_where(['missing!=x'])(ZONE)
+    assert compile_where(['zone~=^TEST', 'meta.country~=a$'])(ZONE)
+    assert not compile_where(['zone~=prod'])(ZONE)
+
+
+def test_where_invalid():
+    with pytest.raises(ValueError):
+        compile_where(['zone'])
+    with pytest.raises(ValueError):
+        compile_where(['zone~=('])
+
+
+def test_pmap_cancel():
+    event = threading.Event()
+
+    def call(i):
+        if i == 2:
+            event.set()
+        return i
+
+    cancel_on(event)
+    try:
+        results = pmap(call, range(5), workers=1)
+    finally:
+        cancel_on(None)
+    assert [r for _, r, _ in results] == [0, 1, 2, None, None]
+    assert isinstance(results[3][2], Cancelled)
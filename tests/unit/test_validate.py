@@ -0,0 +1,31 @@
+from ns1cli.validate import answer_error
+
+
+def test_valid():
+    for type, answer in [('A', '1.2.3.4'),
+                         ('AAAA', ['2001:db8::1']),
+                         ('CNAME', 'www.test.com.'),
+                         ('MX', [10, 'mail.test.com']),
+                         ('MX', '10 mail.test.com'),
+                         ('SRV', {'answer': [1, 2, 443, '_sip.test.com']}),
+                         ('MX', '0 .'),
+                         ('SRV', [0, 0, 0, '.']),
+                         ('TXT', 'hello world'),
+                         ('TXT', [123]),
+                         ('NAPTR', [100, 10, 'S', 'SIP+D2U', '', '.']),
+                         ('CAA', 'anything at all')]:
+        assert answer_error(type, answer) is None, (type, answer)
+
+
+def test_invalid():
+    assert answer_error('A', '1.2.3') == 'invalid IPv4 address 1.2.3'
+    assert answer_error('AAAA', '2001:db8:::1')
+    assert answer_error('A', '1.1.1.1 2.2.2.2')
+    assert answer_error('MX', 'mail.test.com') == \
+        'MX answers have 2 fields, got 1'
+    assert answer_error('MX', [70000, 'mail.test.com'])
+    assert answer_error('MX', [True, 'mail.test.com']) == \
+        'True is not a number from 0 to 65535'
+    assert answer_error('SRV', '1 2 3 bad..host')
+    assert answer_error('CNAME', '.') == 'invalid hostname .'
+    assert answer_error('TXT', [])
@@ -0,0 +1,88 @@
+import json
+import time
+
+from ns1cli.commands.cmd_zone import _parse_bulk
+
+
+def test_parse_bulk():
+    ops, errors = _parse_bulk(['# new zones', 'Test.COM. refresh=60',
+                               'linked.com link=TEST.com', 'test.com',
+                               'bad_zone- nx_ttl=x'],
+                              'create', {'nx_ttl': 300})
+    assert ops[:2] == [{'zone': 'test.com',
+                        'options': {'refresh': 60, 'nx_ttl': 300}},
+                       {'zone': 'linked.com',
+                        'options': {'link': 'test.com', 'nx_ttl': 300}}]
+    assert errors == ['line 3: a linked zone cannot have SOA options',
+                      'line 4: duplicate of line 2',
+                      'line 5: invalid zone name bad_zone-',
+                      'line 5: nx_ttl must be a number of seconds']
+
+
+def test_bulk_case(api, invoke):
+    api.add_zone('Test.com')
+    result = invoke('zone', 'bulk', 'create', '-', input='TEST.COM\n')
+    assert result.exit_code == 1
+    assert 'test.com already exists' in result.output
+
+    result = invoke('zone', 'bulk', 'create', '-',
+                    input='linked.com link=TEST.com\n')
+    assert result.exit_code == 0
+    assert api.zones['linked.com'] == {'zone': 'linked.com',
+                                       'link': 'Test.com'}
+
+    result = invoke('zone', 'bulk', 'delete', '-y', '-', input='test.COM\n')
+    assert result.exit_code == 0, result.output
+    assert sorted(api.zones) == ['linked.com']
+
+
+def test_clone_links(api, invoke):
+    api.add_zone('src.com', refresh=3600)
+    api.add_record('src.com', 'a.src.com', 'A', link='z.src.com')
+    api.add_record('src.com', 'b.src.com', 'A', link='other.com')
+    api.add_record('src.com', 'z.src.com', 'A', ['1.1.1.1'])
+    api.add_record('other.com', 'other.com', 'A', ['2.2.2.2'])
+
+    result = invoke('zone', 'clone', 'src.com', 'dst.com', '--workers', '1')
+    assert result.exit_code == 0, result.output
+    assert api.zones['dst.com'] == {'zone': 'dst.com', 'refresh': 3600}
+    assert [c for c in api.writes() if c[0] == 'records.create'] == \
+        [('records.create', 'z.dst.com', 'A'),
+         ('records.create', 'a.dst.com', 'A'),
+         ('records.create', 'b.dst.com', 'A')]
+    assert api.records[('dst.com', 'a.dst.com', 'A')]['link'] == 'z.dst.com'
+    assert api.records[('dst.com', 'b.dst.com', 'A')]['link'] == 'other.com'
+
+
+def test_watch(api, invoke, monkeypatch):
+    api.add_zone('test.com')
+    api.add_record('test.com', 'a.test.com', 'A', ['1.1.1.1'])
+    api.add_record('test.com', 'b.test.com', 'A', ['2.2.2.2'])
+    api.add_record('test.com', 'c.test.com', 'A', ['3.3.3.3'])
+    # each sleep between polls changes the zone for the next one
+    edits = [lambda: (api.add_record('test.com', 'd.test.com', 'MX',
+                                     ['10 mail.test.com']),
+                      api.records[('test.com', 'a.test.com', 'A')].update(
+                          ttl=60),
+                      api.records.pop(('test.com', 'b.test.com', 'A'))),
+             lambda: None,
+             lambda: api.add_record('test.com', 'c.test.com', 'A',
+                                    ['3.3.3.4'])]
+    monkeypatch.setattr(time, 'sleep', lambda seconds: edits.pop(0)())
+
+    result = invoke('--output', 'ndjson', 'zone', 'watch', '--count', '4',
+                    '--interval', '5', 'test.com')
+    assert result.exit_code == 0, result.output
+    events = [json.loads(line) for line in result.output.splitlines()]
+    assert [(e['event'], e['domain'], e['type']) for e in events] == [
+        ('changed', 'a.test.com', 'A'), ('removed', 'b.test.com', 'A'),
+        ('added', 'd.test.com', 'MX'), ('changed', 'c.test.com', 'A')]
+    assert events[0]['record']['ttl'] == 60
+    assert 'record' not in events[1]
+    assert events[3]['record']['answers'] == [{'answer': ['3.3.3.4']}]
+    assert edits == []
+    # only the added and changed records are retrieved in full
+    assert sorted(c for c in api.calls if c[0] == 'records.retrieve') == [
+        ('records.retrieve', 'a.test.com', 'A'),
+        ('records.retrieve', 'c.test.com', 'A'),
+        ('records.retrieve', 'd.test.com', 'MX')]
@@ -0,0 +1,52 @@
+import pytest
+
+from ns1cli import zonefile
+
+
+ZONEFILE = """\
+$ORIGIN test.com.
+$TTL 1h
+@   IN SOA ns1.test.com. admin.test.com. (
+        2016 ; serial
+        3600 600 86400 300 )
+    IN NS ns1
+    IN MX 10 mail
+    IN MX 20 mail2.other.net.
+www 300 IN A 1.1.1.1
+        IN A 2.2.2.2
+txt IN TXT "hello; world"
+$ORIGIN sub.test.com.
+a A 3.3.3.3
+"""
+
+
+def test_group():
+    records = zonefile.group(
+        zonefile.parse(ZONEFILE.splitlines(True), 'test.com'), 'test.com')
+
+    assert [(r['domain'], r['type']) for r in records] == [
+        ('test.com', 'MX'),
+        ('www.test.com', 'A'),
+        ('txt.test.com', 'TXT'),
+        ('a.sub.test.com', 'A')]
+    assert records[0]['answers'] == [[10, 'mail.test.com'],
+                                     [20, 'mail2.other.net']]
+    assert records[0]['ttl'] == 3600
+    assert records[1]['answers'] == ['1.1.1.1', '2.2.2.2']
+    assert records[1]['ttl'] == 300
+    assert records[2]['answers'] == ['hello; world']
+
+
+def test_parse_ttl():
+    assert zonefile.parse_ttl('300') == 300
+    assert zonefile.parse_ttl('1h30m') == 5400
+    assert zonefile.parse_ttl('1W') == 604800
+
+
+def test_errors():
+    with pytest.raises(zonefile.ZoneFileError):
+        list(zonefile.parse(['www IN A (1.1.1.1\n'], 'test.com'))
+
+    with pytest.raises(zonefile.ZoneFileError):
+        zonefile.group(zonefile.parse(['www.other.com. A 1.1.1.1\n'],
+                                      'test.com'), 'test.com')